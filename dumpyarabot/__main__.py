@@ -7,7 +7,7 @@ from telegram.ext import (ApplicationBuilder, CallbackQueryHandler,
                           CommandHandler, ContextTypes, MessageHandler,
                           filters, JobQueue)
 
-from dumpyarabot.handlers import cancel_dump, clear_queue, dump, help_command, restart, status
+from dumpyarabot.handlers import cancel_dump, clear_queue, dump, help_command, refresh_extractor, restart, status
 from dumpyarabot.message_queue import message_queue, sanitize_telegram_error
 from dumpyarabot.mockup_handlers import (handle_enhanced_callback_query,
                                          mockup_command)
@@ -186,6 +186,7 @@ if __name__ == "__main__":
     restart_handler = CommandHandler("restart", restart)
 
     clearqueue_handler = CommandHandler("clearqueue", clear_queue)
+    refreshextractor_handler = CommandHandler("refreshextractor", refresh_extractor)
 
     # Add all handlers
     application.add_handler(dump_handler)
@@ -199,6 +200,7 @@ if __name__ == "__main__":
     application.add_handler(callback_handler)
     application.add_handler(restart_handler)
     application.add_handler(clearqueue_handler)
+    application.add_handler(refreshextractor_handler)
     application.add_error_handler(_handle_application_error)
 
     application.post_init = _startup_init
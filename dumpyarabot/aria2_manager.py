@@ -9,8 +9,14 @@ from dataclasses import dataclass
 from pathlib import Path
 from collections.abc import AsyncIterator
 
-import aria2p
+from urllib.parse import urlparse
+
 from rich.console import Console
+from dumpyarabot.aria2_rpc import Aria2RpcClient, Aria2RpcError
+from dumpyarabot.bandwidth_scheduler import PRIORITY_FOREGROUND, BandwidthScheduler
+from dumpyarabot.config import settings
+from dumpyarabot.host_tuning import MIN_SAMPLE_BYTES, profile_for_url, record_download
+from dumpyarabot.integrity import contiguous_prefix_bytes
 from dumpyarabot.process_utils import _register_process_for_current_job, _unregister_process_for_current_job
 
 console = Console()
@@ -34,6 +40,8 @@ class DownloadProgress:
     status: str  # "active", "waiting", "paused", "error", "complete", "removed"
     file_name: str | None = None
     error_message: str | None = None
+    file_path: str | None = None
+    contiguous_bytes: int = 0  # leading bytes already final on disk
 
     @property
     def percentage(self) -> float:
@@ -93,6 +101,21 @@ class DownloadProgress:
         return self.status == "error"
 
 
+# Fields requested from aria2.tellStatus for a progress snapshot
+_STATUS_KEYS = [
+    "status",
+    "totalLength",
+    "completedLength",
+    "downloadSpeed",
+    "connections",
+    "errorCode",
+    "errorMessage",
+    "files",
+    "bitfield",
+    "pieceLength",
+]
+
+
 def _find_free_port() -> int:
     """Find a free TCP port for aria2 RPC."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -101,23 +124,55 @@ def _find_free_port() -> int:
 
 
 class Aria2Manager:
-    """Manages an aria2c daemon and provides RPC-based download with progress tracking."""
+    """Provides RPC-based download with progress tracking through aria2c.
 
-    def __init__(self, download_dir: str, split: int = 16, max_connection_per_server: int = 16):
+    When ARIA2_RPC_URL is set, attaches to the host's long-lived aria2 daemon
+    (see systemd/dumpyarabot-aria2.service) and only adds and removes its own
+    downloads. Otherwise spawns a private aria2c for the lifetime of the
+    context manager.
+
+    Unless split and max_connection_per_server are given, each download
+    picks them from the measured history of its host (see host_tuning).
+    """
+
+    def __init__(
+        self,
+        download_dir: str,
+        split: int | None = None,
+        max_connection_per_server: int | None = None,
+        rpc_url: str | None = None,
+        rpc_secret: str | None = None,
+        resumable: bool = False,
+    ):
         self.download_dir = Path(download_dir)
+        # Keep partial files and .aria2 control files on failure so a later
+        # attempt in the same dir continues instead of restarting
+        self.resumable = resumable
         self.split = split
         self.max_connection_per_server = max_connection_per_server
+        self.rpc_url = rpc_url if rpc_url is not None else settings.ARIA2_RPC_URL
         self._process: asyncio.subprocess.Process | None = None
         self._stderr_task: asyncio.Task[None] | None = None
         self._stderr_lines: deque[str] = deque(maxlen=50)
-        self._api: aria2p.API | None = None
+        self._rpc: Aria2RpcClient | None = None
         self._port: int | None = None
-        self._secret: str = ""
+        self._secret: str = rpc_secret if rpc_secret is not None else settings.ARIA2_RPC_SECRET
+        self._downloaded_path: Path | None = None
+
+    @property
+    def is_shared_daemon(self) -> bool:
+        return bool(self.rpc_url)
 
     async def start(self) -> None:
-        """Start the aria2c daemon with RPC enabled."""
-        self._port = _find_free_port()
+        """Attach to the shared aria2 daemon, or start a private one."""
         self.download_dir.mkdir(parents=True, exist_ok=True)
+        self._downloaded_path = None
+
+        if self.is_shared_daemon:
+            await self._attach_shared_daemon()
+            return
+
+        self._port = _find_free_port()
         self._stderr_lines.clear()
 
         cmd = [
@@ -126,8 +181,6 @@ class Aria2Manager:
             f"--rpc-listen-port={self._port}",
             "--rpc-listen-all=false",
             f"--dir={self.download_dir}",
-            f"--split={self.split}",
-            f"--max-connection-per-server={self.max_connection_per_server}",
             "--check-certificate=false",
             "--file-allocation=none",
             "--auto-file-renaming=false",
@@ -145,33 +198,64 @@ class Aria2Manager:
         await _register_process_for_current_job(self._process.pid)
         self._stderr_task = asyncio.create_task(self._drain_stderr())
 
-        # Give aria2c a moment to bind
-        await asyncio.sleep(0.5)
+        await self._wait_until_ready(f"ws://127.0.0.1:{self._port}/jsonrpc")
+
+        console.print(f"[green]aria2c RPC daemon started (pid={self._process.pid}, port={self._port})[/green]")
 
-        if self._process.returncode is not None:
-            await self._process.wait()
-            raise RuntimeError(self._format_startup_error())
+    async def _attach_shared_daemon(self) -> None:
+        """Connect to the host-wide aria2 daemon at ARIA2_RPC_URL."""
+        parsed = urlparse(self.rpc_url)
+        await self._wait_until_ready(self.rpc_url)
 
-        self._api = aria2p.API(
-            aria2p.Client(
-                host="http://127.0.0.1",
-                port=self._port,
-                secret=self._secret,
+        if settings.ARIA2_MAX_OVERALL_SPEED > 0:
+            # Hard ceiling on the daemon itself; the scheduler splits it between jobs
+            await self._rpc.call(
+                "aria2.changeGlobalOption",
+                {"max-overall-download-limit": str(settings.ARIA2_MAX_OVERALL_SPEED)},
             )
-        )
 
-        console.print(f"[green]aria2c RPC daemon started (pid={self._process.pid}, port={self._port})[/green]")
+        console.print(f"[green]Attached to shared aria2 daemon at {parsed.hostname}:{parsed.port or 6800}[/green]")
+
+    async def _wait_until_ready(self, url: str, timeout: float = 10.0) -> None:
+        """Connect to the RPC WebSocket, retrying until it answers instead of sleeping blindly."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.05
+        while True:
+            if self._process and self._process.returncode is not None:
+                await self._process.wait()
+                raise RuntimeError(self._format_startup_error())
+            rpc = Aria2RpcClient(url, self._secret)
+            try:
+                await rpc.connect()
+                await rpc.call("aria2.getVersion", timeout=5.0)
+                self._rpc = rpc
+                return
+            except (Aria2RpcError, OSError, asyncio.TimeoutError) as e:
+                await rpc.close()
+                if loop.time() >= deadline:
+                    raise RuntimeError(f"aria2 RPC not reachable after {timeout:.0f}s: {e}") from e
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
 
     async def stop(self) -> None:
-        """Shut down the aria2c daemon."""
+        """Shut down a private aria2c daemon, or detach from the shared one."""
+        if self.is_shared_daemon:
+            # The shared daemon outlives jobs; our downloads were already removed
+            if self._rpc:
+                await self._rpc.close()
+                self._rpc = None
+            return
+
         aria2_pid = self._process.pid if self._process else None
 
-        if self._api:
+        if self._rpc:
             try:
-                self._api.client.shutdown()
+                await self._rpc.call("aria2.shutdown", timeout=5.0)
             except Exception:
                 pass
-            self._api = None
+            await self._rpc.close()
+            self._rpc = None
 
         if self._process:
             if self._process.returncode is None:
@@ -227,16 +311,21 @@ class Aria2Manager:
     async def download(
         self,
         url: str,
+        mirrors: list[str] | None = None,
         poll_interval: float = 2.0,
         timeout: float = 1800.0,
+        priority: int = PRIORITY_FOREGROUND,
     ) -> AsyncIterator[DownloadProgress]:
         """
         Add a download and yield progress snapshots until completion.
 
         Args:
             url: URL to download
+            mirrors: Alternative URIs for the same file; aria2 pulls segments
+                     from all of them concurrently
             poll_interval: Seconds between progress polls
             timeout: Maximum download time in seconds
+            priority: Bandwidth weight relative to other downloads on the host
 
         Yields:
             DownloadProgress snapshots
@@ -244,73 +333,151 @@ class Aria2Manager:
         Raises:
             RuntimeError: If download fails or times out
         """
-        if not self._api:
+        if not self._rpc:
             raise RuntimeError("aria2c daemon not started - call start() first")
 
-        loop = asyncio.get_running_loop()
-
-        # Add the download (add_uris returns a single Download object)
-        download = await loop.run_in_executor(None, self._api.add_uris, [url])
-        if not download:
+        uris = [url, *(mirror for mirror in (mirrors or []) if mirror != url)]
+        auto_tuned = self.split is None and self.max_connection_per_server is None
+        if auto_tuned:
+            profile = await profile_for_url(url, len(uris))
+            connections = profile.connections
+            tuning = profile.aria2_options()
+        else:
+            connections = self.max_connection_per_server or 16
+            tuning = {"split": str(self.split or 16), "max-connection-per-server": str(connections)}
+        # Per-download options, so downloads on a shared daemon land in their own job dirs
+        options = {"dir": str(self.download_dir), **tuning}
+        if self.resumable:
+            options["continue"] = "true"
+        gid = await self._rpc.call("aria2.addUri", uris, options)
+        if not gid:
             raise RuntimeError(f"Failed to add download for: {url}")
 
-        gid = download.gid
-        console.print(f"[blue]Download added (gid={gid}): {url}[/blue]")
+        console.print(f"[blue]Download added (gid={gid}): {url} ({len(uris)} source(s))[/blue]")
+        finished = self._rpc.watch(gid)
+
+        scheduler = BandwidthScheduler(self._rpc, self.is_shared_daemon) if BandwidthScheduler.enabled() else None
+        if scheduler:
+            await scheduler.register(gid, priority)
 
-        elapsed = 0.0
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # (time, bytes) of the first snapshot; measuring from there leaves
+        # out the bytes that a resumed download had already
+        baseline: tuple[float, int] | None = None
         try:
-            while elapsed < timeout:
-                await asyncio.sleep(poll_interval)
-                elapsed += poll_interval
-
-                # Refresh download status (run in executor to avoid blocking event loop)
-                download = await loop.run_in_executor(None, self._api.get_download, gid)
-
-                file_name = None
-                if download.files and download.files[0].path:
-                    file_name = Path(download.files[0].path).name
-
-                progress = DownloadProgress(
-                    total_bytes=download.total_length,
-                    completed_bytes=download.completed_length,
-                    download_speed=download.download_speed,
-                    connections=download.connections,
-                    status=download.status,
-                    file_name=file_name,
-                    error_message=download.error_message if download.status == "error" else None,
-                )
+            while loop.time() < deadline:
+                # Wake on aria2's completion/error notification, or when the
+                # next progress snapshot is due, whichever comes first
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(finished), min(poll_interval, max(deadline - loop.time(), 0))
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                if scheduler and not finished.done():
+                    await scheduler.rebalance()
+
+                status = await self._rpc.call("aria2.tellStatus", gid, _STATUS_KEYS)
+                progress = self._progress_from_status(status)
+                if baseline is None:
+                    baseline = (loop.time(), progress.completed_bytes)
 
                 yield progress
 
                 if progress.is_complete:
-                    console.print(f"[green]Download complete: {file_name}[/green]")
+                    console.print(f"[green]Download complete: {progress.file_name}[/green]")
+                    if auto_tuned:
+                        fetched = progress.total_bytes - baseline[1]
+                        elapsed = loop.time() - baseline[0]
+                        speed = fetched / elapsed if fetched >= MIN_SAMPLE_BYTES and elapsed > 0 else None
+                        await record_download(url, connections, speed)
                     return
 
                 if progress.is_error:
+                    if auto_tuned:
+                        await record_download(url, connections, None, str(status.get("errorCode")))
                     raise RuntimeError(
-                        f"aria2 download error (code {download.error_code}): {download.error_message}"
+                        f"aria2 download error (code {status.get('errorCode')}): {status.get('errorMessage')}"
                     )
 
+                if progress.status == "removed":
+                    raise RuntimeError("aria2 download was removed before completing")
+
             # Timed out
-            await loop.run_in_executor(
-                None, lambda: self._api.remove([download], force=True, files=True)
-            )
+            await self._remove_download(gid)
             raise RuntimeError(f"Download timed out after {timeout}s")
 
         except (asyncio.CancelledError, Exception):
             # Clean up on cancellation or error
             try:
-                download = await loop.run_in_executor(None, self._api.get_download, gid)
-                if download.status in ("active", "waiting", "paused"):
-                    await loop.run_in_executor(
-                        None, lambda: self._api.remove([download], force=True, files=True)
-                    )
+                status = await self._rpc.call("aria2.tellStatus", gid, ["status"], timeout=5.0)
+                if status.get("status") in ("active", "waiting", "paused"):
+                    await self._remove_download(gid)
             except Exception:
                 pass
             raise
+        finally:
+            if scheduler:
+                await scheduler.release()
+
+    def _progress_from_status(self, status: dict) -> DownloadProgress:
+        """Build a progress snapshot from an aria2.tellStatus result."""
+        file_name = None
+        files = status.get("files") or []
+        if files and files[0].get("path"):
+            self._downloaded_path = Path(files[0]["path"])
+            file_name = self._downloaded_path.name
+
+        state = status.get("status", "")
+        total_length = int(status.get("totalLength", 0))
+        if state == "complete":
+            contiguous = total_length
+        else:
+            contiguous = contiguous_prefix_bytes(
+                status.get("bitfield"), int(status.get("pieceLength", 0)), total_length
+            )
+        return DownloadProgress(
+            total_bytes=total_length,
+            completed_bytes=int(status.get("completedLength", 0)),
+            download_speed=int(status.get("downloadSpeed", 0)),
+            connections=int(status.get("connections", 0)),
+            status=state,
+            file_name=file_name,
+            error_message=status.get("errorMessage") if state == "error" else None,
+            file_path=str(self._downloaded_path) if self._downloaded_path else None,
+            contiguous_bytes=contiguous,
+        )
+
+    async def _remove_download(self, gid: str) -> None:
+        """Force-remove a download and delete its partial file and control file.
+
+        In resumable mode the files are left in place for the next attempt.
+        """
+        if self.resumable:
+            await self._rpc.call("aria2.forceRemove", gid, timeout=5.0)
+            return
+
+        try:
+            status = await self._rpc.call("aria2.tellStatus", gid, ["files"], timeout=5.0)
+        except Exception:
+            status = {}
+        await self._rpc.call("aria2.forceRemove", gid, timeout=5.0)
+
+        for entry in status.get("files") or []:
+            if entry.get("path"):
+                path = Path(entry["path"])
+                for leftover in (path, path.with_name(path.name + ".aria2")):
+                    try:
+                        leftover.unlink()
+                    except OSError:
+                        pass
 
     def get_downloaded_file_path(self) -> str | None:
         """Get the path of the most recently downloaded file."""
+        if self._downloaded_path and self._downloaded_path.is_file():
+            return str(self._downloaded_path)
+
         if not self.download_dir.exists():
             return None
 
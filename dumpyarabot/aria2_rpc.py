@@ -0,0 +1,293 @@
+"""Native asyncio JSON-RPC client for aria2 over its WebSocket endpoint.
+
+aria2 serves JSON-RPC on ``ws://host:port/jsonrpc`` and pushes notifications
+(``aria2.onDownloadComplete``, ``aria2.onDownloadError``, ...) on the same
+socket. Talking to it directly keeps RPC off executor threads and lets a
+download finish the moment aria2 reports it, instead of on the next poll.
+
+Only the subset of RFC 6455 aria2 needs is implemented: a client handshake,
+masked client frames, fragmented text messages, ping/pong and close.
+"""
+
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from rich.console import Console
+
+console = Console()
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Notifications that end a download; onDownloadStart/Pause are ignored
+_TERMINAL_EVENTS = {
+    "aria2.onDownloadComplete": "complete",
+    "aria2.onBtDownloadComplete": "complete",
+    "aria2.onDownloadError": "error",
+    "aria2.onDownloadStop": "removed",
+}
+
+# Terminal notifications kept for gids nobody watches yet. They only matter
+# for the moment between addUri and watch(); the rest are other clients'
+# downloads on the same daemon, so the oldest are dropped.
+_EARLY_EVENTS_MAX = 256
+
+
+class Aria2RpcError(Exception):
+    """aria2 returned a JSON-RPC error, or the connection failed."""
+
+
+def _mask(payload: bytes, key: bytes) -> bytes:
+    """XOR a payload with a 4-byte WebSocket masking key."""
+    if not payload:
+        return payload
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    masked = int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")
+    return masked.to_bytes(len(payload), "big")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    """Build a single final WebSocket frame (clients must mask, servers must not)."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack(">H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack(">Q", length)
+
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    return bytes(header) + key + _mask(payload, key)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[bool, int, bytes]:
+    """Read one WebSocket frame.
+
+    Returns:
+        Tuple of (fin, opcode, unmasked payload)
+    """
+    first, second = await reader.readexactly(2)
+    fin = bool(first & 0x80)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack(">H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack(">Q", await reader.readexactly(8))
+    key = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    return fin, opcode, _mask(payload, key) if key else payload
+
+
+def websocket_accept(key: str) -> str:
+    """Compute the Sec-WebSocket-Accept value for a handshake key."""
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+class Aria2RpcClient:
+    """JSON-RPC client bound to one aria2 WebSocket connection."""
+
+    def __init__(self, url: str, secret: str = ""):
+        parsed = urlparse(url)
+        self.secure = parsed.scheme in ("https", "wss")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6800
+        self.path = parsed.path if parsed.path not in ("", "/") else "/jsonrpc"
+        self._secret = secret
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task[None]] = None
+        self._write_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._watchers: Dict[str, asyncio.Future] = {}
+        self._early_events: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def connected(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def connect(self, timeout: float = 5.0) -> None:
+        """Open the connection and complete the WebSocket handshake."""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.secure or None), timeout
+        )
+        key = base64.b64encode(os.urandom(16)).decode()
+        request = (
+            f"GET {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        self._writer.write(request.encode())
+        await self._writer.drain()
+
+        try:
+            head = await asyncio.wait_for(self._reader.readuntil(b"\r\n\r\n"), timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            await self.close()
+            raise Aria2RpcError(f"WebSocket handshake failed: {e}") from e
+
+        lines = head.decode(errors="replace").split("\r\n")
+        headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (line.partition(":") for line in lines[1:] if line)
+        }
+        if " 101 " not in f"{lines[0]} " or headers.get("sec-websocket-accept") != websocket_accept(key):
+            await self.close()
+            raise Aria2RpcError(f"WebSocket handshake rejected: {lines[0]}")
+
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def close(self) -> None:
+        """Close the connection and fail anything still waiting on it."""
+        if self._writer is not None:
+            try:
+                if self.connected:
+                    async with self._write_lock:
+                        self._writer.write(encode_frame(OP_CLOSE, b""))
+                        await self._writer.drain()
+            except Exception:
+                pass
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        self._fail_waiters(Aria2RpcError("aria2 RPC connection closed"))
+
+    async def call(self, method: str, *params: Any, timeout: float = 30.0) -> Any:
+        """Invoke an aria2 RPC method and return its result.
+
+        Raises:
+            Aria2RpcError: On a JSON-RPC error, a closed connection or a timeout
+        """
+        if not self.connected or self._writer is None:
+            raise Aria2RpcError("aria2 RPC connection is not open")
+
+        request_id = str(next(self._ids))
+        args = [f"token:{self._secret}", *params] if self._secret else list(params)
+        message = json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": args})
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            async with self._write_lock:
+                self._writer.write(encode_frame(OP_TEXT, message.encode()))
+                await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError as e:
+            raise Aria2RpcError(f"aria2 RPC {method} timed out after {timeout:.0f}s") from e
+        except (ConnectionError, OSError) as e:
+            raise Aria2RpcError(f"aria2 RPC {method} failed: {e}") from e
+        finally:
+            self._pending.pop(request_id, None)
+
+    def watch(self, gid: str) -> asyncio.Future:
+        """Future resolved with "complete", "error" or "removed" when the download ends."""
+        future = self._watchers.get(gid)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._watchers[gid] = future
+            # The notification may have raced ahead of addUri's response
+            if gid in self._early_events:
+                future.set_result(self._early_events.pop(gid))
+        return future
+
+    async def _read_loop(self) -> None:
+        error: Exception = Aria2RpcError("aria2 RPC connection closed")
+        fragments: list[bytes] = []
+        try:
+            while True:
+                fin, opcode, payload = await read_frame(self._reader)
+                if opcode == OP_PING:
+                    async with self._write_lock:
+                        self._writer.write(encode_frame(OP_PONG, payload))
+                        await self._writer.drain()
+                    continue
+                if opcode == OP_CLOSE:
+                    break
+                if opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                    fragments.append(payload)
+                    if fin:
+                        self._dispatch(b"".join(fragments))
+                        fragments = []
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            error = Aria2RpcError(f"aria2 RPC connection lost: {e}")
+        finally:
+            self._fail_waiters(error)
+
+    def _dispatch(self, raw: bytes) -> None:
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            console.print("[yellow]Ignoring malformed aria2 RPC message[/yellow]")
+            return
+
+        if "id" in message:
+            future = self._pending.get(str(message["id"]))
+            if future is None or future.done():
+                return
+            if "error" in message:
+                error = message["error"] or {}
+                future.set_exception(
+                    Aria2RpcError(f"aria2 RPC error {error.get('code')}: {error.get('message')}")
+                )
+            else:
+                future.set_result(message.get("result"))
+            return
+
+        outcome = _TERMINAL_EVENTS.get(message.get("method", ""))
+        if outcome is None:
+            return
+        for event in message.get("params") or []:
+            gid = event.get("gid") if isinstance(event, dict) else None
+            if not gid:
+                continue
+            watcher = self._watchers.get(gid)
+            if watcher is None:
+                self._early_events[gid] = outcome
+                if len(self._early_events) > _EARLY_EVENTS_MAX:
+                    self._early_events.popitem(last=False)
+            elif not watcher.done():
+                watcher.set_result(outcome)
+
+    def _fail_waiters(self, error: Exception) -> None:
+        for future in [*self._pending.values(), *self._watchers.values()]:
+            if not future.done():
+                future.set_exception(error)
+                # Watchers may never be awaited once the download loop has exited
+                future.exception()
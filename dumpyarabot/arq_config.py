@@ -4,6 +4,7 @@ This module provides ARQ configuration and connection pool management
 that integrates with the existing Redis configuration.
 """
 
+import asyncio
 import json
 import os
 import shutil
@@ -11,7 +12,6 @@ import signal as _signal
 import subprocess
 import time
 from datetime import datetime, timezone
-from pathlib import Path
 from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse
 
@@ -29,7 +29,12 @@ from arq.constants import (
 from rich.console import Console
 
 from dumpyarabot.config import settings
+from dumpyarabot.download_ahead import DownloadAheadService
+from dumpyarabot.job_journal import sweep_resumable_jobs
+from dumpyarabot.partial_downloads import sweep_partial_downloads
 from dumpyarabot.schemas import JobCancelResult
+from dumpyarabot.scratch_tiers import all_roots
+from dumpyarabot.tool_manager import tool_manager
 
 console = Console()
 
@@ -639,6 +644,44 @@ class ARQPool:
 
         return list(dict.fromkeys(queued_job_ids + in_progress_job_ids))
 
+    async def is_job_active(self, job_id: str) -> bool:
+        """Whether a job is still queued, deferred or running."""
+        pool = await self.get_pool()
+        job = arq.jobs.Job(job_id, pool, _queue_name=WorkerSettings.queue_name)
+        status = await job.status()
+        return status in (
+            arq.jobs.JobStatus.deferred,
+            arq.jobs.JobStatus.queued,
+            arq.jobs.JobStatus.in_progress,
+        )
+
+    async def get_queued_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        """Get payloads of the next queued (not yet started) jobs, in pick order."""
+        pool = await self.get_pool()
+        now_ms = int(time.time() * 1000)
+        # Over-fetch: running jobs stay in the queue ZSET until they finish
+        raw_job_ids = await pool.zrangebyscore(
+            WorkerSettings.queue_name, "-inf", now_ms, start=0, num=limit + settings.ARQ_MAX_JOBS * 4
+        )
+
+        payloads: List[Dict[str, Any]] = []
+        for raw_job_id in raw_job_ids:
+            job_id = raw_job_id.decode() if isinstance(raw_job_id, bytes) else raw_job_id
+            if await pool.exists(self._make_job_key(in_progress_key_prefix, job_id)):
+                continue
+            blob = await pool.get(self._make_job_key(job_key_prefix, job_id))
+            if not blob:
+                continue
+            try:
+                job_def = arq.jobs.deserialize_job(blob)
+            except Exception:
+                continue
+            if job_def.args and isinstance(job_def.args[0], dict):
+                payloads.append(job_def.args[0])
+            if len(payloads) >= limit:
+                break
+        return payloads
+
     async def get_recent_job_results(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent completed ARQ job results for this queue."""
         pool = await self.get_pool()
@@ -806,21 +849,22 @@ async def after_job_end(ctx: Dict[str, Any]) -> None:
     await arq_pool.clear_running_job(job_id)
     await arq_pool.clear_job_processes(job_id)
     await arq_pool.clear_job_cancel_request(job_id)
+    # Later requests for the same firmware queue a new job again
+    from dumpyarabot.message_queue import message_queue
+    await message_queue.release_active_dump(job_id)
 
 
 async def _sweep_stale_work_dirs() -> None:
     """Remove `dump_<job>_<rand>/` dirs left behind by SIGKILL'd workers.
 
-    Multi-worker safe: skips any dir whose job still has a running_job:<id>
-    Redis key (i.e. owned by *some* live worker), and skips anything younger
-    than job_timeout + 1h (covers the enqueue→pick→register race where a
+    Looks in WORK_DIR_BASE and in every SCRATCH_ROOTS root. Multi-worker
+    safe: skips any dir whose job still has a running_job:<id> Redis key
+    (i.e. owned by *some* live worker), and skips anything younger than
+    job_timeout + 1h (covers the enqueue→pick→register race where a
     brand-new dir has no Redis key for a few seconds).
     """
-    base_str = settings.WORK_DIR_BASE
-    if not base_str:
-        return
-    base = Path(base_str)
-    if not base.is_dir():
+    roots = all_roots()
+    if not roots:
         return
 
     pool = await arq_pool.get_pool()
@@ -829,7 +873,8 @@ async def _sweep_stale_work_dirs() -> None:
     removed = 0
     freed_bytes = 0
 
-    for entry in base.iterdir():
+    entries = [entry for root in roots for entry in root.iterdir()]
+    for entry in entries:
         if not entry.is_dir() or not entry.name.startswith("dump_"):
             continue
 
@@ -926,6 +971,36 @@ async def on_startup(ctx: Dict[str, Any]) -> None:
     except Exception as exc:
         console.print(f"[red]on_startup work-dir sweep failed: {exc}[/red]")
 
+    try:
+        await asyncio.to_thread(sweep_partial_downloads)
+    except Exception as exc:
+        console.print(f"[red]on_startup partial-download sweep failed: {exc}[/red]")
+
+    try:
+        await asyncio.to_thread(sweep_resumable_jobs)
+    except Exception as exc:
+        console.print(f"[red]on_startup resumable-job sweep failed: {exc}[/red]")
+
+    download_ahead = DownloadAheadService()
+    download_ahead.start()
+    ctx["download_ahead"] = download_ahead
+
+    # Install the pinned tool environments in the background; a job that
+    # starts before they are ready waits for them in tool_manager.prepare()
+    ctx["tool_warmup"] = asyncio.create_task(tool_manager.prepare())
+
+
+async def on_shutdown(ctx: Dict[str, Any]) -> None:
+    """ARQ hook: stop the services started in on_startup."""
+    download_ahead = ctx.get("download_ahead")
+    if download_ahead is not None:
+        await download_ahead.stop()
+
+    tool_warmup = ctx.get("tool_warmup")
+    if tool_warmup is not None and not tool_warmup.done():
+        tool_warmup.cancel()
+        await asyncio.gather(tool_warmup, return_exceptions=True)
+
 
 async def init_arq():
     """Initialize ARQ pool (call this at startup)."""
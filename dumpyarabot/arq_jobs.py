@@ -5,20 +5,35 @@ while preserving all Telegram messaging features and cross-chat functionality.
 """
 
 import asyncio
+import os
 import re
-import tempfile
+import shutil
 import traceback
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Optional
 from urllib.parse import urlsplit, urlunsplit
 
+from arq import Retry
+from arq.constants import retry_key_prefix
 from rich.console import Console
 
 from dumpyarabot.aria2_manager import DownloadProgress
 from dumpyarabot.config import settings
+from dumpyarabot.disk_admission import (
+    STAGE_DOWNLOADED,
+    STAGE_EXTRACTED,
+    DiskAdmissionDeferred,
+    DiskReservation,
+    admit_job,
+)
+from dumpyarabot.duplicate_check import DuplicateCheck, DuplicateDumpError
 from dumpyarabot.firmware_downloader import FirmwareDownloader
-from dumpyarabot.firmware_extractor import FirmwareExtractor
+from dumpyarabot.firmware_extractor import (
+    ALT_DUMPER_PARTITIONS,
+    BOOT_IMAGES,
+    FirmwareExtractor,
+)
 from dumpyarabot.gitlab_manager import (
     GITLAB_BASE_URL,
     GitLabManager,
@@ -28,10 +43,23 @@ from dumpyarabot.message_formatting import (
     format_comprehensive_progress_message,
     format_download_progress,
 )
-from dumpyarabot.message_queue import message_queue
+from dumpyarabot.job_journal import (
+    STAGE_BOOT_IMAGES,
+    STAGE_COMMIT,
+    STAGE_DOWNLOAD,
+    STAGE_EXTRACT,
+    STAGE_PROPERTIES,
+    STAGE_PUSH,
+    StageJournal,
+    clear_work_dir,
+    job_workspace,
+)
+from dumpyarabot.message_queue import _dump_dedupe_key, message_queue
 from dumpyarabot.process_utils import reset_current_job_id, set_current_job_id
 from dumpyarabot.property_extractor import PropertyExtractor
 from dumpyarabot.schemas import DumpJob
+from dumpyarabot.scratch_tiers import TIER_DOWNLOAD, make_tier_dir
+from dumpyarabot.tool_manager import tool_manager
 
 console = Console()
 
@@ -236,6 +264,13 @@ async def _send_status_update(
         if record_activity:
             job_data["_last_status_activity_at"] = status_timestamp
 
+    # Duplicate requests that were attached to this job follow its progress
+    await message_queue.send_to_job_subscribers(
+        job_data["job_id"],
+        formatted_message,
+        context={"job_id": job_data["job_id"], "worker_id": "arq_worker", "progress": progress},
+    )
+
 
 def _build_failure_log_text(job_data: Dict[str, Any]) -> str:
     """Assemble a plain-text failure log from job metadata."""
@@ -347,6 +382,11 @@ async def _send_failure_notification(job_data: Dict[str, Any], error_details: st
                 parse_mode=settings.DEFAULT_PARSE_MODE,
                 context={"job_id": job_data.get("job_id", "unknown"), "type": "failure"}
             )
+        await message_queue.send_to_job_subscribers(
+            job_data.get("job_id", "unknown"),
+            formatted_message,
+            context={"job_id": job_data.get("job_id", "unknown"), "type": "failure"},
+        )
 
         console.print(f"[green]Sent failure notification for job {job_data.get('job_id', 'unknown')}[/green]")
 
@@ -419,6 +459,8 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
     job_id = job_data["job_id"]
     console.print(f"[blue]ARQ processing job {job_id}[/blue]")
     job_token = None
+    reservation: Optional[DiskReservation] = None
+    download_dir: Optional[Path] = None
     from dumpyarabot.arq_config import arq_pool
 
     try:
@@ -471,132 +513,222 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
                 raise RuntimeError(
                     f"WORK_DIR_BASE {base} does not exist or is not a directory"
                 )
-        else:
-            # Empty string from `WORK_DIR_BASE=` (no value) is treated as
-            # unset — pass None to TemporaryDirectory.
-            work_dir_base = None
-
-        # Create temporary work directory (rooted under WORK_DIR_BASE if set,
-        # otherwise the system tempdir).
-        with tempfile.TemporaryDirectory(
-            prefix=f"dump_{job_id}_",
-            dir=work_dir_base,
-        ) as temp_dir:
-            work_dir = Path(temp_dir)
+
+        # Create the work directory (rooted under WORK_DIR_BASE if set,
+        # otherwise the system tempdir). With JOB_RESUME_TTL it is keyed on
+        # the dump, so a retry continues after the last completed stage.
+        with job_workspace(job_id, _dump_dedupe_key(job_data)) as (work_dir, journal):
             console.print(f"[blue]Working directory: {work_dir}[/blue]")
+            _prepare_resume(work_dir, journal)
+            job_data["metadata"]["resumed_after"] = journal.last_completed()
 
             try:
                 # Initialize components (exact same as original)
                 await _raise_if_job_cancel_requested(job_id)
-                downloader = FirmwareDownloader(str(work_dir))
                 extractor = FirmwareExtractor(str(work_dir))
                 prop_extractor = PropertyExtractor(str(work_dir))
                 gitlab_manager = GitLabManager(str(work_dir))
 
                 # Step 1: Environment setup and URL validation (4%)
                 await update_progress_with_metadata(job_data, " Validating URL and setting up environment...", 4.0)
+                # Near zero once the worker has warmed the tool cache; a
+                # cold start shows up here
+                tool_seconds = await tool_manager.prepare()
+                job_data["metadata"]["tool_resolution_seconds"] = round(tool_seconds, 2)
 
                 # Step 2: GitLab access validation (8%)
                 await update_progress_with_metadata(job_data, " Validating GitLab access...", 8.0)
                 await _validate_gitlab_access()
                 is_whitelisted = await gitlab_manager.check_whitelist(str(job_data["dump_args"]["url"]))
 
+                # Reserve scratch space for the archive, the extracted tree
+                # and the git objects; come back later while other jobs hold
+                # the disk
+                # The archive goes to the "download" scratch tier when there
+                # is one, keeping its sequential write off the extraction disk
+                if not journal.done(STAGE_DOWNLOAD):
+                    download_dir = make_tier_dir(TIER_DOWNLOAD, f"dump_{job_id}_")
+                try:
+                    reservation = await admit_job(
+                        job_id, str(job_data["dump_args"]["url"]),
+                        root=work_dir, archive_root=download_dir,
+                    )
+                except DiskAdmissionDeferred as e:
+                    await update_progress_with_metadata(job_data, str(e), 10.0)
+                    raise await _retry_later(ctx, e.retry_in) from None
+
                 # Step 3: URL optimization and mirror selection (12%)
                 await update_progress_with_metadata(job_data, " Optimizing download URL and selecting mirrors...", 12.0)
 
-                # Step 4: Starting download (15%)
-                await update_progress_with_metadata(job_data, " Downloading firmware...", 15.0)
-
                 # Create DumpJob object for components that need it
                 dump_job = DumpJob.model_validate(job_data)
 
-                # Download with live progress via aria2 RPC callback.
-                # Download progress is mapped into the 15%-50% band of overall job progress.
-                async def _on_download_progress(dp: DownloadProgress) -> None:
-                    dl_pct = dp.percentage  # 0-100 within download
-                    overall_pct = 15.0 + (dl_pct / 100.0) * 35.0  # map to 15%-50%
-                    dl_info = format_download_progress(dp)
-                    step_msg = f" Downloading firmware...\n{dl_info}"
-
-                    progress_data = {
-                        "current_step": step_msg,
-                        "percentage": overall_pct,
-                        "current_step_number": 4,
+                if journal.done(STAGE_DOWNLOAD):
+                    download = journal.result(STAGE_DOWNLOAD)
+                    payload_images = [work_dir / name for name in download["payload_images"]]
+                    if not payload_images:
+                        firmware_path = download["firmware_path"]
+                        firmware_name = download["firmware_name"]
+                        job_data["metadata"]["download_info"] = download["download_info"]
+                else:
+                    # Step 4: Starting download (15%)
+                    await update_progress_with_metadata(job_data, " Downloading firmware...", 15.0)
+                    downloader = FirmwareDownloader(
+                        str(work_dir), download_dir=str(download_dir) if download_dir else None
+                    )
+
+                    # Download with live progress via aria2 RPC callback.
+                    # Download progress is mapped into the 15%-50% band of overall job progress.
+                    async def _on_download_progress(dp: DownloadProgress) -> None:
+                        dl_pct = dp.percentage  # 0-100 within download
+                        overall_pct = 15.0 + (dl_pct / 100.0) * 35.0  # map to 15%-50%
+                        dl_info = format_download_progress(dp)
+                        step_msg = f" Downloading firmware...\n{dl_info}"
+
+                        progress_data = {
+                            "current_step": step_msg,
+                            "percentage": overall_pct,
+                            "current_step_number": 4,
+                            "total_steps": 25,
+                        }
+                        await _send_status_update(job_data, step_msg, progress_data, job_data.get("metadata"))
+
+                    # Use PeriodicTimerUpdate as a fallback for downloaders without
+                    # live progress (Google Drive, MediaFire, MEGA, wget fallback).
+                    # When aria2 RPC is active, the callback above sends updates instead.
+                    download_progress = {
+                        "current_step": "Download",
                         "total_steps": 25,
+                        "current_step_number": 4,
+                        "percentage": 15.0,
                     }
-                    await _send_status_update(job_data, step_msg, progress_data, job_data.get("metadata"))
-
-                # Use PeriodicTimerUpdate as a fallback for downloaders without
-                # live progress (Google Drive, MediaFire, MEGA, wget fallback).
-                # When aria2 RPC is active, the callback above sends updates instead.
-                download_progress = {
-                    "current_step": "Download",
-                    "total_steps": 25,
-                    "current_step_number": 4,
-                    "percentage": 15.0,
-                }
-                async with PeriodicTimerUpdate(job_data, " Downloading firmware...", download_progress):
-                    firmware_path, firmware_name = await downloader.download_firmware(
-                        dump_job, on_progress=_on_download_progress
+                    async with PeriodicTimerUpdate(job_data, " Downloading firmware...", download_progress):
+                        # Alt-dumper jobs on A/B OTAs can skip the full archive and
+                        # pull just the dumped partitions out of the remote payload.
+                        payload_images = None
+                        if dump_job.dump_args.use_alt_dumper and settings.REMOTE_PAYLOAD_EXTRACTION:
+                            payload_images = await downloader.fetch_payload_partitions(
+                                dump_job,
+                                ALT_DUMPER_PARTITIONS + [Path(name).stem for name in BOOT_IMAGES],
+                                on_progress=_on_download_progress,
+                            )
+                        if not payload_images:
+                            firmware_path, firmware_name = await downloader.download_firmware(
+                                dump_job, on_progress=_on_download_progress
+                            )
+                            job_data["metadata"]["download_info"] = downloader.download_info
+                    journal.complete(
+                        STAGE_DOWNLOAD,
+                        payload_images=[os.path.relpath(path, work_dir) for path in payload_images or []],
+                        firmware_path=None if payload_images else firmware_path,
+                        firmware_name=None if payload_images else firmware_name,
+                        download_info=None if payload_images else downloader.download_info,
                     )
 
+                if reservation is not None:
+                    await reservation.stage_completed(STAGE_DOWNLOADED)
+
                 # Step 5: Download completed (50%)
                 await update_progress_with_metadata(job_data, " Firmware download completed", 50.0)
 
-                # Step 6: Starting firmware extraction (52%)
-                await update_progress_with_metadata(job_data, " Extracting firmware partitions...", 52.0)
-
-                # Use periodic timer for extraction operation
-                async with PeriodicTimerUpdate(job_data, " Extracting firmware partitions...", {"current_step": "Extract", "total_steps": 25, "current_step_number": 6, "percentage": 52.0}):
-                    await extractor.extract_firmware(dump_job, firmware_path)
+                if not journal.done(STAGE_EXTRACT):
+                    # Step 6: Starting firmware extraction (52%)
+                    await update_progress_with_metadata(job_data, " Extracting firmware partitions...", 52.0)
+
+                    # Look the branch up in GitLab as soon as the build props are
+                    # known, so a duplicate fails before the slow stages run
+                    duplicate_check = None
+                    if not job_data["dump_args"].get("force", False):
+                        duplicate_check = DuplicateCheck(str(work_dir), gitlab_manager, settings.DUMPER_TOKEN)
+                        if not payload_images:
+                            duplicate_check.check_archive(firmware_path)
+                        duplicate_check.check_when_ready(extractor.props_ready)
+
+                    # Use periodic timer for extraction operation
+                    async with PeriodicTimerUpdate(job_data, " Extracting firmware partitions...", {"current_step": "Extract", "total_steps": 25, "current_step_number": 6, "percentage": 52.0}):
+                        if payload_images:
+                            extraction = extractor.extract_partition_images()
+                        else:
+                            extraction = extractor.extract_firmware(dump_job, firmware_path)
+                        if duplicate_check is not None:
+                            await duplicate_check.run_alongside(extraction)
+                        else:
+                            await extraction
+                    journal.complete(STAGE_EXTRACT)
+
+                if reservation is not None:
+                    await reservation.stage_completed(STAGE_EXTRACTED)
 
                 # Step 7: Firmware extraction completed (56%)
                 await update_progress_with_metadata(job_data, " Firmware extraction completed", 56.0)
 
-                # Step 8: Process boot images (58%)
-                await update_progress_with_metadata(job_data, " Processing boot images...", 58.0)
-                await extractor.process_boot_images()
-
-                # Step 9: Generate board-info.txt (60%)
-                await update_progress_with_metadata(job_data, " Generating board-info.txt...", 60.0)
-                await prop_extractor.generate_board_info()
-
-                # Step 10: Generate all_files.txt (62%)
-                await update_progress_with_metadata(job_data, " Generating all_files.txt...", 62.0)
-                await prop_extractor.generate_all_files_list()
-
-                # Step 11: Generate device tree (64%)
-                await update_progress_with_metadata(job_data, " Generating device tree...", 64.0)
-                await prop_extractor.generate_device_tree()
-
-                # Step 12: Extracting device properties (66%)
-                await update_progress_with_metadata(job_data, " Extracting device properties...", 66.0)
-                device_props = await prop_extractor.extract_properties()
+                if journal.done(STAGE_BOOT_IMAGES):
+                    boot_image_timings = journal.result(STAGE_BOOT_IMAGES)["timings"]
+                else:
+                    # Step 8: Process boot images (58%)
+                    await update_progress_with_metadata(job_data, " Processing boot images...", 58.0)
+                    await extractor.process_boot_images()
+                    boot_image_timings = {
+                        step: round(seconds, 2) for step, seconds in extractor.boot_image_timings.items()
+                    }
+                    journal.complete(STAGE_BOOT_IMAGES, timings=boot_image_timings)
+                job_data["metadata"]["boot_image_timings"] = boot_image_timings
+
+                if journal.done(STAGE_PROPERTIES):
+                    device_props = journal.result(STAGE_PROPERTIES)["device_props"]
+                else:
+                    # Step 9: Generate board-info.txt (60%)
+                    await update_progress_with_metadata(job_data, " Generating board-info.txt...", 60.0)
+                    await prop_extractor.generate_board_info()
+
+                    # Step 10: Generate all_files.txt (62%)
+                    await update_progress_with_metadata(job_data, " Generating all_files.txt...", 62.0)
+                    await prop_extractor.generate_all_files_list()
+
+                    # Step 11: Generate device tree (64%)
+                    await update_progress_with_metadata(job_data, " Generating device tree...", 64.0)
+                    await prop_extractor.generate_device_tree()
+
+                    # Step 12: Extracting device properties (66%)
+                    await update_progress_with_metadata(job_data, " Extracting device properties...", 66.0)
+                    device_props = await prop_extractor.extract_properties()
+                    journal.complete(STAGE_PROPERTIES, device_props=device_props)
                 job_data["metadata"]["device_info"] = device_props
                 await update_progress_with_metadata(job_data, " Device analysis completed", 68.0)
 
-                # Step 13: Checking/creating GitLab subgroup (70%)
-                await update_progress_with_metadata(job_data, " Checking GitLab subgroup...", 70.0)
+                if journal.done(STAGE_PUSH):
+                    repo_url = journal.result(STAGE_PUSH)["repo_url"]
+                    repo_path = journal.result(STAGE_PUSH)["repo_path"]
+                else:
+                    # Step 13: Checking/creating GitLab subgroup (70%)
+                    await update_progress_with_metadata(job_data, " Checking GitLab subgroup...", 70.0)
 
-                # Step 14: Checking/creating GitLab project (72%)
-                await update_progress_with_metadata(job_data, " Checking GitLab project...", 72.0)
+                    # Step 14: Checking/creating GitLab project (72%)
+                    await update_progress_with_metadata(job_data, " Checking GitLab project...", 72.0)
 
-                # Step 15: Setting up git repository (74%)
-                await update_progress_with_metadata(job_data, " Creating GitLab repository...", 74.0)
+                    # Step 15: Setting up git repository (74%)
+                    await update_progress_with_metadata(job_data, " Creating GitLab repository...", 74.0)
 
-                # Use periodic timer for GitLab operation (longest post-download operation)
-                gitlab_progress = {
-                    "current_step": "GitLab",
-                    "total_steps": 25,
-                    "current_step_number": 15,
-                    "percentage": 74.0,
-                }
-                async with PeriodicTimerUpdate(job_data, " Creating GitLab repository...", gitlab_progress):
-                    repo_url, repo_path = await gitlab_manager.create_and_push_repository(
-                        device_props,
-                        settings.DUMPER_TOKEN,
-                        force=job_data["dump_args"].get("force", False),
-                    )
+                    # Use periodic timer for GitLab operation (longest post-download operation)
+                    gitlab_progress = {
+                        "current_step": "GitLab",
+                        "total_steps": 25,
+                        "current_step_number": 15,
+                        "percentage": 74.0,
+                    }
+                    async with PeriodicTimerUpdate(job_data, " Creating GitLab repository...", gitlab_progress):
+                        repo_url, repo_path = await gitlab_manager.create_and_push_repository(
+                            device_props,
+                            settings.DUMPER_TOKEN,
+                            force=job_data["dump_args"].get("force", False),
+                            commit_built=journal.done(STAGE_COMMIT),
+                            on_commit_built=lambda: journal.complete(STAGE_COMMIT),
+                        )
+                    journal.complete(STAGE_PUSH, repo_url=repo_url, repo_path=repo_path)
+
+                # The dump is pushed; the work dir no longer grows
+                if reservation is not None:
+                    await reservation.release()
 
                 # Step 16: Preparing channel notification (88%)
                 await update_progress_with_metadata(job_data, " Preparing channel notification...", 88.0)
@@ -628,6 +760,8 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
                     "metadata": job_data["metadata"]
                 }
 
+            except Retry:
+                raise
             except JobCancelledError as e:
                 job_data["metadata"].update({
                     "status": "cancelled",
@@ -642,6 +776,8 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
                 return {"success": False, "error": str(e), "metadata": job_data["metadata"]}
             except Exception as e:
                 console.print(f"[red]Error in inner processing for job {job_id}: {e}[/red]")
+                # Keep the completed stages for a retry, unless retrying is pointless
+                journal.keep = not isinstance(e, DuplicateDumpError)
 
                 # Enhanced error handling
                 metadata = job_data.get("metadata") or {}
@@ -667,6 +803,8 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
 
                 return {"success": False, "error": str(e), "metadata": job_data["metadata"]}
 
+    except Retry:
+        raise
     except Exception as e:
         console.print(f"[red]Critical error processing job {job_id}: {e}[/red]")
         console.print_exception()
@@ -695,6 +833,10 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
 
         return {"success": False, "error": str(e), "metadata": job_data["metadata"]}
     finally:
+        if reservation is not None:
+            await reservation.release()
+        if download_dir is not None:
+            shutil.rmtree(download_dir, ignore_errors=True)
         if job_token is not None:
             reset_current_job_id(job_token)
         # Ownership cleanup moved to the after_job_end hook (arq_config.after_job_end)
@@ -703,6 +845,49 @@ async def process_firmware_dump(ctx, job_data: Dict[str, Any]) -> Dict[str, Any]
         # teardown race that prompted moving to a hook in the first place.
 
 
+async def _retry_later(ctx: Dict[str, Any], defer: float) -> Retry:
+    """
+    Build the Retry that runs the job again in defer seconds.
+
+    The wait happens in the queue, so it holds no worker slot and does not
+    count against job_timeout. ARQ counts each run as a try; the deferral
+    gives its try back, so max_tries still only counts real failures.
+    """
+    redis = ctx.get("redis")
+    if redis is not None and ctx.get("job_id"):
+        await redis.decr(f"{retry_key_prefix}{ctx['job_id']}")
+    return Retry(defer=defer)
+
+
+def _prepare_resume(work_dir: Path, journal: StageJournal) -> None:
+    """
+    Drop the leftovers of the stage a previous attempt was interrupted in.
+
+    Args:
+        work_dir: The job's work dir
+        journal: Its stage journal
+    """
+    if journal.done(STAGE_EXTRACT):
+        # Extraction output is complete; git state is handled by
+        # create_and_push_repository, which rebuilds an unfinished commit
+        if not journal.done(STAGE_BOOT_IMAGES):
+            # Partial boot image, kernel and Oppo image output would be pushed
+            FirmwareExtractor(str(work_dir)).clear_boot_image_outputs()
+        return
+
+    kept: list[str] = []
+    if journal.done(STAGE_DOWNLOAD):
+        download = journal.result(STAGE_DOWNLOAD)
+        downloaded = [work_dir / path for path in download["payload_images"]] or [Path(download["firmware_path"])]
+        if all(path.exists() for path in downloaded):
+            # The archive may be on the download tier, outside the work dir
+            kept = [path.relative_to(work_dir).parts[0] for path in downloaded if path.is_relative_to(work_dir)]
+        else:
+            journal.reset(STAGE_DOWNLOAD)
+    # Partial extraction output (or a partial download) is redone
+    clear_work_dir(work_dir, keep=kept)
+
+
 class JobCancelledError(Exception):
     """Raised when a cooperative cancellation request is detected."""
 
@@ -0,0 +1,160 @@
+"""Bandwidth sharing between concurrent aria2 downloads on one host.
+
+Every download registers itself in a per-host Redis hash with a priority
+weight and refreshes a heartbeat on each progress poll. On each poll the
+owning worker recomputes the split of the global speed cap across all live
+downloads and applies its own download's share with aria2's
+``max-download-limit``. Jobs whose later stages are blocked on the download
+(foreground) get a larger weight than speculative prefetches.
+
+Entries whose heartbeat stops (the worker crashed or was killed) are dropped
+and, on a shared daemon, their download is removed so it stops consuming
+bandwidth nobody is waiting for.
+"""
+
+import socket
+import time
+import uuid
+from typing import Dict
+
+from rich.console import Console
+
+from dumpyarabot.aria2_rpc import Aria2RpcClient
+from dumpyarabot.config import settings
+from dumpyarabot.redis_storage import RedisStorage
+
+console = Console()
+
+# Priority weights; a foreground download gets 4x a prefetch's share
+PRIORITY_FOREGROUND = 4
+PRIORITY_PREFETCH = 1
+
+# A registration without a heartbeat for this long belongs to a dead worker
+HEARTBEAT_TIMEOUT = 60.0
+
+
+def compute_download_limits(weights: Dict[str, int], global_limit: int, job_limit: int) -> Dict[str, int]:
+    """Split a global speed cap across downloads by weight.
+
+    Args:
+        weights: Priority weight per download token
+        global_limit: Host-wide cap in bytes/s (0 for unlimited)
+        job_limit: Per-download cap in bytes/s (0 for unlimited)
+
+    Returns:
+        Speed limit in bytes/s per token, 0 meaning unlimited. Bandwidth a
+        capped download can't use is redistributed to the others.
+    """
+    if not weights:
+        return {}
+    if global_limit <= 0:
+        return {token: max(job_limit, 0) for token in weights}
+
+    limits: Dict[str, int] = {}
+    remaining = {token: max(weight, 1) for token, weight in weights.items()}
+    budget = global_limit
+    while remaining:
+        total_weight = sum(remaining.values())
+        capped = [
+            token for token, weight in remaining.items()
+            if job_limit > 0 and budget * weight / total_weight >= job_limit
+        ]
+        if not capped:
+            for token, weight in remaining.items():
+                # aria2 treats 0 as unlimited, so never hand out a zero share
+                limits[token] = max(1, int(budget * weight / total_weight))
+            break
+        for token in capped:
+            limits[token] = job_limit
+            budget -= job_limit
+            del remaining[token]
+
+    return limits
+
+
+class BandwidthScheduler:
+    """Registers one aria2 download and keeps its speed limit at its fair share."""
+
+    def __init__(self, rpc: Aria2RpcClient, shared_daemon: bool):
+        self._rpc = rpc
+        self._shared_daemon = shared_daemon
+        self._host = socket.gethostname()
+        self._token = uuid.uuid4().hex
+        self._entry: Dict | None = None
+        self._applied_limit: int | None = None
+
+    @staticmethod
+    def enabled() -> bool:
+        """Whether any speed cap is configured."""
+        return settings.ARIA2_MAX_OVERALL_SPEED > 0 or settings.ARIA2_MAX_JOB_SPEED > 0
+
+    async def register(self, gid: str, priority: int = PRIORITY_FOREGROUND) -> None:
+        """Register a freshly added download and apply its initial share."""
+        self._entry = {
+            "gid": gid,
+            "weight": priority,
+            "shared": self._shared_daemon,
+            "heartbeat": time.time(),
+        }
+        await self.rebalance()
+
+    async def rebalance(self) -> None:
+        """Refresh this download's heartbeat and re-apply its share of the cap."""
+        if self._entry is None:
+            return
+
+        try:
+            self._entry["heartbeat"] = time.time()
+            await RedisStorage.store_active_download(self._host, self._token, self._entry)
+            downloads = await RedisStorage.get_active_downloads(self._host)
+        except Exception as e:
+            console.print(f"[yellow]Bandwidth scheduler unavailable: {e}[/yellow]")
+            return
+
+        now = time.time()
+        weights = {}
+        for token, entry in downloads.items():
+            if now - entry.get("heartbeat", 0) <= HEARTBEAT_TIMEOUT:
+                weights[token] = int(entry.get("weight", PRIORITY_FOREGROUND))
+                continue
+            await self._reap(token, entry)
+
+        limit = compute_download_limits(
+            weights, settings.ARIA2_MAX_OVERALL_SPEED, settings.ARIA2_MAX_JOB_SPEED
+        ).get(self._token, 0)
+        if limit == self._applied_limit:
+            return
+
+        try:
+            await self._rpc.call(
+                "aria2.changeOption", self._entry["gid"], {"max-download-limit": str(limit)}
+            )
+            self._applied_limit = limit
+            shown = f"{limit / (1024 * 1024):.1f} MB/s" if limit else "unlimited"
+            console.print(f"[blue]Download speed limit: {shown} ({len(weights)} active on host)[/blue]")
+        except Exception as e:
+            console.print(f"[yellow]Failed to apply download speed limit: {e}[/yellow]")
+
+    async def _reap(self, token: str, entry: Dict) -> None:
+        """Forget a dead worker's download, stopping it on the shared daemon."""
+        try:
+            await RedisStorage.remove_active_download(self._host, token)
+        except Exception:
+            return
+        console.print(f"[yellow]Dropping stale download registration (gid={entry.get('gid')})[/yellow]")
+        # A per-job daemon died with its worker; only shared-daemon downloads linger
+        if self._shared_daemon and entry.get("shared") and entry.get("gid"):
+            try:
+                await self._rpc.call("aria2.forceRemove", entry["gid"])
+            except Exception:
+                pass
+
+    async def release(self) -> None:
+        """Unregister the download once it has finished or failed."""
+        if self._entry is None:
+            return
+        self._entry = None
+        try:
+            await RedisStorage.remove_active_download(self._host, self._token)
+        except Exception as e:
+            console.print(f"[yellow]Failed to unregister download: {e}[/yellow]")
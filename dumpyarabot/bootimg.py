@@ -0,0 +1,541 @@
+"""In-process Android boot image unpacking.
+
+Parses boot image headers v0-v4 ("ANDROID!") and vendor_boot v3/v4
+("VNDRBOOT") from one memory map. It writes the sections under the names
+unpackbootimg uses (``boot.img-kernel``, ``boot.img-ramdisk``, ...) and
+streams each ramdisk through its decompressor straight into a cpio
+extractor, with no decompressed copy on disk. This replaces the
+unpackbootimg, ``file``, ``unlz4`` and ``7zz`` chain.
+
+Header layouts: system/tools/mkbootimg/include/bootimg/bootimg.h.
+"""
+
+import bz2
+import lzma
+import mmap
+import os
+import stat
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import lz4.block as lz4_block
+except ImportError:  # pragma: no cover - optional accelerator
+    lz4_block = None  # type: ignore[assignment]
+
+BOOT_MAGIC = b"ANDROID!"
+VENDOR_BOOT_MAGIC = b"VNDRBOOT"
+
+# v0-v2: magic, kernel_size, kernel_addr, ramdisk_size, ramdisk_addr,
+# second_size, second_addr, tags_addr, page_size, header_version,
+# os_version, name, cmdline, id, extra_cmdline
+_BOOT_V0 = struct.Struct("<8s10I16s512s32s1024s")
+_BOOT_V1_EXTRA = struct.Struct("<IQI")  # recovery_dtbo_size, recovery_dtbo_offset, header_size
+_BOOT_V2_EXTRA = struct.Struct("<IQ")  # dtb_size, dtb_addr
+# v3/v4: magic, kernel_size, ramdisk_size, os_version, header_size,
+# reserved[4], header_version, cmdline
+_BOOT_V3 = struct.Struct("<8s4I4II1536s")
+_BOOT_V4_EXTRA = struct.Struct("<I")  # signature_size
+_BOOT_V3_PAGE_SIZE = 4096
+# vendor v3: magic, header_version, page_size, kernel_addr, ramdisk_addr,
+# vendor_ramdisk_size, cmdline, tags_addr, name, header_size, dtb_size,
+# dtb_addr
+_VENDOR_V3 = struct.Struct("<8s5I2048sI16sIIQ")
+# vendor v4: vendor_ramdisk_table_size, _entry_num, _entry_size, bootconfig_size
+_VENDOR_V4_EXTRA = struct.Struct("<4I")
+# ramdisk table entry: size, offset, type, name, board_id[16]
+_VENDOR_RAMDISK_ENTRY = struct.Struct("<3I32s64s")
+
+_KERNEL_OFFSET = 0x00008000
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_LZ4_LEGACY_MAGIC = 0x184C2102
+_LZ4_LEGACY_BLOCK = 8 * 1024 * 1024
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+_LZMA_MAGIC = b"\x5d\x00\x00"
+_BZIP2_MAGIC = b"BZh"
+_CPIO_MAGICS = (b"070701", b"070702")
+
+_CHUNK = 1024 * 1024
+
+
+@dataclass
+class Ramdisk:
+    """One ramdisk (or v4 vendor ramdisk fragment) inside an image."""
+
+    offset: int
+    size: int
+    name: str = ""
+
+
+@dataclass
+class BootImage:
+    """Section layout and header fields of a boot or vendor_boot image."""
+
+    vendor: bool
+    header_version: int
+    page_size: int
+    sections: Dict[str, Tuple[int, int]] = field(default_factory=dict)  # file suffix -> (offset, size)
+    ramdisks: List[Ramdisk] = field(default_factory=list)
+    info: Dict[str, str] = field(default_factory=dict)  # file suffix -> text
+
+
+class UnsupportedRamdisk(Exception):
+    """The ramdisk uses a compression or archive format this module cannot read."""
+
+
+def _align(offset: int, page_size: int) -> int:
+    return (offset + page_size - 1) // page_size * page_size
+
+
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+def _os_version(value: int) -> Dict[str, str]:
+    if not value:
+        return {}
+    version, patch = value >> 11, value & 0x7FF
+    info = {}
+    if version:
+        info["os_version"] = f"{(version >> 14) & 0x7F}.{(version >> 7) & 0x7F}.{version & 0x7F}"
+    if patch:
+        info["os_patch_level"] = f"{(patch >> 4) + 2000}-{patch & 0xF:02d}"
+    return info
+
+
+def _parse_boot(data: Union[bytes, mmap.mmap]) -> BootImage:
+    header_version = struct.unpack_from("<I", data, 40)[0]
+    if header_version >= 3 and header_version <= 4:
+        (_, kernel_size, ramdisk_size, os_version, header_size,
+         _, _, _, _, _, cmdline) = _BOOT_V3.unpack_from(data, 0)
+        page = _BOOT_V3_PAGE_SIZE
+        image = BootImage(vendor=False, header_version=header_version, page_size=page)
+        pos = _align(header_size or page, page)
+        image.sections["kernel"] = (pos, kernel_size)
+        pos = _align(pos + kernel_size, page)
+        image.sections["ramdisk"] = (pos, ramdisk_size)
+        if ramdisk_size:
+            image.ramdisks.append(Ramdisk(pos, ramdisk_size))
+        pos = _align(pos + ramdisk_size, page)
+        if header_version == 4:
+            signature_size = _BOOT_V4_EXTRA.unpack_from(data, _BOOT_V3.size)[0]
+            image.sections["signature"] = (pos, signature_size)
+        image.info.update({"cmdline": _cstr(cmdline), **_os_version(os_version)})
+        image.info["pagesize"] = str(page)
+        image.info["header_version"] = str(header_version)
+        return image
+
+    (_, kernel_size, kernel_addr, ramdisk_size, ramdisk_addr, second_size,
+     second_addr, tags_addr, page, header_version, os_version, name, cmdline,
+     _, extra_cmdline) = _BOOT_V0.unpack_from(data, 0)
+    if page == 0 or page & (page - 1):
+        raise ValueError(f"Invalid page size {page}")
+    # Older Qualcomm images reuse the header_version field for a DT size
+    dt_size = 0
+    if header_version > 2:
+        dt_size, header_version = header_version, 0
+
+    image = BootImage(vendor=False, header_version=header_version, page_size=page)
+    pos = page
+    image.sections["kernel"] = (pos, kernel_size)
+    pos = _align(pos + kernel_size, page)
+    image.sections["ramdisk"] = (pos, ramdisk_size)
+    if ramdisk_size:
+        image.ramdisks.append(Ramdisk(pos, ramdisk_size))
+    pos = _align(pos + ramdisk_size, page)
+    image.sections["second"] = (pos, second_size)
+    pos = _align(pos + second_size, page)
+    if dt_size:
+        image.sections["dt"] = (pos, dt_size)
+        pos = _align(pos + dt_size, page)
+    if header_version >= 1:
+        recovery_dtbo_size, _, _ = _BOOT_V1_EXTRA.unpack_from(data, _BOOT_V0.size)
+        image.sections["recovery_dtbo"] = (pos, recovery_dtbo_size)
+        pos = _align(pos + recovery_dtbo_size, page)
+    if header_version >= 2:
+        dtb_size, dtb_addr = _BOOT_V2_EXTRA.unpack_from(data, _BOOT_V0.size + _BOOT_V1_EXTRA.size)
+        image.sections["dtb"] = (pos, dtb_size)
+
+    base = kernel_addr - _KERNEL_OFFSET
+    image.info.update({
+        "cmdline": _cstr(cmdline) + _cstr(extra_cmdline),
+        "board": _cstr(name),
+        "base": f"{base:08x}",
+        "kernel_offset": f"{kernel_addr - base:08x}",
+        "ramdisk_offset": f"{ramdisk_addr - base:08x}",
+        "second_offset": f"{second_addr - base:08x}",
+        "tags_offset": f"{tags_addr - base:08x}",
+        "pagesize": str(page),
+        "header_version": str(header_version),
+        **_os_version(os_version),
+    })
+    if header_version >= 2:
+        image.info["dtb_offset"] = f"{dtb_addr - base:016x}"
+    return image
+
+
+def _parse_vendor_boot(data: Union[bytes, mmap.mmap]) -> BootImage:
+    (_, header_version, page, kernel_addr, ramdisk_addr, vendor_ramdisk_size,
+     cmdline, tags_addr, name, header_size, dtb_size, dtb_addr) = _VENDOR_V3.unpack_from(data, 0)
+    if page == 0 or page & (page - 1):
+        raise ValueError(f"Invalid page size {page}")
+
+    image = BootImage(vendor=True, header_version=header_version, page_size=page)
+    pos = _align(header_size, page)
+    ramdisk_start = pos
+    image.sections["vendor_ramdisk"] = (pos, vendor_ramdisk_size)
+    pos = _align(pos + vendor_ramdisk_size, page)
+    image.sections["dtb"] = (pos, dtb_size)
+    pos = _align(pos + dtb_size, page)
+
+    if header_version >= 4:
+        table_size, entry_num, entry_size, bootconfig_size = _VENDOR_V4_EXTRA.unpack_from(data, _VENDOR_V3.size)
+        table_pos = pos
+        pos = _align(pos + table_size, page)
+        image.sections["bootconfig"] = (pos, bootconfig_size)
+        for index in range(entry_num):
+            size, offset, _, raw_name, _ = _VENDOR_RAMDISK_ENTRY.unpack_from(data, table_pos + index * entry_size)
+            image.ramdisks.append(Ramdisk(ramdisk_start + offset, size, _cstr(raw_name) or f"{index:02d}"))
+    elif vendor_ramdisk_size:
+        image.ramdisks.append(Ramdisk(ramdisk_start, vendor_ramdisk_size))
+
+    base = kernel_addr - _KERNEL_OFFSET
+    image.info.update({
+        "vendor_cmdline": _cstr(cmdline),
+        "board": _cstr(name),
+        "base": f"{base:08x}",
+        "kernel_offset": f"{kernel_addr - base:08x}",
+        "ramdisk_offset": f"{ramdisk_addr - base:08x}",
+        "tags_offset": f"{tags_addr - base:08x}",
+        "dtb_offset": f"{dtb_addr - base:016x}",
+        "pagesize": str(page),
+        "header_version": str(header_version),
+    })
+    return image
+
+
+def parse_boot_image(data: Union[bytes, mmap.mmap]) -> Optional[BootImage]:
+    """
+    Read the layout of a boot or vendor_boot image.
+
+    Args:
+        data: The whole image (bytes or a memory map)
+
+    Returns:
+        The layout, or None if data is not a boot image or its sections do
+        not fit in it
+    """
+    try:
+        if data[:8] == BOOT_MAGIC:
+            image = _parse_boot(data)
+        elif data[:8] == VENDOR_BOOT_MAGIC:
+            image = _parse_vendor_boot(data)
+        else:
+            return None
+    except (struct.error, ValueError):
+        return None
+
+    for offset, size in image.sections.values():
+        if offset + size > len(data):
+            return None
+    for ramdisk in image.ramdisks:
+        if ramdisk.offset + ramdisk.size > len(data):
+            return None
+    return image
+
+
+def unpack_boot_image(image_path: Union[str, Path], output_dir: Union[str, Path]) -> Optional[BootImage]:
+    """
+    Write the sections and header fields of an image like unpackbootimg.
+
+    Args:
+        image_path: boot, recovery, init_boot, vendor_boot or
+            vendor_kernel_boot image
+        output_dir: Directory for ``<image name>-<section>`` files
+
+    Returns:
+        The layout, or None if the file is not a boot image
+    """
+    image_path, output_dir = Path(image_path), Path(output_dir)
+    with open(image_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        image = parse_boot_image(mm)
+        if image is None:
+            return None
+        output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = image_path.name
+        for suffix, (offset, size) in image.sections.items():
+            if size:
+                (output_dir / f"{prefix}-{suffix}").write_bytes(mm[offset:offset + size])
+        for suffix, text in image.info.items():
+            (output_dir / f"{prefix}-{suffix}").write_text(text + "\n")
+    return image
+
+
+# ---------------------------------------------------------------- ramdisks
+
+
+def lz4_block_decompress(block: bytes, max_size: int = _LZ4_LEGACY_BLOCK) -> bytes:
+    """
+    Decompress one raw LZ4 block.
+
+    Uses the lz4 package when it is installed, else a plain Python decoder.
+    """
+    if lz4_block is not None:
+        return lz4_block.decompress(block, uncompressed_size=max_size)
+
+    src = block
+    dst = bytearray()
+    pos, end = 0, len(src)
+    while pos < end:
+        token = src[pos]
+        pos += 1
+        literals = token >> 4
+        if literals == 15:
+            while True:
+                extra = src[pos]
+                pos += 1
+                literals += extra
+                if extra != 255:
+                    break
+        dst += src[pos:pos + literals]
+        pos += literals
+        if pos >= end:
+            break
+
+        offset = src[pos] | (src[pos + 1] << 8)
+        pos += 2
+        match = token & 15
+        if match == 15:
+            while True:
+                extra = src[pos]
+                pos += 1
+                match += extra
+                if extra != 255:
+                    break
+        match += 4
+        start = len(dst) - offset
+        if offset == 0 or start < 0:
+            raise ValueError("Corrupt LZ4 block")
+        if offset >= match:
+            dst += dst[start:start + match]
+        else:
+            # Overlapping copy repeats the last offset bytes
+            pattern = bytes(dst[start:])
+            repeats, rest = divmod(match, offset)
+            dst += pattern * repeats + pattern[:rest]
+        if len(dst) > max_size:
+            raise ValueError("LZ4 block larger than its bound")
+    return bytes(dst)
+
+
+def _lz4_legacy_chunks(data: memoryview) -> Iterator[bytes]:
+    pos, end = 0, len(data)
+    while pos + 4 <= end:
+        value = struct.unpack_from("<I", data, pos)[0]
+        pos += 4
+        if value == _LZ4_LEGACY_MAGIC:
+            # Start of a (possibly concatenated) stream
+            continue
+        if value == 0 or pos + value > end:
+            break
+        yield lz4_block_decompress(bytes(data[pos:pos + value]))
+        pos += value
+
+
+def _stream_chunks(data: memoryview, make: Callable[[], object]) -> Iterator[bytes]:
+    """Decompress concatenated streams of a zlib/lzma/bz2-style decompressor."""
+    pending = data
+    while len(pending):
+        decompressor = make()
+        offset = 0
+        while offset < len(pending) and not decompressor.eof:
+            piece = bytes(pending[offset:offset + _CHUNK])
+            offset += len(piece)
+            try:
+                out = decompressor.decompress(piece)
+            except (zlib.error, lzma.LZMAError, OSError, EOFError) as e:
+                # Corrupt data; leaves the ramdisk to the unpackbootimg tools
+                raise UnsupportedRamdisk(f"Corrupt ramdisk: {e}") from e
+            if out:
+                yield out
+        if not decompressor.eof:
+            return
+        unused = decompressor.unused_data
+        rest = pending[offset - len(unused):] if unused else pending[offset:]
+        # Padding after the last stream
+        if not bytes(rest[:2]).strip(b"\0"):
+            return
+        pending = rest
+
+
+def ramdisk_chunks(data: memoryview) -> Iterator[bytes]:
+    """
+    Decompress a ramdisk into chunks of its cpio archive.
+
+    Raises:
+        UnsupportedRamdisk: The compression is not gzip, LZ4 legacy, xz,
+            lzma, bzip2 or none, or (while iterating) the gzip, xz, lzma or
+            bzip2 data is corrupt
+    """
+    head = bytes(data[:8])
+    if head[:2] == _GZIP_MAGIC:
+        return _stream_chunks(data, lambda: zlib.decompressobj(16 + zlib.MAX_WBITS))
+    if len(head) >= 4 and struct.unpack_from("<I", head)[0] == _LZ4_LEGACY_MAGIC:
+        return _lz4_legacy_chunks(data)
+    if head.startswith(_XZ_MAGIC) or head.startswith(_LZMA_MAGIC):
+        return _stream_chunks(data, lzma.LZMADecompressor)
+    if head.startswith(_BZIP2_MAGIC):
+        return _stream_chunks(data, bz2.BZ2Decompressor)
+    if head[:6] in _CPIO_MAGICS:
+        return iter([bytes(data)])
+    raise UnsupportedRamdisk(f"Unknown ramdisk format {head[:4].hex()}")
+
+
+class _ChunkReader:
+    """File-like reads over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = bytearray()
+
+    def _fill(self, size: int) -> None:
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return
+            self._buffer += chunk
+
+    def read(self, size: int) -> bytes:
+        self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def copy_to(self, f, size: int) -> None:
+        while size > 0:
+            piece = self.read(min(size, _CHUNK))
+            if not piece:
+                raise ValueError("Truncated cpio archive")
+            f.write(piece)
+            size -= len(piece)
+
+    def skip_zeros(self) -> None:
+        """Skip the zero padding between concatenated archives."""
+        while True:
+            self._fill(4)
+            stripped = len(self._buffer) - len(self._buffer.lstrip(b"\0"))
+            if stripped < len(self._buffer) or not self._buffer:
+                del self._buffer[:stripped]
+                return
+            self._buffer.clear()
+
+
+def _pad4(size: int) -> int:
+    return (4 - size % 4) % 4
+
+
+def extract_cpio(chunks: Iterator[bytes], dest: Union[str, Path]) -> int:
+    """
+    Extract a newc cpio stream (one or more concatenated archives).
+
+    Entries that would land outside dest, directly or through a symlink
+    extracted earlier, are skipped. Device nodes and FIFOs are skipped.
+
+    Args:
+        chunks: The archive's bytes, in order
+        dest: Directory to extract into
+
+    Returns:
+        Number of entries written
+    """
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    root = dest.resolve()
+    reader = _ChunkReader(chunks)
+    written = 0
+
+    while True:
+        reader.skip_zeros()
+        header = reader.read(110)
+        if not header:
+            return written
+        if len(header) < 110 or header[:6] not in _CPIO_MAGICS:
+            raise ValueError("Not a newc cpio archive")
+        fields = [int(header[6 + 8 * k:14 + 8 * k], 16) for k in range(13)]
+        mode, filesize, namesize = fields[1], fields[6], fields[11]
+        name = reader.read(namesize).rstrip(b"\0").decode("utf-8", "surrogateescape")
+        reader.read(_pad4(110 + namesize))
+
+        if name == "TRAILER!!!":
+            reader.read(_pad4(filesize))
+            continue
+
+        relative = Path(name.lstrip("/"))
+        target = dest / relative
+        safe = (
+            name not in ("", ".")
+            and ".." not in relative.parts
+            and target.parent.resolve().is_relative_to(root)
+        )
+        kind = stat.S_IFMT(mode)
+        if not safe or kind not in (stat.S_IFDIR, stat.S_IFREG, stat.S_IFLNK):
+            reader.read(filesize)
+        elif kind == stat.S_IFDIR:
+            target.mkdir(parents=True, exist_ok=True)
+            written += 1
+        elif kind == stat.S_IFLNK:
+            link = reader.read(filesize).decode("utf-8", "surrogateescape")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.is_symlink() or target.exists():
+                target.unlink()
+            os.symlink(link, target)
+            written += 1
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.is_symlink():
+                target.unlink()
+            with open(target, "wb") as f:
+                reader.copy_to(f, filesize)
+            # Keep files removable by the worker whatever the image says
+            os.chmod(target, (mode & 0o777) | 0o600)
+            written += 1
+        reader.read(_pad4(filesize))
+
+
+def extract_ramdisks(image_path: Union[str, Path], dest: Union[str, Path]) -> Optional[int]:
+    """
+    Extract every ramdisk of an image into dest.
+
+    v4 vendor ramdisk fragments are all extracted into dest, in table
+    order, the way they are overlaid at boot.
+
+    Args:
+        image_path: boot-type image
+        dest: Directory to extract into
+
+    Returns:
+        Number of entries written, or None if the file is not a boot image
+
+    Raises:
+        UnsupportedRamdisk: A ramdisk uses an unknown compression or is corrupt
+    """
+    with open(image_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        image = parse_boot_image(mm)
+        if image is None:
+            return None
+        view = memoryview(mm)
+        try:
+            written = 0
+            for ramdisk in image.ramdisks:
+                data = view[ramdisk.offset:ramdisk.offset + ramdisk.size]
+                try:
+                    written += extract_cpio(ramdisk_chunks(data), dest)
+                finally:
+                    data.release()
+            return written
+        finally:
+            view.release()
@@ -24,6 +24,84 @@ class Settings(BaseSettings):
     # system tempdir.
     WORK_DIR_BASE: Optional[str] = None
 
+    # Scratch roots per tier, as JSON, e.g. {"download": ["/mnt/hdd"],
+    # "work": ["/mnt/nvme0", "/mnt/nvme1"], "small": ["/dev/shm/dumps"]}.
+    # "download" holds the archive, "work" the extracted tree and git
+    # objects, "small" the boot image work. Each job uses the root with the
+    # most free space; "work" defaults to WORK_DIR_BASE, the others to the
+    # job's work dir.
+    SCRATCH_ROOTS: dict[str, list[str]] = {}
+
+    # Byte budget for the persistent download cache under WORK_DIR_BASE
+    # (and under each "download" scratch root, which gets its own cache).
+    # Re-dumps and retries of an unchanged URL reuse the cached archive.
+    # 0 disables the cache; it is also off when WORK_DIR_BASE is unset.
+    DOWNLOAD_CACHE_MAX_BYTES: int = 0
+
+    # Seconds to keep an unused partial download under
+    # WORK_DIR_BASE/partial_downloads so a retry of the same URL resumes it.
+    # 0 disables resuming; it is also off when WORK_DIR_BASE is unset.
+    PARTIAL_DOWNLOAD_TTL: int = 172800
+
+    # Seconds to keep the work dir of a failed job under
+    # WORK_DIR_BASE/resumable so a retry continues after its last completed
+    # stage. 0 disables resuming; it is also off when WORK_DIR_BASE is unset.
+    JOB_RESUME_TTL: int = 86400
+
+    # Number of queued jobs whose firmware a worker host downloads ahead of
+    # time into WORK_DIR_BASE/prefetch, while it processes the current job.
+    # 0 disables download-ahead; it is also off when WORK_DIR_BASE is unset.
+    DOWNLOAD_AHEAD_JOBS: int = 0
+
+    # Byte budget for archives downloaded ahead of their jobs.
+    DOWNLOAD_AHEAD_MAX_BYTES: int = 20 * 1024**3
+
+    # Seconds a job may wait for scratch space before it fails. Each job
+    # reserves its estimated peak disk use (archive, extracted tree and git
+    # objects) in Redis, shared by all workers on the host, and is put back
+    # in the queue while it would not fit. 0 (the default) disables
+    # admission control.
+    DISK_ADMISSION_MAX_WAIT: int = 0
+
+    # Bytes to always keep free on the scratch disk during admission.
+    DISK_ADMISSION_HEADROOM: int = 2 * 1024**3
+
+    # Partition images the alternative dumper extracts at the same time.
+    # 0 picks it from the CPU count shared by ARQ_MAX_JOBS, and at most 2
+    # when the scratch disk is rotational.
+    EXTRACT_PARALLELISM: int = 0
+
+    # Shared per-host cache of the pinned Python tool environments (dumpyara,
+    # vmlinux-to-elf, gdown, mediafire-dl, aospdtgen), installed at worker
+    # startup. Defaults to ~/.cache/dumpyarabot/tools.
+    TOOL_CACHE_DIR: Optional[str] = None
+
+    # Version overrides for those tools, as JSON: a git ref for git tools,
+    # a PyPI version otherwise, e.g. {"vmlinux-to-elf": "<commit>"}.
+    TOOL_VERSIONS: dict[str, str] = {}
+
+    # Shared Firmware_extractor checkout used by the alternative dumper.
+    # Defaults to ~/.cache/dumpyarabot/firmware_extractor. The ref (branch,
+    # tag or commit; HEAD is the default branch) is re-resolved when the
+    # checkout is older than the TTL in seconds (0 = only on /refreshextractor).
+    FIRMWARE_EXTRACTOR_DIR: Optional[str] = None
+    FIRMWARE_EXTRACTOR_REF: str = "HEAD"
+    FIRMWARE_EXTRACTOR_REFRESH_TTL: int = 86400
+
+    # For alt-dumper jobs on A/B OTA zips, fetch only the dumped partitions
+    # out of payload.bin with HTTP Range requests instead of the whole zip.
+    # Falls back to a full download when the server or payload can't do it.
+    REMOTE_PAYLOAD_EXTRACTION: bool = False
+
+    # Shared aria2 daemon (systemd/dumpyarabot-aria2.service). When set,
+    # workers attach to it instead of spawning an aria2c per job.
+    ARIA2_RPC_URL: Optional[str] = None
+    ARIA2_RPC_SECRET: str = ""
+    # Download speed caps in bytes/s, 0 for unlimited. The host-wide cap is
+    # split across concurrent downloads, favouring jobs waiting on them.
+    ARIA2_MAX_OVERALL_SPEED: int = 0
+    ARIA2_MAX_JOB_SPEED: int = 0
+
     # Telegram formatting configuration
     DEFAULT_PARSE_MODE: str = "Markdown"
     TELEGRAM_TEXT_READ_TIMEOUT: float = 60.0
@@ -74,6 +152,7 @@ INTERNAL_COMMANDS = [
 ADMIN_COMMANDS = [
     ("restart", "Restart the bot"),
     ("clearqueue", "Flush all queued (not yet running) jobs"),
+    ("refreshextractor", "Update Firmware_extractor on all workers"),
 ]
 
 EMPTY_COMMANDS = []
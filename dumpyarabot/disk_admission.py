@@ -0,0 +1,265 @@
+"""Disk-space admission control for jobs sharing one scratch disk.
+
+Every worker on a host writes the archive, the extracted tree and the
+``.git`` objects of its job under WORK_DIR_BASE. Without coordination, two
+or three large jobs start together and all of them fail hours later when the
+disk is full. Before a job downloads anything, it estimates its peak disk use
+from the archive size and a per-format expansion factor, and reserves that
+many bytes in Redis. The reservation is visible to every worker on the host
+(see ``lua_scripts.RESERVE_DISK_SPACE``). A job that does not fit waits until
+other jobs finish or free space, and the reservation shrinks as each stage
+of the job completes.
+
+A job that does not fit yet does not wait inside the running job, which
+would hold a worker slot and use up its job_timeout. admit_job raises
+DiskAdmissionDeferred instead, and the job is run again later (see
+arq_jobs); the time it started waiting is kept in Redis across the runs.
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.redis_storage import RedisStorage
+from dumpyarabot.url_utils import probe_remote_file
+
+console = Console()
+
+# Extracted size of each format, as a multiple of the archive size. Images in
+# OTA zips and fastboot tarballs are compressed, so the tree is much larger
+# than the archive. Uncompressed tarballs only unpack sparse images.
+_EXPANSION_FACTORS = {
+    ".zip": 3.0,
+    ".tgz": 2.5,
+    ".gz": 2.5,
+    ".tar": 1.5,
+    ".7z": 3.0,
+    ".rar": 3.0,
+    ".ozip": 3.0,
+    ".ofp": 3.0,
+    ".ops": 3.0,
+    ".kdz": 3.0,
+}
+_DEFAULT_EXPANSION_FACTOR = 3.0
+
+# git stores the dump compressed; its objects are about half the tree
+_GIT_OBJECT_FACTOR = 0.5
+
+# Archive size to assume when the server does not send Content-Length
+_UNKNOWN_ARCHIVE_BYTES = 6 * 1024**3
+
+# A reservation outlives a crashed worker by at most this long
+_RESERVATION_TTL = 3 * 3600
+
+# Seconds before a job that did not fit tries again
+_POLL_INTERVAL = 60.0
+
+STAGE_DOWNLOADED = "downloaded"
+STAGE_EXTRACTED = "extracted"
+
+
+class DiskAdmissionError(Exception):
+    """A job waited too long for enough free disk space."""
+
+
+class DiskAdmissionDeferred(Exception):
+    """A job does not fit yet; run it again in retry_in seconds."""
+
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+@dataclass
+class DiskEstimate:
+    """Peak disk use of a job, split by the stage that writes it."""
+
+    archive_bytes: int
+    extracted_bytes: int
+    git_bytes: int
+
+    @property
+    def total(self) -> int:
+        return self.archive_bytes + self.extracted_bytes + self.git_bytes
+
+    def remaining_after(self, stage: str) -> int:
+        """Bytes that the job can still write after a stage completes."""
+        if stage == STAGE_DOWNLOADED:
+            return self.extracted_bytes + self.git_bytes
+        if stage == STAGE_EXTRACTED:
+            # Extraction deletes the archive, which leaves room for git
+            return max(self.git_bytes - self.archive_bytes, 0)
+        return self.total
+
+
+def estimate_job_bytes(url: str, archive_bytes: int) -> DiskEstimate:
+    """
+    Estimate the disk use of a job from the size and format of its archive.
+
+    Args:
+        url: Firmware URL or local path; its extension selects the factor
+        archive_bytes: Size of the archive
+
+    Returns:
+        DiskEstimate with the bytes of each stage
+    """
+    suffix = Path(urlparse(url).path).suffix.lower()
+    factor = _EXPANSION_FACTORS.get(suffix, _DEFAULT_EXPANSION_FACTOR)
+    extracted = int(archive_bytes * factor)
+    return DiskEstimate(
+        archive_bytes=archive_bytes,
+        extracted_bytes=extracted,
+        git_bytes=int(extracted * _GIT_OBJECT_FACTOR),
+    )
+
+
+async def probe_archive_size(url: str) -> Optional[int]:
+    """Size of the archive from a local stat or an HTTP HEAD, or None if unknown."""
+    if os.path.isfile(url):
+        return os.path.getsize(url)
+    info = await probe_remote_file(url)
+    if info is None:
+        return None
+    return info.content_length
+
+
+def scratch_root() -> Path:
+    """The directory that job work dirs are created in."""
+    return Path(settings.WORK_DIR_BASE or tempfile.gettempdir())
+
+
+def disk_id(path: Path) -> str:
+    """Name that is the same for all workers that share the disk of path."""
+    return f"{socket.gethostname()}:{os.stat(path).st_dev}"
+
+
+class DiskReservation:
+    """A job's share of the scratch disk, held in Redis until released."""
+
+    def __init__(self, disk: str, job_id: str, estimate: DiskEstimate):
+        self.disk = disk
+        self.job_id = job_id
+        self.estimate = estimate
+        self.released = False
+
+    async def stage_completed(self, stage: str) -> None:
+        """Shrink the reservation to what the job can still write."""
+        if self.released:
+            return
+        try:
+            await RedisStorage.update_disk_reservation(
+                self.disk, self.job_id, self.estimate.remaining_after(stage), _RESERVATION_TTL
+            )
+        except Exception as e:
+            console.print(f"[yellow]Could not update disk reservation for job {self.job_id}: {e}[/yellow]")
+
+    async def release(self) -> None:
+        """Give the space back to the other jobs on the host."""
+        if self.released:
+            return
+        self.released = True
+        try:
+            await RedisStorage.release_disk_reservation(self.disk, self.job_id)
+        except Exception as e:
+            console.print(f"[yellow]Could not release disk reservation for job {self.job_id}: {e}[/yellow]")
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / 1024**3:.1f} GB"
+
+
+async def admit_job(
+    job_id: str,
+    url: str,
+    root: Optional[Path] = None,
+    archive_root: Optional[Path] = None,
+) -> Optional[DiskReservation]:
+    """
+    Reserve scratch space for a job, or tell it to come back later.
+
+    Args:
+        job_id: Job that needs the space
+        url: Firmware URL or local path
+        root: The job's work dir, or any path on its disk (default: scratch_root())
+        archive_root: Where the archive is downloaded, when that is not the
+                      work dir. On another disk, the archive is not counted.
+
+    Returns:
+        The reservation, or None if admission control is disabled
+
+    Raises:
+        DiskAdmissionDeferred: The job does not fit now; its status line is
+            the message
+        DiskAdmissionError: If the job did not fit within DISK_ADMISSION_MAX_WAIT
+    """
+    if settings.DISK_ADMISSION_MAX_WAIT <= 0:
+        return None
+
+    root = root or scratch_root()
+    archive_bytes = await probe_archive_size(url)
+    if archive_bytes is None:
+        console.print("[yellow]Archive size unknown; assuming a large firmware for the disk estimate[/yellow]")
+        archive_bytes = _UNKNOWN_ARCHIVE_BYTES
+    estimate = estimate_job_bytes(url, archive_bytes)
+
+    try:
+        disk = disk_id(root)
+        if archive_root is not None and disk_id(archive_root) != disk:
+            # The archive goes to its own disk (SCRATCH_ROOTS "download")
+            estimate = replace(estimate, archive_bytes=0)
+    except OSError as e:
+        console.print(f"[yellow]Disk admission skipped: {e}[/yellow]")
+        return None
+
+    free_bytes = shutil.disk_usage(root).free
+    try:
+        admitted, available = await RedisStorage.reserve_disk_space(
+            disk,
+            job_id,
+            estimate.total,
+            free_bytes,
+            settings.DISK_ADMISSION_HEADROOM,
+            _RESERVATION_TTL,
+        )
+        if admitted:
+            await RedisStorage.clear_disk_wait(job_id)
+        else:
+            waiting_since = await RedisStorage.mark_disk_wait(
+                job_id, settings.DISK_ADMISSION_MAX_WAIT + int(_POLL_INTERVAL) * 2
+            )
+    except Exception as e:
+        # Admission is an optimization; Redis trouble must not block jobs
+        console.print(f"[yellow]Disk admission skipped: {e}[/yellow]")
+        return None
+
+    if admitted:
+        if estimate.total > available:
+            console.print(
+                f"[yellow]Job {job_id} needs about {_format_bytes(estimate.total)} but only "
+                f"{_format_bytes(max(available, 0))} is free; starting anyway as no other job holds space[/yellow]"
+            )
+        else:
+            console.print(f"[blue]Reserved {_format_bytes(estimate.total)} of scratch space for job {job_id}[/blue]")
+        return DiskReservation(disk, job_id, estimate)
+
+    if time.time() - waiting_since >= settings.DISK_ADMISSION_MAX_WAIT:
+        raise DiskAdmissionError(
+            f"Not enough disk space in {root}: the job needs about {_format_bytes(estimate.total)}, "
+            f"{_format_bytes(max(available, 0))} is left after other running jobs"
+        )
+
+    status = (
+        f" Waiting for disk space: need {_format_bytes(estimate.total)}, "
+        f"{_format_bytes(max(available, 0))} available"
+    )
+    console.print(f"[yellow]Job {job_id}:{status}[/yellow]")
+    raise DiskAdmissionDeferred(status, _POLL_INTERVAL)
@@ -0,0 +1,308 @@
+"""Download-ahead of firmware for queued jobs.
+
+With ARQ_MAX_JOBS=1 a worker is idle on the network while it extracts, and
+queued jobs download nothing until a worker picks them. The download-ahead
+service fetches the archives of the next DOWNLOAD_AHEAD_JOBS queued jobs into
+``<WORK_DIR_BASE>/prefetch/<url_key>/`` at prefetch bandwidth priority, while
+the current job runs its CPU- and disk-bound stages. When a job starts, it
+moves its staged archive into its work dir and skips the download.
+
+One service runs per host: every worker starts one, and the first to take
+the flock on ``prefetch/.service.lock`` is the one that downloads. A job
+that starts while its own archive is still being prefetched asks the service
+to stop (via Redis). The partial file stays in the resumable download area
+(see partial_downloads), so the job continues the download at foreground
+priority instead of starting over.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.partial_downloads import adopt_download, partial_key
+from dumpyarabot.redis_storage import RedisStorage
+from dumpyarabot.schemas import DumpJob
+from dumpyarabot.url_utils import probe_remote_file
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+console = Console()
+
+PREFETCH_DIR_NAME = "prefetch"
+_MANIFEST_NAME = "staged.json"
+
+# Seconds between queue scans
+_SCAN_INTERVAL = 15.0
+# Seconds between checks of a running prefetch for handover or removal
+_WATCH_INTERVAL = 2.0
+# Lifetime of the running-prefetch marker in Redis; refreshed every watch
+_ACTIVE_TTL = 60
+# Longest a starting job waits for the prefetcher to let go of its download
+_HANDOVER_TIMEOUT = 60.0
+# Staged archives that no queued job wants are removed after this long
+_ORPHAN_AGE = 3600
+
+
+def _prefetch_root() -> Optional[Path]:
+    """Root of the staging area, or None when download-ahead is disabled."""
+    if settings.DOWNLOAD_AHEAD_JOBS <= 0 or not settings.WORK_DIR_BASE:
+        return None
+    base = Path(settings.WORK_DIR_BASE)
+    if not base.is_dir():
+        return None
+    return base / PREFETCH_DIR_NAME
+
+
+def _read_manifest(area: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((area / _MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return None
+
+
+def _area_size(area: Path) -> int:
+    try:
+        return sum(p.stat().st_size for p in area.rglob("*") if p.is_file())
+    except OSError:
+        return 0
+
+
+def take_staged_download(url: str, dest_dir: Path) -> Optional[Tuple[Path, Dict[str, Any]]]:
+    """
+    Move a finished prefetch of a URL into a job's work dir.
+
+    Args:
+        url: The job's firmware URL
+        dest_dir: The job's work dir
+
+    Returns:
+        (path of the archive in dest_dir, download info), or None if the URL
+        has no finished prefetch
+    """
+    root = _prefetch_root()
+    if root is None:
+        return None
+    area = root / partial_key(url)
+    manifest = _read_manifest(area)
+    if manifest is None:
+        return None
+
+    staged_file = area / manifest["file_name"]
+    try:
+        # Drop the manifest first so no other job takes the same file
+        (area / _MANIFEST_NAME).unlink()
+        target = adopt_download(staged_file, dest_dir)
+    except OSError as e:
+        console.print(f"[yellow]Could not take prefetched download: {e}[/yellow]")
+        return None
+    finally:
+        shutil.rmtree(area, ignore_errors=True)
+
+    console.print(f"[green]Using prefetched download: {target.name}[/green]")
+    return target, {**manifest.get("download_info", {}), "source": "prefetch"}
+
+
+async def take_over_prefetch(url: str) -> None:
+    """Stop a running prefetch of a URL so the starting job can continue it.
+
+    Returns once the prefetcher has let go of the download (or finished it),
+    or after _HANDOVER_TIMEOUT.
+    """
+    if _prefetch_root() is None:
+        return
+    key = partial_key(url)
+    try:
+        if not await RedisStorage.is_prefetch_active(key):
+            return
+        console.print("[blue]Firmware is being prefetched; taking over the download[/blue]")
+        await RedisStorage.request_prefetch_handover(key)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _HANDOVER_TIMEOUT
+        while await RedisStorage.is_prefetch_active(key):
+            if loop.time() >= deadline:
+                console.print("[yellow]Prefetcher did not hand over the download in time[/yellow]")
+                return
+            await asyncio.sleep(0.5)
+    except Exception as e:
+        console.print(f"[yellow]Could not take over prefetch: {e}[/yellow]")
+
+
+class DownloadAheadService:
+    """Prefetches the archives of the next queued jobs while this host is busy."""
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._lock_fd: Optional[int] = None
+
+    def start(self) -> None:
+        """Start the background loop if download-ahead is enabled."""
+        if _prefetch_root() is None or fcntl is None:
+            return
+        self._task = asyncio.create_task(self._run())
+        console.print(
+            f"[blue]Download-ahead enabled: next {settings.DOWNLOAD_AHEAD_JOBS} queued job(s), "
+            f"budget {settings.DOWNLOAD_AHEAD_MAX_BYTES // (1024**3)}G[/blue]"
+        )
+
+    async def stop(self) -> None:
+        """Stop the loop; a running prefetch keeps its partial file for resuming."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.scan_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                console.print(f"[yellow]Download-ahead scan failed: {e}[/yellow]")
+            await asyncio.sleep(_SCAN_INTERVAL)
+
+    def _hold_service_lock(self, root: Path) -> bool:
+        """Take the host-wide service lock; held for the life of the worker."""
+        if self._lock_fd is not None:
+            return True
+        root.mkdir(exist_ok=True)
+        fd = os.open(root / ".service.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def scan_once(self) -> None:
+        """Prefetch the first queued job that has nothing staged yet."""
+        root = _prefetch_root()
+        if root is None or not self._hold_service_lock(root):
+            return
+
+        from dumpyarabot.arq_config import arq_pool
+
+        payloads = await arq_pool.get_queued_jobs(settings.DOWNLOAD_AHEAD_JOBS)
+        jobs = []
+        for payload in payloads:
+            try:
+                jobs.append(DumpJob.model_validate(payload))
+            except Exception:
+                continue
+        wanted = {partial_key(str(job.dump_args.url)) for job in jobs}
+        await asyncio.to_thread(self._sweep, root, wanted)
+
+        for job in jobs:
+            url = str(job.dump_args.url)
+            area = root / partial_key(url)
+            if os.path.isfile(url) or (area / _MANIFEST_NAME).exists():
+                continue
+            if job.dump_args.use_alt_dumper and settings.REMOTE_PAYLOAD_EXTRACTION:
+                # Probably served by ranged payload reads, not the full archive
+                continue
+            if not await self._fits_budget(root, url):
+                return
+            await self._prefetch(root, job)
+            # Re-read the queue before the next one: it may have moved on
+            return
+
+    def _sweep(self, root: Path, wanted: set) -> None:
+        """Remove staged archives no queued job wants any more."""
+        now = time.time()
+        for area in root.iterdir():
+            if not area.is_dir() or area.name in wanted:
+                continue
+            try:
+                if now - area.stat().st_mtime < _ORPHAN_AGE:
+                    continue
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(area, ignore_errors=True)
+            console.print(f"[yellow]Removed unclaimed prefetch {area.name}[/yellow]")
+
+    async def _fits_budget(self, root: Path, url: str) -> bool:
+        staged = await asyncio.to_thread(
+            lambda: sum(_area_size(area) for area in root.iterdir() if area.is_dir())
+        )
+        info = await probe_remote_file(url)
+        # Unknown sizes are only fetched into an empty staging area
+        size = info.content_length if info and info.content_length else None
+        if size is None:
+            return staged == 0
+        return staged + size <= settings.DOWNLOAD_AHEAD_MAX_BYTES
+
+    async def _prefetch(self, root: Path, job: DumpJob) -> None:
+        """Download one job's archive into staging, yielding it to the job if it starts."""
+        from dumpyarabot.firmware_downloader import FirmwareDownloader
+
+        url = str(job.dump_args.url)
+        key = partial_key(url)
+        area = root / key
+        area.mkdir(exist_ok=True)
+        downloader = FirmwareDownloader(str(area), prefetch=True)
+
+        console.print(f"[blue]Prefetching firmware for queued job {job.job_id}[/blue]")
+        await RedisStorage.set_prefetch_active(key, job.job_id, ttl=_ACTIVE_TTL)
+        download = asyncio.create_task(downloader.download_firmware(job))
+        try:
+            while not download.done():
+                await asyncio.wait({download}, timeout=_WATCH_INTERVAL)
+                if download.done():
+                    break
+                if await RedisStorage.is_prefetch_handover_requested(key):
+                    console.print(f"[blue]Job {job.job_id} started; handing its download over[/blue]")
+                    download.cancel()
+                    break
+                await RedisStorage.set_prefetch_active(key, job.job_id, ttl=_ACTIVE_TTL)
+
+            try:
+                file_path, file_name = await download
+            except asyncio.CancelledError:
+                if not download.cancelled():
+                    raise
+                shutil.rmtree(area, ignore_errors=True)
+                return
+            except Exception as e:
+                console.print(f"[yellow]Prefetch for job {job.job_id} failed: {e}[/yellow]")
+                shutil.rmtree(area, ignore_errors=True)
+                return
+
+            manifest = {
+                "url": url,
+                "job_id": job.job_id,
+                "file_name": file_name,
+                "download_info": downloader.download_info or {},
+                "staged_at": time.time(),
+            }
+            tmp_manifest = area / f".{_MANIFEST_NAME}.tmp"
+            tmp_manifest.write_text(json.dumps(manifest))
+            os.replace(tmp_manifest, area / _MANIFEST_NAME)
+            console.print(f"[green]Prefetched {file_name} for queued job {job.job_id}[/green]")
+        finally:
+            if not download.done():
+                download.cancel()
+                try:
+                    await download
+                except BaseException:
+                    pass
+            await RedisStorage.clear_prefetch_active(key)
@@ -0,0 +1,262 @@
+"""Persistent, content-addressed cache for downloaded firmware archives.
+
+Layout under the cache root (``<root>/download_cache``, where root is the
+scratch root holding the job's download dir, by default WORK_DIR_BASE):
+
+    blobs/<sha256>          one file per distinct archive content
+    index/<url_key>.json    normalized URL + server validators -> sha256
+
+A job whose URL still matches an index entry (same ETag / Last-Modified /
+Content-Length) gets the blob cloned into its work dir by reflink or hardlink
+instead of downloading it again. This covers force re-dumps and ARQ retries
+of the same firmware. Blobs are evicted least-recently-used first once the
+cache grows past its byte budget.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.file_utils import clone_file, safe_remove_file
+from dumpyarabot.scratch_tiers import all_roots
+from dumpyarabot.url_utils import RemoteFileInfo, normalize_download_url
+
+console = Console()
+
+CACHE_DIR_NAME = "download_cache"
+_HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    """Index record mapping one URL version to a blob."""
+
+    sha256: str
+    file_name: str
+    size: int
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_length: Optional[int] = None
+    stored_at: float = 0.0
+
+
+def hash_file_sha256(file_path: Path) -> str:
+    """Return the hex sha256 of a file, read in large chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scratch_root_of(path: Path) -> Optional[Path]:
+    """The innermost scratch root that contains path, if any."""
+    resolved = Path(path).resolve()
+    containing = [root for root in all_roots() if resolved.is_relative_to(root.resolve())]
+    return max(containing, key=lambda root: len(root.resolve().parts), default=None)
+
+
+class DownloadCache:
+    """Content-addressed download cache with LRU eviction against a byte budget."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.blobs_dir = self.root / "blobs"
+        self.index_dir = self.root / "index"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, download_dir: Optional[Path] = None) -> Optional["DownloadCache"]:
+        """Build the cache from settings, or None when caching is disabled.
+
+        The cache lives on the scratch root that holds download_dir, so blobs
+        and downloaded archives share a filesystem, which is what makes
+        hardlink/reflink stores and hits possible. Each download root gets
+        its own cache with its own budget. Without a download_dir, or when it
+        is under no scratch root, the cache is under WORK_DIR_BASE.
+        """
+        if settings.DOWNLOAD_CACHE_MAX_BYTES <= 0 or not settings.WORK_DIR_BASE:
+            return None
+        base = _scratch_root_of(download_dir) if download_dir is not None else None
+        if base is None:
+            base = Path(settings.WORK_DIR_BASE)
+        if not base.is_dir():
+            return None
+        try:
+            return cls(base / CACHE_DIR_NAME, settings.DOWNLOAD_CACHE_MAX_BYTES)
+        except OSError as e:
+            console.print(f"[yellow]Download cache unavailable: {e}[/yellow]")
+            return None
+
+    @staticmethod
+    def make_url_key(url: str, info: RemoteFileInfo) -> str:
+        """Key one version of a URL by its normalized form and server validators."""
+        material = "\n".join([
+            normalize_download_url(url),
+            info.etag or "",
+            info.last_modified or "",
+            str(info.content_length or ""),
+        ])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _index_path(self, url_key: str) -> Path:
+        return self.index_dir / f"{url_key}.json"
+
+    def blob_path(self, sha256: str) -> Path:
+        """Path of the blob for a content digest (may not exist)."""
+        return self.blobs_dir / sha256
+
+    def lookup(self, url: str, info: RemoteFileInfo) -> Optional[CacheEntry]:
+        """Find a cached blob for this URL version.
+
+        Returns None when the server sent no validators: without an ETag or
+        Last-Modified there is no way to tell a re-uploaded file from the
+        cached one.
+        """
+        if not info.has_validators:
+            return None
+
+        index_path = self._index_path(self.make_url_key(url, info))
+        try:
+            entry = CacheEntry(**json.loads(index_path.read_text()))
+        except FileNotFoundError:
+            return None
+        except (OSError, TypeError, ValueError):
+            safe_remove_file(index_path)
+            return None
+
+        blob = self.blob_path(entry.sha256)
+        try:
+            if blob.stat().st_size != entry.size:
+                raise FileNotFoundError(blob)
+        except FileNotFoundError:
+            # Blob was evicted; drop the dangling index entry.
+            safe_remove_file(index_path)
+            return None
+
+        return entry
+
+    def materialize(self, entry: CacheEntry, dest_dir: Path) -> Path:
+        """Clone a cached blob into dest_dir under its original file name."""
+        blob = self.blob_path(entry.sha256)
+        target = Path(dest_dir) / entry.file_name
+        safe_remove_file(target)
+        method = clone_file(blob, target)
+        # Bump the blob's mtime: eviction is least-recently-used by mtime.
+        os.utime(blob)
+        console.print(f"[green]Download cache hit: {entry.file_name} ({method})[/green]")
+        return target
+
+    def store(
+        self,
+        file_path: Path,
+        url: str,
+        info: Optional[RemoteFileInfo],
+        sha256: str,
+    ) -> Optional[CacheEntry]:
+        """Add a downloaded file to the cache and evict down to the budget.
+
+        The blob is reflinked or hardlinked from the job's file, so storing
+        usually costs no extra disk I/O. A file on another filesystem is
+        copied into the cache.
+        """
+        file_path = Path(file_path)
+        size = file_path.stat().st_size
+        if size > self.max_bytes:
+            console.print(f"[yellow]Not caching {file_path.name}: larger than the cache budget[/yellow]")
+            return None
+
+        blob = self.blob_path(sha256)
+        if blob.exists():
+            os.utime(blob)
+        else:
+            tmp_blob = self.blobs_dir / f".{sha256}.{os.getpid()}.tmp"
+            safe_remove_file(tmp_blob)
+            try:
+                method = clone_file(file_path, tmp_blob)
+            except OSError as e:
+                safe_remove_file(tmp_blob)
+                console.print(f"[yellow]Not caching {file_path.name}: {e}[/yellow]")
+                return None
+            os.replace(tmp_blob, blob)
+            os.utime(blob)
+            if method not in ("reflink", "hardlink"):
+                console.print(f"[yellow]Copied {file_path.name} into the download cache ({method})[/yellow]")
+
+        entry = CacheEntry(
+            sha256=sha256,
+            file_name=file_path.name,
+            size=size,
+            url=normalize_download_url(url),
+            etag=info.etag if info else None,
+            last_modified=info.last_modified if info else None,
+            content_length=info.content_length if info else None,
+            stored_at=time.time(),
+        )
+
+        if info is not None and info.has_validators:
+            index_path = self._index_path(self.make_url_key(url, info))
+            tmp_index = index_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_index.write_text(json.dumps(asdict(entry)))
+            os.replace(tmp_index, index_path)
+
+        self.evict(keep=[sha256])
+        return entry
+
+    async def store_async(
+        self,
+        file_path: Path,
+        url: str,
+        info: Optional[RemoteFileInfo],
+        sha256: Optional[str] = None,
+    ) -> Optional[CacheEntry]:
+        """Hash (if needed) and store a file without blocking the event loop."""
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(hash_file_sha256, Path(file_path))
+        return await asyncio.to_thread(self.store, Path(file_path), url, info, sha256)
+
+    def evict(self, keep: Iterable[str] = ()) -> int:
+        """Remove least-recently-used blobs until the cache fits its budget.
+
+        Args:
+            keep: Digests that must survive this pass (e.g. the blob just stored)
+
+        Returns:
+            Number of bytes freed
+        """
+        keep_set = set(keep)
+        blobs = []
+        total = 0
+        for blob in self.blobs_dir.iterdir():
+            if blob.name.startswith("."):
+                continue
+            try:
+                stat = blob.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, blob))
+            total += stat.st_size
+
+        freed = 0
+        for _, size, blob in sorted(blobs, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            if blob.name in keep_set:
+                continue
+            if safe_remove_file(blob):
+                total -= size
+                freed += size
+                console.print(f"[yellow]Evicted cached download {blob.name[:12]} ({size // (1024**2)}M)[/yellow]")
+
+        return freed
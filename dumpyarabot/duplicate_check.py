@@ -0,0 +1,195 @@
+"""Early detection of firmware that is already dumped.
+
+Without it a non-force job only learns that its branch exists when it
+pushes, after the download, the extraction, the boot images and aospdtgen.
+The check resolves the build properties as soon as they are on disk and
+looks the branch up in GitLab while the extraction goes on:
+
+- If the archive itself lists the prop files (an already-unpacked tree in a
+  zip or tar) and no partition images, the props are read from the listing
+  right after the download.
+- Otherwise the check waits for ``FirmwareExtractor.props_ready``, which the
+  alternative dumper sets after it has extracted the PROP_PARTITIONS (it
+  extracts those first), and the Python dumper sets when it finishes.
+
+A known duplicate cancels the extraction and fails the job with the same
+error the push would have given. Any problem during the check only logs a
+warning; the push still checks the branch before it writes anything.
+"""
+
+import asyncio
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Awaitable, List, Optional, TypeVar
+
+from rich.console import Console
+
+from dumpyarabot.firmware_extractor import PROP_PARTITIONS
+from dumpyarabot.gitlab_manager import GitLabManager
+from dumpyarabot.property_extractor import PropertyExtractor
+
+console = Console()
+
+_T = TypeVar("_T")
+
+# Members that mean the archive holds partition images, whose props the
+# listing cannot show
+_IMAGE_SUFFIXES = (".img", ".dat", ".br", ".bin", ".lz4", ".ext4", ".sparsechunk")
+
+
+class DuplicateDumpError(Exception):
+    """The firmware's branch already exists in GitLab."""
+
+
+def _prop_members(names: List[str]) -> Optional[List[str]]:
+    """
+    Pick the prop files out of an archive listing.
+
+    Args:
+        names: Member names of the archive
+
+    Returns:
+        Members under one of the PROP_PARTITIONS that end in .prop, or None
+        if the listing has no such file or also has partition images
+    """
+    props = []
+    for name in names:
+        path = PurePosixPath(name)
+        if path.name.endswith(_IMAGE_SUFFIXES) and path.stem.split(".")[0] in PROP_PARTITIONS:
+            return None
+        if path.name == "payload.bin" or path.name.startswith("super."):
+            return None
+        if ".." in path.parts or path.is_absolute():
+            continue
+        if path.suffix == ".prop" and path.parts and path.parts[0] in PROP_PARTITIONS:
+            props.append(name)
+    return props or None
+
+
+def extract_listed_props(archive_path: str, dest_dir: Path) -> bool:
+    """
+    Copy the prop files listed in an archive into dest_dir.
+
+    Only zip and uncompressed tar archives are read; their listings do not
+    require decompressing the whole archive.
+
+    Args:
+        archive_path: The downloaded firmware archive
+        dest_dir: Directory to recreate the prop files' paths in
+
+    Returns:
+        True if prop files were copied
+    """
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as archive:
+                members = _prop_members(archive.namelist())
+                if not members:
+                    return False
+                for name in members:
+                    target = dest_dir / PurePosixPath(name)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    with archive.open(name) as src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                return True
+
+        if tarfile.is_tarfile(archive_path):
+            with tarfile.open(archive_path, "r:") as archive:
+                by_name = {member.name: member for member in archive.getmembers() if member.isfile()}
+                members = _prop_members(list(by_name))
+                if not members:
+                    return False
+                for name in members:
+                    target = dest_dir / PurePosixPath(name)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    src = archive.extractfile(by_name[name])
+                    if src is None:
+                        continue
+                    with src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                return True
+    except (OSError, zipfile.BadZipFile, tarfile.TarError, ValueError) as e:
+        console.print(f"[yellow]Could not read prop files from archive listing: {e}[/yellow]")
+    return False
+
+
+class DuplicateCheck:
+    """Looks up a job's branch in GitLab as soon as its build props are known."""
+
+    def __init__(self, work_dir: str, gitlab_manager: GitLabManager, dumper_token: str):
+        self.work_dir = Path(work_dir)
+        self.gitlab_manager = gitlab_manager
+        self.dumper_token = dumper_token
+        self._tasks: List[asyncio.Task] = []
+
+    def check_archive(self, archive_path: str) -> None:
+        """Start a check from the prop files listed in the downloaded archive."""
+        self._tasks.append(asyncio.create_task(self._check_archive(archive_path)))
+
+    def check_when_ready(self, props_ready: asyncio.Event) -> None:
+        """Start a check that runs once the extractor has the prop partitions on disk."""
+        self._tasks.append(asyncio.create_task(self._check_work_dir(props_ready)))
+
+    async def run_alongside(self, operation: Awaitable[_T]) -> _T:
+        """
+        Run an operation while the started checks run, and stop it on a duplicate.
+
+        Args:
+            operation: Usually the extraction
+
+        Returns:
+            The operation's result
+
+        Raises:
+            DuplicateDumpError: A check found the branch. The operation is
+                cancelled if it is still running.
+        """
+        main = asyncio.ensure_future(operation)
+        pending = {main, *self._tasks}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is not main:
+                        task.result()  # raises DuplicateDumpError
+                if main in done and main.exception() is not None:
+                    break
+            # Once the operation is done the checks have their props and
+            # finish quickly; the job waits for them before it moves on
+            return main.result()
+        finally:
+            for task in [main, *self._tasks]:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(main, *self._tasks, return_exceptions=True)
+            self._tasks.clear()
+
+    async def _check_archive(self, archive_path: str) -> None:
+        # Outside the work dir, which the dump pushes
+        staging = Path(tempfile.mkdtemp(prefix="dump_props_"))
+        try:
+            if await asyncio.to_thread(extract_listed_props, archive_path, staging):
+                console.print("[blue]Build props found in the archive listing; checking for a duplicate[/blue]")
+                await self._check_props(staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    async def _check_work_dir(self, props_ready: asyncio.Event) -> None:
+        await props_ready.wait()
+        console.print("[blue]Prop partitions extracted; checking for a duplicate[/blue]")
+        await self._check_props(self.work_dir)
+
+    async def _check_props(self, props_dir: Path) -> None:
+        try:
+            device_props = await PropertyExtractor(str(props_dir)).extract_properties()
+            repo_url = await self.gitlab_manager.find_existing_branch(device_props, self.dumper_token)
+        except Exception as e:
+            console.print(f"[yellow]Early duplicate check skipped: {e}[/yellow]")
+            return
+
+        if repo_url is not None:
+            raise DuplicateDumpError(f"Branch '{device_props['branch']}' already exists in {repo_url}")
+        console.print(f"[green]Branch {device_props['branch']} is new[/green]")
@@ -0,0 +1,198 @@
+"""Shared, pinned Firmware_extractor checkout for all workers on a host.
+
+Alt-dumper jobs used to ``git clone`` / ``git pull --rebase``
+``~/Firmware_extractor`` themselves: a network round trip per job, no
+locking between workers, and the tools could change under a running job.
+Now one checkout per host lives under ``FIRMWARE_EXTRACTOR_DIR``::
+
+    mirror.git/           bare mirror, the only thing that talks to GitHub
+    checkouts/<commit>/   prepared working trees, one per commit
+    current -> checkouts/<commit>
+    state.json            commit, ref and time of the last refresh
+    .lock                 flock held while refreshing
+
+Jobs read ``current`` without a lock or network access and keep the
+resolved ``checkouts/<commit>`` path for their whole run. A refresh fetches
+the mirror, prepares the new commit's tree next to the old one and swaps
+``current`` with an atomic rename. Refreshes happen when the checkout is
+older than FIRMWARE_EXTRACTOR_REFRESH_TTL, or after an admin runs
+/refreshextractor (a timestamp in Redis, seen by every host).
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.process_utils import HALF_HOUR, run_git_command
+from dumpyarabot.redis_storage import RedisStorage
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+console = Console()
+
+REPO_URL = "https://github.com/AndroidDumps/Firmware_extractor"
+
+# Retired checkouts are kept this long, so jobs that resolved them before
+# the swap can finish (ARQ's job_timeout is 2 hours)
+_RETIRED_KEEP_SECONDS = 3 * 3600
+
+
+def checkout_root() -> Path:
+    """The shared checkout directory (FIRMWARE_EXTRACTOR_DIR)."""
+    if settings.FIRMWARE_EXTRACTOR_DIR:
+        return Path(settings.FIRMWARE_EXTRACTOR_DIR)
+    return Path.home() / ".cache" / "dumpyarabot" / "firmware_extractor"
+
+
+def current_checkout() -> Path:
+    """Path of the ``current`` symlink (which may not exist yet)."""
+    return checkout_root() / "current"
+
+
+def _read_state(root: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((root / "state.json").read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(root: Path, state: Dict[str, Any]) -> None:
+    temp = root / f".state.json.{os.getpid()}"
+    temp.write_text(json.dumps(state, indent=2))
+    os.replace(temp, root / "state.json")
+
+
+def _needs_refresh(root: Path, state: Dict[str, Any], refresh_requested_at: float) -> bool:
+    if not (root / "current").is_dir():
+        return True
+    if state.get("ref") != settings.FIRMWARE_EXTRACTOR_REF:
+        return True
+    checked_at = state.get("checked_at", 0)
+    if refresh_requested_at > checked_at:
+        return True
+    ttl = settings.FIRMWARE_EXTRACTOR_REFRESH_TTL
+    return ttl > 0 and time.time() - checked_at > ttl
+
+
+async def _refresh_requested_at() -> float:
+    try:
+        return await RedisStorage.get_extractor_refresh_request()
+    except Exception as e:
+        console.print(f"[yellow]Could not read Firmware_extractor refresh request: {e}[/yellow]")
+        return 0.0
+
+
+async def ensure_firmware_extractor() -> Path:
+    """
+    Return a ready Firmware_extractor checkout, refreshing it if due.
+
+    The common case (fresh checkout) reads two small files and returns.
+
+    Returns:
+        The resolved ``checkouts/<commit>`` directory, which stays valid
+        for the rest of the job even if another worker swaps ``current``
+
+    Raises:
+        RuntimeError: There is no checkout and it could not be created
+    """
+    root = checkout_root()
+    refresh_requested_at = await _refresh_requested_at()
+    if not _needs_refresh(root, _read_state(root), refresh_requested_at) or fcntl is None:
+        return (root / "current").resolve()
+
+    root.mkdir(parents=True, exist_ok=True)
+    lock_fd = os.open(root / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+        # Another worker may have refreshed while we waited for the lock
+        state = _read_state(root)
+        if _needs_refresh(root, state, refresh_requested_at):
+            try:
+                await _refresh(root, state)
+            except Exception as e:
+                if not (root / "current").is_dir():
+                    raise RuntimeError(f"Could not set up Firmware_extractor: {e}") from e
+                console.print(f"[yellow]Firmware_extractor refresh failed, keeping {state.get('commit', 'current')[:12]}: {e}[/yellow]")
+                # Don't retry on every job; the next TTL or admin request will
+                _write_state(root, {**state, "checked_at": time.time()})
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+    return (root / "current").resolve()
+
+
+async def _refresh(root: Path, state: Dict[str, Any]) -> None:
+    """Fetch the mirror and point ``current`` at the configured ref's commit. Caller holds the lock."""
+    mirror = root / "mirror.git"
+    if not mirror.is_dir():
+        shutil.rmtree(mirror, ignore_errors=True)
+        await run_git_command("clone", "-q", "--mirror", REPO_URL, str(mirror),
+                              timeout=HALF_HOUR, description="Mirroring Firmware_extractor")
+    else:
+        await run_git_command("-C", str(mirror), "fetch", "-q", "--prune",
+                              timeout=HALF_HOUR, description="Fetching Firmware_extractor")
+
+    ref = settings.FIRMWARE_EXTRACTOR_REF
+    result = await run_git_command("-C", str(mirror), "rev-parse", "--verify", f"{ref}^{{commit}}",
+                                   description="Resolving Firmware_extractor ref")
+    commit = result.stdout.strip()
+
+    checkouts = root / "checkouts"
+    checkouts.mkdir(exist_ok=True)
+    target = checkouts / commit
+    if not target.is_dir():
+        staging = checkouts / f".{commit}.{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            await run_git_command("clone", "-q", "--no-checkout", str(mirror), str(staging),
+                                  timeout=HALF_HOUR, description="Preparing Firmware_extractor checkout")
+            await run_git_command("-C", str(staging), "checkout", "-q", "--detach", commit,
+                                  timeout=HALF_HOUR, description="Checking out Firmware_extractor")
+            os.rename(staging, target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    previous = (root / "current").resolve() if (root / "current").is_dir() else None
+    link = root / f".current.{os.getpid()}"
+    if link.is_symlink():
+        link.unlink()
+    os.symlink(Path("checkouts") / commit, link)
+    os.replace(link, root / "current")
+    if previous is not None and previous != target.resolve():
+        # Start the retirement clock of the old tree
+        os.utime(previous)
+        console.print(f"[green]Firmware_extractor updated {previous.name[:12]} -> {commit[:12]}[/green]")
+    else:
+        console.print(f"[green]Firmware_extractor at {commit[:12]}[/green]")
+
+    now = time.time()
+    _write_state(root, {"commit": commit, "ref": ref, "refreshed_at": now, "checked_at": now})
+    _prune_retired(checkouts, target)
+
+
+def _prune_retired(checkouts: Path, current: Path) -> None:
+    cutoff = time.time() - _RETIRED_KEEP_SECONDS
+    for entry in checkouts.iterdir():
+        if entry.name == current.name:
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            continue
+
+
+async def request_refresh() -> None:
+    """Ask every worker host to refresh its checkout before its next alt-dumper job."""
+    await RedisStorage.request_extractor_refresh(time.time())
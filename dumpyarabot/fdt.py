@@ -0,0 +1,163 @@
+"""In-process scanning of images for flattened device tree (FDT) blobs.
+
+Replaces the extract-dtb subprocess: the image is memory-mapped and
+searched for the FDT magic, each hit is checked against the header layout
+of the devicetree specification, and the valid blobs are written out in one
+pass. Output names follow extract-dtb's ``NN_dtbdump_<model>.dtb`` pattern,
+so dumps keep the same layout.
+"""
+
+import mmap
+import re
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Union
+
+FDT_MAGIC = b"\xd0\x0d\xfe\xed"
+
+# magic, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap, version,
+# last_comp_version, boot_cpuid_phys, size_dt_strings, size_dt_struct
+_HEADER = struct.Struct(">10I")
+
+_FDT_BEGIN_NODE = 1
+_FDT_END_NODE = 2
+_FDT_PROP = 3
+_FDT_NOP = 4
+_FDT_END = 9
+
+# Versions 16 and 17 are the ones dtc writes and Android images carry
+_MIN_VERSION = 16
+_MAX_VERSION = 17
+_MAX_BLOB_SIZE = 16 * 1024 * 1024
+
+
+@dataclass
+class FdtBlob:
+    """A device tree found in an image."""
+
+    offset: int
+    size: int
+    model: Optional[str]
+
+
+def _align4(offset: int) -> int:
+    return (offset + 3) & ~3
+
+
+def _root_model(blob: bytes, off_struct: int, off_strings: int, size_struct: int) -> Optional[str]:
+    """Read the root node's "model" property, or None."""
+    pos = off_struct
+    end = min(off_struct + size_struct, len(blob)) if size_struct else len(blob)
+    depth = 0
+    while pos + 4 <= end:
+        token = struct.unpack_from(">I", blob, pos)[0]
+        pos += 4
+        if token == _FDT_BEGIN_NODE:
+            name_end = blob.find(b"\0", pos)
+            if name_end < 0:
+                return None
+            pos = _align4(name_end + 1)
+            depth += 1
+            if depth > 1:
+                # Past the root node's own properties
+                return None
+        elif token == _FDT_PROP:
+            if pos + 8 > end:
+                return None
+            length, name_off = struct.unpack_from(">II", blob, pos)
+            pos += 8
+            value = blob[pos:pos + length]
+            pos = _align4(pos + length)
+            name_start = off_strings + name_off
+            name_end = blob.find(b"\0", name_start)
+            if name_end >= 0 and blob[name_start:name_end] == b"model":
+                return value.rstrip(b"\0").decode("utf-8", "replace")
+        elif token == _FDT_NOP:
+            continue
+        else:  # FDT_END_NODE, FDT_END or garbage
+            return None
+    return None
+
+
+def _parse_header(data: Union[bytes, mmap.mmap], offset: int) -> Optional[FdtBlob]:
+    """Check the FDT header at offset and describe the blob, or None if it is not one."""
+    if offset + _HEADER.size > len(data):
+        return None
+    (_, totalsize, off_struct, off_strings, off_rsvmap, version,
+     last_comp, _, size_strings, size_struct) = _HEADER.unpack_from(data, offset)
+    if not (_HEADER.size <= totalsize <= _MAX_BLOB_SIZE) or offset + totalsize > len(data):
+        return None
+    if not (_MIN_VERSION <= version <= _MAX_VERSION) or last_comp > version:
+        return None
+    for section in (off_struct, off_strings, off_rsvmap):
+        if not (_HEADER.size <= section <= totalsize):
+            return None
+    if off_struct + size_struct > totalsize or off_strings + size_strings > totalsize:
+        return None
+
+    blob = bytes(data[offset:offset + totalsize])
+    return FdtBlob(offset=offset, size=totalsize, model=_root_model(blob, off_struct, off_strings, size_struct))
+
+
+def find_fdt_blobs(image_path: Union[str, Path]) -> List[FdtBlob]:
+    """
+    Find the device trees in an image.
+
+    Args:
+        image_path: Kernel, boot or dtbo image
+
+    Returns:
+        The valid blobs, in file order. Blobs nested in a found blob are
+        not reported again.
+    """
+    blobs: List[FdtBlob] = []
+    with open(image_path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return blobs
+        with mm:
+            pos = mm.find(FDT_MAGIC)
+            while pos >= 0:
+                blob = _parse_header(mm, pos)
+                if blob is not None:
+                    blobs.append(blob)
+                    pos = mm.find(FDT_MAGIC, pos + blob.size)
+                else:
+                    pos = mm.find(FDT_MAGIC, pos + 1)
+    return blobs
+
+
+def _file_name(index: int, model: Optional[str]) -> str:
+    if not model:
+        return f"{index:02d}_dtbdump.dtb"
+    safe = re.sub(r"[^\w.,+-]+", "_", model).strip("_")[:200]
+    return f"{index:02d}_dtbdump_{safe}.dtb"
+
+
+def split_dtbs(image_path: Union[str, Path], output_dir: Union[str, Path]) -> List[Path]:
+    """
+    Write every device tree in an image to its own .dtb file.
+
+    Args:
+        image_path: Kernel, boot or dtbo image
+        output_dir: Directory for the .dtb files (created if needed)
+
+    Returns:
+        The written files, numbered from 01 in file order
+    """
+    blobs = find_fdt_blobs(image_path)
+    if not blobs:
+        return []
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    with open(image_path, "rb") as src:
+        for index, blob in enumerate(blobs, start=1):
+            src.seek(blob.offset)
+            target = output_dir / _file_name(index, blob.model)
+            target.write_bytes(src.read(blob.size))
+            written.append(target)
+    return written
@@ -7,6 +7,11 @@ from typing import List, Optional, Union, Iterator, Tuple
 
 from rich.console import Console
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
 console = Console()
 
 
@@ -118,8 +123,9 @@ def move_file_to_root(source_path: Path, target_dir: Path) -> Optional[Path]:
         return target_path
 
     try:
-        # Use shutil.move for cross-filesystem moves
-        shutil.move(str(source_path), str(target_path))
+        # shutil.move renames within a filesystem; across filesystems it
+        # copies with the cheapest method available, then deletes the source
+        shutil.move(str(source_path), str(target_path), copy_function=fast_copy)
         console.print(f"[blue]Moved {source_path.name} to root directory[/blue]")
         return target_path
     except Exception as e:
@@ -144,15 +150,166 @@ def copy_file_to_directory(source_path: Path, target_dir: Path) -> Optional[Path
     target_dir.mkdir(parents=True, exist_ok=True)
     target_path = target_dir / source_path.name
 
+    # The target may be the source itself, or a link to it; removing it
+    # first would delete the only copy
+    if _is_same_file(source_path, target_path):
+        return target_path
+
     try:
-        shutil.copy2(str(source_path), str(target_path))
-        console.print(f"[green]Copied {source_path.name} to {target_dir}[/green]")
+        safe_remove_file(target_path)
+        # No hardlink: callers may modify the copy independently of the source
+        method = clone_file(source_path, target_path, allow_hardlink=False)
+        console.print(f"[green]Copied {source_path.name} to {target_dir} ({method})[/green]")
         return target_path
     except Exception as e:
         console.print(f"[yellow]Failed to copy {source_path.name}: {e}[/yellow]")
         return None
 
 
+def merge_directory_into(source_dir: Path, target_dir: Path) -> None:
+    """
+    Move everything in source_dir into target_dir, merging subdirectories.
+
+    Entries that exist in both are replaced by the source's, except
+    directories, whose contents are merged. Works across filesystems.
+
+    Args:
+        source_dir: Directory to empty
+        target_dir: Directory to move into (created if missing)
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for entry in source_dir.iterdir():
+        target = target_dir / entry.name
+        if entry.is_dir() and not entry.is_symlink() and target.is_dir() and not target.is_symlink():
+            merge_directory_into(entry, target)
+            entry.rmdir()
+            continue
+        if target.is_dir() and not target.is_symlink():
+            shutil.rmtree(target)
+        elif target.exists() or target.is_symlink():
+            target.unlink()
+        shutil.move(str(entry), str(target), copy_function=fast_copy)
+
+
+# ioctl(2) request number for FICLONE (linux/fs.h): share all extents of the
+# source file with the destination on CoW filesystems (btrfs, xfs, bcachefs).
+_FICLONE = 0x40049409
+
+
+def _reflink_file(source_path: Path, target_path: Path) -> bool:
+    """Try to reflink source into a new target file. Returns True on success."""
+    if fcntl is None:
+        return False
+    try:
+        with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        shutil.copystat(source_path, target_path)
+        return True
+    except OSError:
+        safe_remove_file(target_path)
+        return False
+
+
+def _copy_file_range(source_path: Path, target_path: Path) -> bool:
+    """Copy via copy_file_range(2), entirely in the kernel. Returns True on success.
+
+    Unlike sendfile, this lets the filesystem share blocks or do a server-side
+    copy (NFS 4.2, CIFS) where it supports that.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            remaining = os.fstat(src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), min(remaining, 1 << 30))
+                if copied == 0:
+                    break
+                remaining -= copied
+        shutil.copystat(source_path, target_path)
+        return True
+    except OSError:
+        # EXDEV on older kernels, ENOSYS/EINVAL on unsupported filesystems
+        safe_remove_file(target_path)
+        return False
+
+
+def clone_file(source_path: Path, target_path: Path, allow_hardlink: bool = True) -> str:
+    """
+    Materialize source at target as cheaply as the filesystem allows.
+
+    Tries, in order: a reflink (independent copy sharing disk blocks), a
+    hardlink (same inode, so the two paths must be treated as read-only),
+    copy_file_range, and a regular copy (which shutil does with sendfile on
+    Linux). The target must not exist yet.
+
+    Args:
+        source_path: File to clone
+        target_path: Destination path
+        allow_hardlink: Whether a hardlink is acceptable for this caller
+
+    Returns:
+        The method used: "reflink", "hardlink", "copy_file_range" or "copy"
+    """
+    if _reflink_file(source_path, target_path):
+        return "reflink"
+
+    if allow_hardlink:
+        try:
+            os.link(source_path, target_path)
+            return "hardlink"
+        except OSError:
+            pass
+
+    if _copy_file_range(source_path, target_path):
+        return "copy_file_range"
+
+    shutil.copy2(str(source_path), str(target_path))
+    return "copy"
+
+
+def _is_same_file(source_path: Union[str, Path], target_path: Union[str, Path]) -> bool:
+    """Whether target exists and is the same file as source (same path, a hardlink or a symlink)."""
+    try:
+        return os.path.samefile(source_path, target_path)
+    except OSError:
+        return False
+
+
+def fast_copy(source: str, target: str) -> str:
+    """shutil-compatible copy function that uses clone_file without hardlinks."""
+    if _is_same_file(source, target):
+        raise shutil.SameFileError(f"{source!r} and {target!r} are the same file")
+    safe_remove_file(target)
+    clone_file(Path(source), Path(target), allow_hardlink=False)
+    return target
+
+
+def is_rotational_disk(path: Union[str, Path]) -> Optional[bool]:
+    """
+    Whether the block device that holds path is a spinning disk.
+
+    Args:
+        path: Any path on the filesystem to check
+
+    Returns:
+        True for a rotational disk, False for an SSD/NVMe, or None if sysfs
+        does not say (network filesystems, containers without /sys)
+    """
+    try:
+        dev = os.stat(path).st_dev
+        device_dir = Path(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}").resolve()
+    except OSError:
+        return None
+    # A partition has no queue of its own; its parent disk has
+    for candidate in (device_dir, device_dir.parent):
+        try:
+            return (candidate / "queue" / "rotational").read_text().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
 def get_file_size_formatted(file_path: Union[str, Path]) -> str:
     """
     Get formatted file size in human readable format.
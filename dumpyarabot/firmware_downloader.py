@@ -1,30 +1,73 @@
+import asyncio
 import os
-import shutil
+import time
 from pathlib import Path
 from collections.abc import Callable, Coroutine
-from typing import Tuple
+from typing import Tuple, TypeVar
 from urllib.parse import urlparse
 
 import httpx
 from rich.console import Console
 
 from dumpyarabot.aria2_manager import Aria2Manager, DownloadProgress
+from dumpyarabot.bandwidth_scheduler import PRIORITY_FOREGROUND, PRIORITY_PREFETCH
+from dumpyarabot.download_ahead import take_over_prefetch, take_staged_download
+from dumpyarabot.download_cache import DownloadCache
+from dumpyarabot.integrity import StreamingHasher, verify_vendor_checksum
+from dumpyarabot.partial_downloads import adopt_download, claim_partial_area
+from dumpyarabot.redis_storage import RedisStorage
+from dumpyarabot.remote_payload import RemotePayloadError, RemotePayloadExtractor
 from dumpyarabot.schemas import DumpJob
+from dumpyarabot.share_links import resolve_google_drive, resolve_mediafire
 from dumpyarabot.process_utils import run_download_command
-from dumpyarabot.file_utils import get_latest_file_in_directory, safe_remove_file, get_file_size_formatted
+from dumpyarabot.tool_manager import tool_command
+from dumpyarabot.file_utils import clone_file, get_latest_file_in_directory, safe_remove_file, get_file_size_formatted
+from dumpyarabot.url_utils import RemoteFileInfo, probe_remote_file
 
 console = Console()
 
 # Type alias for the optional progress callback
 ProgressCallback = Callable[[DownloadProgress], Coroutine[None, None, None]]
 
+T = TypeVar("T")
+
+# Seconds between hashing steps while a single-stream tool writes the file
+_HASH_FOLLOW_INTERVAL = 2.0
+
+# Seconds between aria2 progress snapshots. Telegram throttles edits of one
+# status message, so faster snapshots would only pile up in the queue;
+# completion is pushed by aria2 and does not wait for the next snapshot.
+_PROGRESS_INTERVAL = 5.0
+
+# Xiaomi OTA mirrors, in order of preference when measured throughput ties
+XIAOMI_MIRRORS = [
+    "https://cdnorg.d.miui.com",
+    "https://bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com",
+    "https://bn.d.miui.com",
+]
+
+# Mirror probing: a short ranged GET measures real throughput
+_MIRROR_PROBE_BYTES = 512 * 1024
+_MIRROR_PROBE_TIMEOUT = 8.0
+_MIRROR_HEALTH_TTL = 1800
+
 
 class FirmwareDownloader:
     """Handles firmware downloading with mirror optimization and special URL handling."""
 
-    def __init__(self, work_dir: str):
+    def __init__(self, work_dir: str, prefetch: bool = False, download_dir: str | None = None):
         self.work_dir = Path(work_dir)
         self.work_dir.mkdir(parents=True, exist_ok=True)
+        # The archive can go to its own disk (SCRATCH_ROOTS "download");
+        # partitions fetched out of a remote payload always go to work_dir
+        self.download_dir = Path(download_dir) if download_dir else self.work_dir
+        # Download-ahead for a queued job: low bandwidth priority, and never
+        # adopt a staged download (that would be its own)
+        self.prefetch = prefetch
+        # Size and digests of the last downloaded archive, for job metadata
+        self.download_info: dict | None = None
+        # (path, digests) computed while the last download was being written
+        self._streamed_digests: tuple[str, dict[str, str]] | None = None
 
     async def download_firmware(
         self,
@@ -43,46 +86,141 @@ class FirmwareDownloader:
         # Check if it's a local file
         if os.path.isfile(url):
             console.print(f"[green]Found local file: {url}[/green]")
-            # Copy to work directory
+            # Reflink or hardlink into the work dir when on the same
+            # filesystem; extraction only reads the archive and then unlinks it
             file_name = Path(url).name
-            dest_path = self.work_dir / file_name
-            shutil.copy2(url, dest_path)
+            dest_path = self.download_dir / file_name
+            safe_remove_file(dest_path)
+            method = await asyncio.to_thread(clone_file, Path(url), dest_path)
+            console.print(f"[blue]Ingested {file_name} into work dir ({method})[/blue]")
+            self.download_info = {"file_name": file_name, "size": dest_path.stat().st_size, "source": "local"}
             return str(dest_path), file_name
 
-        # Optimize URL with mirrors
-        optimized_url = await self._optimize_url(url)
+        if not self.prefetch:
+            # Let a running prefetch of this URL go, then use it if it finished
+            await take_over_prefetch(url)
+            staged = await asyncio.to_thread(take_staged_download, url, self.download_dir)
+            if staged is not None:
+                staged_path, self.download_info = staged
+                return str(staged_path), staged_path.name
+
+        # Optimize URL with mirrors; alternates feed aria2 as extra sources
+        mirror_urls = await self._resolve_mirrors(url)
+        optimized_url = mirror_urls[0]
+
+        # Serve unchanged archives from the persistent download cache
+        cache = DownloadCache.from_settings(self.download_dir)
+        remote_info: RemoteFileInfo | None = None
+        if cache is not None and self._is_direct_url(optimized_url):
+            remote_info = await probe_remote_file(optimized_url)
+            if remote_info is not None:
+                entry = await asyncio.to_thread(cache.lookup, url, remote_info)
+                if entry is not None:
+                    cached_path = await asyncio.to_thread(cache.materialize, entry, self.download_dir)
+                    self.download_info = {
+                        "file_name": cached_path.name,
+                        "size": entry.size,
+                        "sha256": entry.sha256,
+                        "source": "cache",
+                    }
+                    return str(cached_path), cached_path.name
+
         console.print(f"[blue]Downloading from: {optimized_url}[/blue]")
 
         # Download based on URL type
-        file_path = await self._download_by_type(optimized_url, on_progress=on_progress)
+        # The partial download is keyed on the job URL, which stays the same
+        # when mirror ranking picks a different primary on a retry
+        file_path = await self._download_by_type(
+            optimized_url, on_progress=on_progress, mirrors=mirror_urls[1:], resume_key=url
+        )
         file_name = Path(file_path).name
 
         console.print(f"[green]Downloaded: {file_name} ({get_file_size_formatted(file_path)})[/green]")
+
+        digests = await self._collect_digests(file_path)
+        # A corrupt archive fails the job here, before it can enter the cache
+        vendor_verified = verify_vendor_checksum(file_name, digests)
+        if vendor_verified:
+            console.print(f"[green]Vendor md5 checksum verified for {file_name}[/green]")
+        self.download_info = {
+            "file_name": file_name,
+            "size": Path(file_path).stat().st_size,
+            **digests,
+            "vendor_checksum_verified": vendor_verified,
+            "source": "download",
+        }
+
+        if cache is not None:
+            try:
+                await cache.store_async(Path(file_path), url, remote_info, sha256=digests.get("sha256"))
+            except Exception as e:
+                # Caching is an optimization; never fail the dump over it
+                console.print(f"[yellow]Could not add {file_name} to download cache: {e}[/yellow]")
+
         return file_path, file_name
 
+    async def fetch_payload_partitions(
+        self,
+        job: DumpJob,
+        partitions: list[str],
+        on_progress: ProgressCallback | None = None,
+    ) -> list[Path] | None:
+        """Fetch only the wanted partitions of a remote OTA payload.
+
+        Returns the written `<partition>.img` paths, or None when the URL is
+        not a partially readable OTA zip and a full download is needed.
+        """
+        url = str(job.dump_args.url)
+        if os.path.isfile(url):
+            return None
+
+        optimized_url = await self._optimize_url(url)
+        if not self._is_direct_url(optimized_url):
+            return None
+
+        try:
+            return await RemotePayloadExtractor(optimized_url, str(self.work_dir)).extract(
+                partitions, on_progress=on_progress
+            )
+        except RemotePayloadError as e:
+            console.print(f"[yellow]Remote payload extraction not possible, downloading full archive: {e}[/yellow]")
+            return None
+        except Exception as e:
+            console.print(f"[yellow]Remote payload extraction failed, downloading full archive: {e}[/yellow]")
+            return None
+
+    @staticmethod
+    def _is_direct_url(url: str) -> bool:
+        """Whether the URL is fetched as-is (not through a share-link tool)."""
+        return not any(host in url for host in ("drive.google.com", "mediafire.com", "mega.nz"))
+
     async def _optimize_url(self, url: str) -> str:
         """Optimize URL with best available mirrors."""
+        return (await self._resolve_mirrors(url))[0]
+
+    async def _resolve_mirrors(self, url: str) -> list[str]:
+        """Return download URLs for the file, best first.
+
+        Entries after the first are mirrors of the same file, which aria2
+        pulls segments from in parallel.
+        """
         # Xiaomi mirror optimization
         if "d.miui.com" in url:
-            return await self._optimize_xiaomi_url(url)
+            return await self._rank_xiaomi_mirrors(url)
 
         # Pixeldrain optimization
         if "pixeldrain.com/u" in url:
             file_id = url.split("/")[-1]
-            return f"https://pd.cybar.xyz/{file_id}"
+            return [f"https://pd.cybar.xyz/{file_id}"]
 
         if "pixeldrain.com/d" in url:
             file_id = url.split("/")[-1]
-            return f"https://pixeldrain.com/api/filesystem/{file_id}"
+            return [f"https://pixeldrain.com/api/filesystem/{file_id}"]
 
-        return url
-
-    async def _optimize_xiaomi_url(self, url: str) -> str:
-        """Find best Xiaomi mirror."""
-        # Skip if already using recommended mirror
-        if "cdnorg" in url or "bkt-sgp-miui-ota-update-alisgp" in url:
-            return url
+        return [url]
 
+    async def _rank_xiaomi_mirrors(self, url: str) -> list[str]:
+        """Race all Xiaomi mirrors and return the live ones, fastest first."""
         # Extract original host and file path (equivalent to bash logic)
         parsed = urlparse(url)
         original_host = f"{parsed.scheme}://{parsed.netloc}"
@@ -97,48 +235,135 @@ class FirmwareDownloader:
         # Remove query strings from file path
         file_path = file_path.split('?')[0]
 
-        # Test mirrors in order of preference
-        mirrors = [
-            "https://cdnorg.d.miui.com",
-            "https://bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com",
-            "https://bn.d.miui.com",
-            original_host
+        # Listed in order of preference, which breaks throughput ties
+        mirrors = list(dict.fromkeys(XIAOMI_MIRRORS + [original_host]))
+        candidates = [f"{mirror}/{file_path}" for mirror in mirrors]
+
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            throughputs = await asyncio.gather(
+                *(self._probe_mirror(client, candidate) for candidate in candidates)
+            )
+
+        live = [
+            (throughput, index, candidate)
+            for index, (throughput, candidate) in enumerate(zip(throughputs, candidates))
+            if throughput is not None
         ]
+        if not live:
+            console.print("[yellow]All mirrors failed, using original URL[/yellow]")
+            return [url]
+
+        live.sort(key=lambda item: (-item[0], item[1]))
+        for throughput, _, candidate in live:
+            console.print(
+                f"[blue]Mirror {urlparse(candidate).netloc}: {throughput / (1024 * 1024):.1f} MB/s[/blue]"
+            )
+        console.print(f"[green]Using mirror: {urlparse(live[0][2]).netloc} (+{len(live) - 1} alternate(s))[/green]")
+        return [candidate for _, _, candidate in live]
 
-        async with httpx.AsyncClient() as client:
-            for mirror in mirrors:
-                test_url = f"{mirror}/{file_path}"
-                try:
-                    console.print(f"[blue]Testing mirror: {mirror}[/blue]")
-                    response = await client.head(test_url, timeout=10.0)
-                    if response.status_code != 404:
-                        console.print(f"[green]Using mirror: {mirror}[/green]")
-                        return test_url
-                except Exception as e:
-                    console.print(f"[yellow]Mirror {mirror} failed: {e}[/yellow]")
-                    continue
-
-        console.print("[yellow]All mirrors failed, using original URL[/yellow]")
-        return url
+    async def _probe_mirror(self, client: httpx.AsyncClient, test_url: str) -> float | None:
+        """Measure a mirror's throughput for a file in bytes/s, or None if it can't serve it.
+
+        Host health is cached in Redis. A host known to be down is skipped, and
+        a host known to be up only gets a HEAD to confirm it has this file.
+        """
+        host = urlparse(test_url).netloc
+        cached = await self._get_cached_mirror_health(host)
+        if cached is not None and not cached.get("alive"):
+            console.print(f"[yellow]Skipping mirror {host}: failed a recent probe[/yellow]")
+            return None
+
+        try:
+            if cached is not None:
+                response = await client.head(test_url, timeout=_MIRROR_PROBE_TIMEOUT)
+                if response.status_code >= 400:
+                    return None
+                return float(cached.get("throughput", 0.0))
+
+            started = time.monotonic()
+            received = 0
+            async with client.stream(
+                "GET",
+                test_url,
+                headers={"Range": f"bytes=0-{_MIRROR_PROBE_BYTES - 1}"},
+                timeout=_MIRROR_PROBE_TIMEOUT,
+            ) as response:
+                # A 404 means this mirror lacks the file, not that the host is unhealthy
+                if response.status_code >= 400:
+                    console.print(f"[yellow]Mirror {host} returned HTTP {response.status_code}[/yellow]")
+                    return None
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received >= _MIRROR_PROBE_BYTES:
+                        break
+            throughput = received / max(time.monotonic() - started, 0.001)
+        except Exception as e:
+            console.print(f"[yellow]Mirror {host} failed: {e}[/yellow]")
+            await self._store_mirror_health(host, {"alive": False, "checked_at": time.time()})
+            return None
+
+        await self._store_mirror_health(
+            host, {"alive": True, "throughput": throughput, "checked_at": time.time()}
+        )
+        return throughput
+
+    @staticmethod
+    async def _get_cached_mirror_health(host: str) -> dict | None:
+        try:
+            return await RedisStorage.get_mirror_health(host)
+        except Exception as e:
+            console.print(f"[yellow]Could not read mirror health for {host}: {e}[/yellow]")
+            return None
+
+    @staticmethod
+    async def _store_mirror_health(host: str, health: dict) -> None:
+        try:
+            await RedisStorage.store_mirror_health(host, health, ttl=_MIRROR_HEALTH_TTL)
+        except Exception as e:
+            console.print(f"[yellow]Could not cache mirror health for {host}: {e}[/yellow]")
 
     async def _download_by_type(
-        self, url: str, on_progress: ProgressCallback | None = None
+        self,
+        url: str,
+        on_progress: ProgressCallback | None = None,
+        mirrors: list[str] | None = None,
+        resume_key: str | None = None,
     ) -> str:
-        """Download file based on URL type."""
+        """Download file based on URL type.
+
+        Drive and MediaFire links are resolved to direct URLs and fetched with
+        aria2 (multi-connection, live progress); their dedicated tools are
+        only a fallback when resolution fails. resume_key (default: url)
+        names the partial-download area.
+        """
+        resume_key = resume_key or url
         if "drive.google.com" in url:
-            return await self._download_google_drive(url)
+            direct_url = await resolve_google_drive(url)
+            if direct_url:
+                console.print("[green]Resolved Google Drive link, downloading with aria2[/green]")
+                return await self._download_default(direct_url, on_progress=on_progress, resume_key=resume_key)
+            console.print("[yellow]Could not resolve Google Drive link, falling back to gdown[/yellow]")
+            return await self._hash_while_downloading(self._download_google_drive(url))
         elif "mediafire.com" in url:
-            return await self._download_mediafire(url)
+            direct_url = await resolve_mediafire(url)
+            if direct_url:
+                console.print("[green]Resolved MediaFire link, downloading with aria2[/green]")
+                return await self._download_default(direct_url, on_progress=on_progress, resume_key=resume_key)
+            console.print("[yellow]Could not resolve MediaFire link, falling back to mediafire-dl[/yellow]")
+            return await self._hash_while_downloading(self._download_mediafire(url))
         elif "mega.nz" in url:
-            return await self._download_mega(url)
+            # MEGA files are AES-encrypted client side, so they stay on megatools
+            return await self._hash_while_downloading(self._download_mega(url))
         else:
-            return await self._download_default(url, on_progress=on_progress)
+            return await self._download_default(
+                url, on_progress=on_progress, mirrors=mirrors, resume_key=resume_key
+            )
 
     async def _download_google_drive(self, url: str) -> str:
         """Download from Google Drive using gdown."""
         result = await run_download_command(
-            "uvx", "gdown@5.2.0", "-q", url, "--fuzzy",
-            cwd=self.work_dir,
+            *tool_command("gdown"), "-q", url, "--fuzzy",
+            cwd=self.download_dir,
             timeout=1800.0,  # 30 minutes for large files
             description="Downloading from Google Drive"
         )
@@ -147,7 +372,7 @@ class FirmwareDownloader:
             raise Exception(f"Google Drive download failed: {result.stderr}")
 
         # Find downloaded file
-        latest_file = get_latest_file_in_directory(self.work_dir)
+        latest_file = get_latest_file_in_directory(self.download_dir)
         if not latest_file:
             raise Exception("No file found after Google Drive download")
 
@@ -156,9 +381,8 @@ class FirmwareDownloader:
     async def _download_mediafire(self, url: str) -> str:
         """Download from MediaFire using mediafire-dl."""
         result = await run_download_command(
-            "uvx", "--from", "git+https://github.com/Juvenal-Yescas/mediafire-dl@master",
-            "mediafire-dl", url,
-            cwd=self.work_dir,
+            *tool_command("mediafire-dl"), url,
+            cwd=self.download_dir,
             timeout=1800.0,  # 30 minutes for large files
             description="Downloading from MediaFire"
         )
@@ -167,7 +391,7 @@ class FirmwareDownloader:
             raise Exception(f"MediaFire download failed: {result.stderr}")
 
         # Find downloaded file
-        latest_file = get_latest_file_in_directory(self.work_dir)
+        latest_file = get_latest_file_in_directory(self.download_dir)
         if not latest_file:
             raise Exception("No file found after MediaFire download")
 
@@ -177,7 +401,7 @@ class FirmwareDownloader:
         """Download from MEGA using megatools."""
         result = await run_download_command(
             "megatools", "dl", url,
-            cwd=self.work_dir,
+            cwd=self.download_dir,
             timeout=1800.0,  # 30 minutes for large files
             description="Downloading from MEGA"
         )
@@ -186,50 +410,38 @@ class FirmwareDownloader:
             raise Exception(f"MEGA download failed: {result.stderr}")
 
         # Find downloaded file
-        latest_file = get_latest_file_in_directory(self.work_dir)
+        latest_file = get_latest_file_in_directory(self.download_dir)
         if not latest_file:
             raise Exception("No file found after MEGA download")
 
         return str(latest_file)
 
     async def _download_default(
-        self, url: str, on_progress: ProgressCallback | None = None
+        self,
+        url: str,
+        on_progress: ProgressCallback | None = None,
+        mirrors: list[str] | None = None,
+        resume_key: str | None = None,
     ) -> str:
-        """Download using aria2 RPC (with live progress) and wget fallback."""
-        # --- Try aria2 RPC first ---
-        aria2_failed = False
-        aria2_error = ""
-        try:
-            async with Aria2Manager(str(self.work_dir)) as aria2:
-                async for progress in aria2.download(url, poll_interval=3.0, timeout=1800.0):
-                    if on_progress:
-                        try:
-                            await on_progress(progress)
-                        except Exception as cb_err:
-                            # Don't let a Telegram/callback error kill the download
-                            console.print(f"[yellow]Progress callback error (ignored): {cb_err}[/yellow]")
+        """Download using aria2 RPC (with live progress) and wget fallback.
 
-                # Download finished successfully
-                downloaded = aria2.get_downloaded_file_path()
-                if downloaded:
-                    return downloaded
-
-                # aria2 reported completion but no file found
-                aria2_error = "aria2 completed but no file found in work dir"
-                console.print(f"[yellow]{aria2_error}[/yellow]")
-                aria2_failed = True
+        Mirrors are extra URIs for the same file; aria2 splits segments
+        across all of them. The wget fallback uses only the primary URL.
+        resume_key names the partial-download area when the URL itself is
+        single-use (e.g. a resolved Drive link); it defaults to the URL.
+        """
+        # --- Try aria2 RPC first, resuming a partial download of this URL if any ---
+        try:
+            with claim_partial_area(resume_key or url) as partial_dir:
+                return await self._download_aria2(url, partial_dir, on_progress, mirrors)
         except Exception as e:
             # Keep the actual aria2 reason (error code + message); the console line
             # only reaches journald, so we also stash it for the final exception.
             aria2_error = str(e) or repr(e)
             console.print(f"[yellow]aria2 RPC download failed: {aria2_error}[/yellow]")
-            aria2_failed = True
-
-        if not aria2_failed:
-            raise Exception("aria2 download did not produce a file")
 
         # Clean up aria2c partial/sidecar artifacts before wget fallback
-        for file in self.work_dir.iterdir():
+        for file in self.download_dir.iterdir():
             if file.suffix == ".aria2" or (file.is_file() and file.stat().st_size == 0):
                 safe_remove_file(file)
 
@@ -238,11 +450,13 @@ class FirmwareDownloader:
         # --- wget fallback ---
         # Use -nv (not -q): -q silences errors too, so a failed download would
         # leave stderr empty. -nv drops the progress bar but keeps error output.
-        result = await run_download_command(
-            "wget", "-nv", "--no-check-certificate", url,
-            cwd=self.work_dir,
-            timeout=1800.0,
-            description="Downloading with wget fallback"
+        result = await self._hash_while_downloading(
+            run_download_command(
+                "wget", "-nv", "--no-check-certificate", url,
+                cwd=self.download_dir,
+                timeout=1800.0,
+                description="Downloading with wget fallback"
+            )
         )
 
         if not result.success:
@@ -253,7 +467,7 @@ class FirmwareDownloader:
                 f"wget: {wget_error}"
             )
 
-        latest_file = get_latest_file_in_directory(self.work_dir)
+        latest_file = get_latest_file_in_directory(self.download_dir)
         if not latest_file:
             raise Exception(
                 "wget reported success but no file was found in the work dir "
@@ -262,4 +476,133 @@ class FirmwareDownloader:
 
         return str(latest_file)
 
+    async def _download_aria2(
+        self,
+        url: str,
+        partial_dir: Path | None,
+        on_progress: ProgressCallback | None = None,
+        mirrors: list[str] | None = None,
+    ) -> str:
+        """Download with aria2, resuming from partial_dir when one is given.
+
+        The finished file is moved from partial_dir into the work dir; on
+        failure the partial file stays there for the next attempt.
+        """
+        download_dir = partial_dir or self.download_dir
+        hasher: StreamingHasher | None = None
+        try:
+            async with Aria2Manager(str(download_dir), resumable=partial_dir is not None) as aria2:
+                async for progress in aria2.download(
+                    url,
+                    mirrors=mirrors,
+                    poll_interval=_PROGRESS_INTERVAL,
+                    timeout=1800.0,
+                    priority=PRIORITY_PREFETCH if self.prefetch else PRIORITY_FOREGROUND,
+                ):
+                    # Hash the leading run of finished pieces while the rest arrives
+                    if progress.file_path:
+                        if hasher is None:
+                            hasher = StreamingHasher(Path(progress.file_path))
+                        hasher.advance(progress.contiguous_bytes)
+
+                    if on_progress:
+                        try:
+                            await on_progress(progress)
+                        except Exception as cb_err:
+                            # Don't let a Telegram/callback error kill the download
+                            console.print(f"[yellow]Progress callback error (ignored): {cb_err}[/yellow]")
+
+                # Download finished successfully
+                downloaded = aria2.get_downloaded_file_path()
+        except BaseException:
+            if hasher is not None:
+                await hasher.abandon()
+            raise
+
+        if not downloaded:
+            # aria2 reported completion but no file found
+            raise Exception("aria2 completed but no file found in work dir")
+
+        # Finish hashing before the file moves out of the resumable area
+        digests = await self._finish_hasher(hasher, downloaded)
+
+        if partial_dir is not None:
+            downloaded = str(await asyncio.to_thread(adopt_download, Path(downloaded), self.download_dir))
+        if digests:
+            self._streamed_digests = (downloaded, digests)
+        return downloaded
+
+    async def _hash_while_downloading(self, download: Coroutine[None, None, T]) -> T:
+        """Run a single-stream download while hashing its file as it grows.
+
+        Tools like wget append to the newest file in the work dir, so its
+        current size is always final and can be hashed straight away.
+        """
+        started = time.time()
+        stop = asyncio.Event()
+
+        async def follow() -> StreamingHasher | None:
+            hasher = None
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), _HASH_FOLLOW_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    if hasher is None:
+                        latest = get_latest_file_in_directory(self.download_dir)
+                        if latest and latest.suffix != ".aria2" and latest.stat().st_mtime >= started:
+                            hasher = StreamingHasher(latest)
+                    if hasher is not None:
+                        hasher.advance(hasher.path.stat().st_size)
+                except OSError:
+                    # The tool renamed or removed its temp file; hash afterwards instead
+                    break
+            return hasher
+
+        follower = asyncio.create_task(follow())
+        try:
+            result = await download
+        except BaseException:
+            stop.set()
+            hasher = await follower
+            if hasher is not None:
+                await hasher.abandon()
+            raise
+
+        stop.set()
+        hasher = await follower
+        file_path = result if isinstance(result, str) else get_latest_file_in_directory(self.download_dir)
+        if hasher is not None and file_path and hasher.path == Path(file_path):
+            digests = await self._finish_hasher(hasher, str(file_path))
+            if digests:
+                self._streamed_digests = (str(file_path), digests)
+        elif hasher is not None:
+            await hasher.abandon()
+        return result
+
+    @staticmethod
+    async def _finish_hasher(hasher: StreamingHasher | None, file_path: str) -> dict[str, str] | None:
+        """Complete a streaming hash, or None if it didn't track this file."""
+        if hasher is None or hasher.path != Path(file_path):
+            if hasher is not None:
+                await hasher.abandon()
+            return None
+        try:
+            return await hasher.finish()
+        except OSError as e:
+            console.print(f"[yellow]Streaming hash failed, will hash after download: {e}[/yellow]")
+            return None
+
+    async def _collect_digests(self, file_path: str) -> dict[str, str]:
+        """Digests of the downloaded file, from the streaming hash when it covered it."""
+        if self._streamed_digests and self._streamed_digests[0] == file_path:
+            return self._streamed_digests[1]
+        console.print("[blue]Hashing downloaded file...[/blue]")
+        try:
+            return await StreamingHasher(Path(file_path)).finish()
+        except OSError as e:
+            console.print(f"[yellow]Could not hash {file_path}: {e}[/yellow]")
+            return {}
+
 
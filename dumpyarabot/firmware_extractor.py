@@ -1,32 +1,112 @@
+import asyncio
 import os
 import shutil
+import time
+from functools import partial
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from rich.console import Console
 
+from dumpyarabot.config import settings
 from dumpyarabot.schemas import DumpJob
-from dumpyarabot.process_utils import HALF_HOUR, ONE_HOUR, run_command, run_extraction_command, run_git_command, run_analysis_command
-from dumpyarabot.file_utils import find_files_by_pattern, move_file_to_root, safe_remove_file
+from dumpyarabot.task_graph import TaskGraph
+from dumpyarabot.tool_manager import tool_command
+from dumpyarabot.process_utils import ONE_HOUR, run_command, run_extraction_command, run_analysis_command
+from dumpyarabot.bootimg import UnsupportedRamdisk, extract_ramdisks, unpack_boot_image
+from dumpyarabot.extractor_checkout import current_checkout, ensure_firmware_extractor
+from dumpyarabot.fdt import split_dtbs
+from dumpyarabot.kernel_analysis import analyze_kernel
+from dumpyarabot.fs_detect import FS_EROFS, FS_EXT4, FS_F2FS, FS_SPARSE, FS_SQUASHFS, detect_filesystem
+from dumpyarabot.file_utils import (
+    find_files_by_pattern,
+    is_rotational_disk,
+    merge_directory_into,
+    move_file_to_root,
+    safe_remove_file,
+)
+from dumpyarabot.scratch_tiers import TIER_SMALL, make_tier_dir
+from dumpyarabot.sdat2img import convert_partition, extract_members, find_block_partitions
 
 console = Console()
 
+# Partition images handled by the alternative dumper, in extraction order.
+# The first entry is critical: failing to extract it aborts the job.
+ALT_DUMPER_PARTITIONS = [
+    "system", "systemex", "system_ext", "system_other",
+    "vendor", "cust", "odm", "odm_ext", "oem", "factory", "product", "modem",
+    "xrom", "oppo_product", "opproduct", "reserve", "india", "my_preload",
+    "my_odm", "my_stock", "my_operator", "my_country", "my_product", "my_company",
+    "my_engineering", "my_heytap", "my_custom", "my_manifest", "my_carrier", "my_region",
+    "my_bigball", "my_version", "special_preload", "vendor_dlkm", "odm_dlkm", "system_dlkm",
+    "mi_ext", "radio", "product_h", "preas", "preavs", "preload"
+]
+
+# Partitions whose build props decide a dump's repo and branch (the paths
+# PropertyExtractor reads). They are extracted first, so the duplicate check
+# can run while the other partitions extract.
+PROP_PARTITIONS = (
+    "system", "vendor", "odm", "product", "product_h",
+    "my_manifest", "my_product", "oppo_product",
+)
+
+# Extraction tools, and the order to try them in for each filesystem
+_FSCK_EROFS = "fsck.erofs"
+_EXT2RD = "ext2rd"
+_7ZZ = "7zz"
+_ALL_TOOLS = (_FSCK_EROFS, _EXT2RD, _7ZZ)
+_TOOLS_BY_FILESYSTEM = {
+    FS_EROFS: (_FSCK_EROFS, _7ZZ),
+    FS_EXT4: (_EXT2RD, _7ZZ),
+    FS_SQUASHFS: (_7ZZ,),
+    FS_F2FS: (_7ZZ,),
+}
+
+# Boot-type images processed after extraction, in processing order.
+BOOT_IMAGES = [
+    "init_boot.img",
+    "vendor_kernel_boot.img",
+    "vendor_boot.img",
+    "boot.img",
+    "recovery.img",
+    "dtbo.img",
+]
+
+# Oppo/Realme/OnePlus dirs whose images are extracted with the boot images
+OPPO_IMAGE_DIRS = ["vendor/euclid", "system/system/euclid", "reserve/reserve"]
+
+# Files kernel analysis writes next to the boot image dirs
+_KERNEL_OUTPUTS = ("ikconfig", "kallsyms.txt", "boot.elf")
+
+# Room a boot image's outputs need on the small scratch tier, as a multiple
+# of the image: the sections, the unpacked ramdisk and the kernel artifacts
+_SMALL_TIER_EXPANSION = 4
+
 
 class FirmwareExtractor:
     """Handles firmware extraction using both Python dumper and alternative methods."""
 
     def __init__(self, work_dir: str):
         self.work_dir = Path(work_dir)
-        self.firmware_extractor_path = Path.home() / "Firmware_extractor"
+        # Resolved to a pinned checkout by _setup_firmware_extractor
+        self.firmware_extractor_path = current_checkout()
+        # Set once the PROP_PARTITIONS are in the work dir
+        self.props_ready = asyncio.Event()
+        # Seconds per boot image processing step, from process_boot_images
+        self.boot_image_timings: Dict[str, float] = {}
 
     async def extract_firmware(self, job: DumpJob, firmware_path: str) -> str:
         """Extract firmware and return extraction directory."""
         console.print(f"[blue]Extracting firmware: {firmware_path}[/blue]")
 
         if job.dump_args.use_alt_dumper:
-            extraction_dir = await self._extract_with_alternative_dumper(firmware_path)
+            if await self._extract_block_based_ota(firmware_path):
+                extraction_dir = str(self.work_dir)
+            else:
+                extraction_dir = await self._extract_with_alternative_dumper(firmware_path)
         else:
             extraction_dir = await self._extract_with_python_dumper(firmware_path)
+        self.props_ready.set()
 
         # Delete the original firmware archive so it isn't committed/pushed with
         # the extracted contents. Mirrors `rm -f "$FILE"` from the legacy
@@ -42,9 +122,7 @@ class FirmwareExtractor:
     async def _extract_with_python_dumper(self, firmware_path: str) -> str:
         """Extract using the modern Python dumpyara tool."""
         result = await run_command(
-            "uvx", "--from",
-            "git+https://github.com/deadman96385/dumpyara@b5195ce980fad0e881f642dada16ddda103f467a",
-            "dumpyara", firmware_path, "-o", str(self.work_dir),
+            *tool_command("dumpyara"), firmware_path, "-o", str(self.work_dir),
             cwd=self.work_dir,
             timeout=ONE_HOUR,
             check=True,
@@ -76,91 +154,239 @@ class FirmwareExtractor:
         console.print("[green]Alternative dumper extraction completed[/green]")
         return str(self.work_dir)
 
-    async def _setup_firmware_extractor(self):
-        """Clone or update the Firmware_extractor repository."""
-        # Network + HDD I/O can be slow; bound generously rather than the 30s default.
-        if not self.firmware_extractor_path.exists():
-            await run_git_command(
-                "clone", "-q",
-                "https://github.com/AndroidDumps/Firmware_extractor",
-                str(self.firmware_extractor_path),
-                timeout=HALF_HOUR,
-                description="Cloning Firmware_extractor"
-            )
-        else:
-            await run_git_command(
-                "-C", str(self.firmware_extractor_path), "pull", "-q", "--rebase",
-                timeout=HALF_HOUR,
-                description="Updating Firmware_extractor"
-            )
+    async def _extract_block_based_ota(self, firmware_path: str) -> bool:
+        """Convert a block-based OTA's partitions in-process (see sdat2img).
 
-    async def _extract_partitions(self):
-        """Extract individual partition images using alternative dumper tools."""
-        partitions = [
-            "system", "systemex", "system_ext", "system_other",
-            "vendor", "cust", "odm", "odm_ext", "oem", "factory", "product", "modem",
-            "xrom", "oppo_product", "opproduct", "reserve", "india", "my_preload",
-            "my_odm", "my_stock", "my_operator", "my_country", "my_product", "my_company",
-            "my_engineering", "my_heytap", "my_custom", "my_manifest", "my_carrier", "my_region",
-            "my_bigball", "my_version", "special_preload", "vendor_dlkm", "odm_dlkm", "system_dlkm",
-            "mi_ext", "radio", "product_h", "preas", "preavs", "preload"
-        ]
+        Each *.new.dat[.br] is streamed out of the zip into a sparse
+        <partition>.img, several partitions at a time, and the zip's other
+        members are copied next to them. The images are then extracted like
+        extractor.sh's output.
 
-        fsck_erofs = self.firmware_extractor_path / "tools" / "fsck.erofs"
-        ext2rd = self.firmware_extractor_path / "tools" / "ext2rd"
+        Returns:
+            False if the archive is not a block-based OTA or a partition
+            could not be converted; extractor.sh handles it then
+        """
+        partitions = await asyncio.to_thread(find_block_partitions, firmware_path)
+        if not partitions:
+            return False
 
-        for partition in partitions:
-            img_file = self.work_dir / f"{partition}.img"
-            if not img_file.exists():
-                continue
+        console.print(
+            f"[blue]Block-based OTA: converting {', '.join(p.name for p in partitions)} in-process[/blue]"
+        )
+        slots = asyncio.Semaphore(self._extraction_parallelism())
+        images = [self.work_dir / f"{partition.name}.img" for partition in partitions]
+
+        async def convert(partition, image: Path) -> None:
+            async with slots:
+                started = time.monotonic()
+                written = await asyncio.to_thread(convert_partition, firmware_path, partition, image)
+                console.print(
+                    f"[green]Converted {partition.data} to {image.name} "
+                    f"({written // 1024**2} MiB of data) in {time.monotonic() - started:.1f}s[/green]"
+                )
 
-            partition_dir = self.work_dir / partition
-            partition_dir.mkdir(exist_ok=True)
+        # Conversions run in threads, so let them all finish before cleaning up
+        results = await asyncio.gather(
+            *(convert(partition, image) for partition, image in zip(partitions, images)),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            console.print(f"[yellow]In-process conversion failed, using extractor.sh: {errors[0]}[/yellow]")
+            for image in images:
+                safe_remove_file(image)
+            return False
+
+        await asyncio.to_thread(extract_members, firmware_path, self.work_dir, partitions)
+        await self._setup_firmware_extractor()
+        await self._extract_partitions()
+        console.print("[green]Block-based OTA extraction completed[/green]")
+        return True
 
-            # Try extraction methods in order
-            success = False
+    async def extract_partition_images(self) -> str:
+        """Extract partition images already placed in the work dir.
 
-            # Method 1: fsck.erofs
-            if fsck_erofs.exists():
-                result = await run_extraction_command(
-                    str(fsck_erofs), f"--extract={partition_dir}", str(img_file),
-                    description=f"Extracting '{partition}' via fsck.erofs"
-                )
-                if result.success:
-                    success = True
-
-            # Method 2: ext2rd
-            if not success and ext2rd.exists():
-                result = await run_extraction_command(
-                    str(ext2rd), str(img_file), f"./{partition}",
-                    cwd=self.work_dir,
-                    description=f"Extracting '{partition}' via ext2rd"
-                )
-                if result.success:
-                    success = True
-
-            # Method 3: 7zip
-            if not success:
-                result = await run_extraction_command(
-                    "7zz", "-snld", "x", str(img_file), "-y", f"-o{partition_dir}/",
-                    description=f"Extracting '{partition}' via 7zz"
-                )
-                if result.success:
-                    success = True
+        Used when the partitions were fetched straight out of a remote OTA
+        payload, so there is no archive for extractor.sh to unpack.
+        """
+        console.print("[blue]Extracting fetched partition images...[/blue]")
+        await self._setup_firmware_extractor()
+        await self._extract_partitions()
+        self.props_ready.set()
+        console.print("[green]Partition image extraction completed[/green]")
+        return str(self.work_dir)
+
+    async def _setup_firmware_extractor(self):
+        """Point at the host's shared Firmware_extractor checkout, refreshing it if due."""
+        self.firmware_extractor_path = await ensure_firmware_extractor()
+        console.print(f"[blue]Using Firmware_extractor {self.firmware_extractor_path.name[:12]}[/blue]")
+
+    async def _extract_partitions(self):
+        """Extract individual partition images using alternative dumper tools.
+
+        The partitions are independent, so several extract at once (see
+        _extraction_parallelism). The PROP_PARTITIONS are started first and
+        props_ready is set when they are done, while the others go on.
+        """
+        critical = ALT_DUMPER_PARTITIONS[0]
+        present = [
+            name for name in ALT_DUMPER_PARTITIONS
+            if (self.work_dir / f"{name}.img").exists()
+        ]
+        # Prop-bearing partitions first; the order is otherwise kept
+        present.sort(key=lambda name: name not in PROP_PARTITIONS)
+
+        parallelism = self._extraction_parallelism()
+        slots = asyncio.Semaphore(parallelism)
+        timings: Dict[str, float] = {}
+
+        async def extract(partition: str) -> None:
+            async with slots:
+                started = time.monotonic()
+                success = await self._extract_partition(partition)
+                timings[partition] = time.monotonic() - started
 
             if success:
-                # Clean up the image file
-                safe_remove_file(img_file)
-                console.print(f"[green]Successfully extracted {partition}[/green]")
+                console.print(f"[green]Successfully extracted {partition} in {timings[partition]:.1f}s[/green]")
             else:
                 console.print(f"[yellow]Failed to extract {partition}[/yellow]")
                 # Only abort on first partition failure
-                if partition == partitions[0]:
+                if partition == critical:
                     raise Exception(f"Critical partition extraction failed: {partition}")
 
+        console.print(f"[blue]Extracting {len(present)} partition(s), {parallelism} at a time[/blue]")
+        started = time.monotonic()
+        # Semaphore waiters are served in order, so the prop partitions get
+        # the first slots
+        tasks = {name: asyncio.create_task(extract(name)) for name in present}
+        try:
+            await asyncio.gather(*(task for name, task in tasks.items() if name in PROP_PARTITIONS))
+            self.props_ready.set()
+            await asyncio.gather(*tasks.values())
+        finally:
+            # A critical failure stops the partitions still running
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        if timings:
+            slowest = max(timings, key=timings.get)
+            console.print(
+                f"[green]Partition extraction took {time.monotonic() - started:.1f}s "
+                f"({sum(timings.values()):.1f}s of work, slowest {slowest} "
+                f"{timings[slowest]:.1f}s)[/green]"
+            )
+
         # Extract fsg.mbn from radio.img if present
         await self._extract_fsg_partition()
 
+    def _extraction_parallelism(self) -> int:
+        """Number of partitions to extract at once."""
+        if settings.EXTRACT_PARALLELISM > 0:
+            return settings.EXTRACT_PARALLELISM
+        if hasattr(os, "sched_getaffinity"):
+            cpus = len(os.sched_getaffinity(0))
+        else:
+            cpus = os.cpu_count() or 1
+        # Other jobs on this worker get their share of the cores
+        parallelism = max(1, cpus // max(settings.ARQ_MAX_JOBS, 1))
+        if is_rotational_disk(self.work_dir):
+            # Concurrent writers make a spinning disk seek more than it writes
+            parallelism = min(parallelism, 2)
+        return parallelism
+
+    async def _extract_partition(self, partition: str) -> bool:
+        """Extract one partition image into a directory of the same name.
+
+        Returns:
+            True if a tool extracted the image (which is then removed)
+        """
+        return await self._extract_image(self.work_dir / f"{partition}.img", self.work_dir / partition)
+
+    async def _extract_image(self, img_file: Path, output_dir: Path) -> bool:
+        """Extract a filesystem image with the tool for its filesystem.
+
+        The filesystem comes from the superblock magic (fs_detect), so the
+        matching tool runs first. An unknown image goes through every tool,
+        and the remaining tools are fallbacks if the first one fails.
+
+        Returns:
+            True if a tool extracted the image (which is then removed)
+        """
+        output_dir.mkdir(exist_ok=True)
+
+        source = img_file
+        fs_type = detect_filesystem(img_file)
+        if fs_type == FS_SPARSE:
+            source = await self._unsparse_image(img_file)
+            fs_type = detect_filesystem(source) if source != img_file else None
+        console.print(f"[blue]{img_file.name}: {fs_type or 'unknown'} filesystem[/blue]")
+
+        try:
+            tools = _TOOLS_BY_FILESYSTEM.get(fs_type, _ALL_TOOLS)
+            tools += tuple(tool for tool in _ALL_TOOLS if tool not in tools)
+            for tool in tools:
+                if await self._run_extraction_tool(tool, source, output_dir):
+                    # Clean up the image file
+                    safe_remove_file(img_file)
+                    return True
+            return False
+        finally:
+            if source != img_file:
+                safe_remove_file(source)
+
+    async def _unsparse_image(self, img_file: Path) -> Path:
+        """Convert an Android sparse image to a raw one next to it.
+
+        Returns:
+            The raw image, or img_file itself if simg2img is missing or fails
+        """
+        simg2img = self.firmware_extractor_path / "tools" / "simg2img"
+        if not simg2img.exists():
+            found = shutil.which("simg2img")
+            if found is None:
+                return img_file
+            simg2img = Path(found)
+
+        # Not *.img, so that image globs do not pick it up
+        raw_file = img_file.with_name(f".{img_file.stem}.raw")
+        result = await run_extraction_command(
+            str(simg2img), str(img_file), str(raw_file),
+            description=f"Converting sparse {img_file.name}"
+        )
+        if not result.success:
+            safe_remove_file(raw_file)
+            return img_file
+        return raw_file
+
+    async def _run_extraction_tool(self, tool: str, img_file: Path, output_dir: Path) -> bool:
+        """Run one extraction tool on an image. Returns True on success."""
+        name = output_dir.name
+        if tool == _FSCK_EROFS:
+            fsck_erofs = self.firmware_extractor_path / "tools" / "fsck.erofs"
+            if not fsck_erofs.exists():
+                return False
+            result = await run_extraction_command(
+                str(fsck_erofs), f"--extract={output_dir}", str(img_file),
+                description=f"Extracting '{name}' via fsck.erofs"
+            )
+        elif tool == _EXT2RD:
+            ext2rd = self.firmware_extractor_path / "tools" / "ext2rd"
+            if not ext2rd.exists():
+                return False
+            result = await run_extraction_command(
+                str(ext2rd), str(img_file), f"./{name}",
+                cwd=output_dir.parent,
+                description=f"Extracting '{name}' via ext2rd"
+            )
+        else:
+            result = await run_extraction_command(
+                "7zz", "-snld", "x", str(img_file), "-y", f"-o{output_dir}/",
+                description=f"Extracting '{name}' via 7zz"
+            )
+        return result.success
+
     async def _extract_fsg_partition(self):
         """Extract fsg.mbn partition if present."""
         fsg_file = self.work_dir / "fsg.mbn"
@@ -182,15 +408,18 @@ class FirmwareExtractor:
             console.print("[green]Successfully extracted fsg.mbn[/green]")
 
     async def process_boot_images(self) -> None:
-        """Process boot images (boot.img, vendor_boot.img, etc.)."""
-        boot_images = [
-            "init_boot.img",
-            "vendor_kernel_boot.img",
-            "vendor_boot.img",
-            "boot.img",
-            "recovery.img",
-            "dtbo.img",
-        ]
+        """Process boot images (boot.img, vendor_boot.img, etc.).
+
+        The steps form a TaskGraph: the images are independent of each
+        other and of boot.img's kernel analysis, so they run side by side
+        (up to _extraction_parallelism()). The time of each step, and of
+        each kernel artifact, is kept in boot_image_timings.
+
+        The outputs are many small files, so with a "small" scratch tier
+        (e.g. a tmpfs) they are built there and moved into the work dir
+        when the graph is done.
+        """
+        boot_images = BOOT_IMAGES
 
         # Move boot images to work directory root if they're in subdirectories
         for image_name in boot_images:
@@ -198,97 +427,125 @@ class FirmwareExtractor:
             if found_images and not (self.work_dir / image_name).exists():
                 move_file_to_root(found_images[0], self.work_dir)
 
-        # Process each boot image
-        for image_name in boot_images:
-            image_path = self.work_dir / image_name
-            if image_path.exists():
-                await self._process_single_boot_image(image_path)
-
-        # Process Oppo/Realme/OnePlus images in special directories
-        await self._process_oppo_images()
-
-    async def _process_single_boot_image(self, image_path: Path):
-        """Process a single boot image file."""
-        image_name = image_path.name
-        output_dir = self.work_dir / image_path.stem
-
-        console.print(f"[blue]Processing {image_name}...[/blue]")
-
-        if image_name == "boot.img":
-            await self._process_boot_img(image_path, output_dir)
-        elif image_name == "recovery.img":
-            await self._process_recovery_img(image_path, output_dir)
-        elif image_name in ["vendor_boot.img", "vendor_kernel_boot.img", "init_boot.img"]:
-            await self._process_vendor_boot_img(image_path, output_dir)
-        elif image_name == "dtbo.img":
-            await self._process_dtbo_img(image_path, output_dir)
-
-    async def _process_boot_img(self, image_path: Path, output_dir: Path):
-        """Process boot.img with comprehensive analysis."""
-        output_dir.mkdir(exist_ok=True)
+        image_paths = [self.work_dir / name for name in boot_images if (self.work_dir / name).exists()]
+        # The dump_ prefix lets the worker startup sweep remove it after a crash
+        staging = make_tier_dir(
+            TIER_SMALL, "dump_boot_images_",
+            need_bytes=_SMALL_TIER_EXPANSION * sum(path.stat().st_size for path in image_paths),
+        )
+        output_root = staging or self.work_dir
 
-        # Extract kernel, ramdisk, etc. if using alternative dumper
-        if self.firmware_extractor_path.exists():
-            await self._unpack_boot_image(image_path, output_dir)
+        graph = TaskGraph()
+        for image_path in image_paths:
+            console.print(f"[blue]Processing {image_path.name}...[/blue]")
+            self._add_boot_image_tasks(graph, image_path, output_root)
 
-        # Extract ikconfig (kernel configuration)
-        await self._extract_ikconfig(image_path)
+        # Process Oppo/Realme/OnePlus images in special directories
+        graph.add("oppo_images", self._process_oppo_images)
 
-        # Generate kallsyms.txt (kernel symbols)
-        await self._extract_kallsyms(image_path)
+        self.boot_image_timings = {}
+        try:
+            result = await graph.run(self._extraction_parallelism())
+            if staging is not None:
+                await asyncio.to_thread(merge_directory_into, staging, self.work_dir)
+        finally:
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+        self.boot_image_timings = {**result.timings, **self.boot_image_timings}
+        slowest = sorted(result.timings.items(), key=lambda item: item[1], reverse=True)[:3]
+        console.print(
+            f"[green]Boot image processing took {result.elapsed:.1f}s "
+            f"({sum(result.timings.values()):.1f}s of work; slowest: "
+            f"{', '.join(f'{name} {seconds:.1f}s' for name, seconds in slowest) or 'none'})[/green]"
+        )
 
-        # Generate analyzable ELF
-        await self._extract_boot_elf(image_path)
+    def clear_boot_image_outputs(self) -> None:
+        """Remove what an interrupted process_boot_images left in the work dir.
+
+        Covers the per-image output dirs, the kernel artifacts and their
+        temp files, and the half-extracted Oppo images with their unsparsed
+        copies, so that a resumed job redoes the stage from scratch.
+        """
+        leftovers = [self.work_dir / Path(name).stem for name in BOOT_IMAGES]
+        leftovers += [self.work_dir / name for name in _KERNEL_OUTPUTS]
+        leftovers += self.work_dir.glob(".kernel_*")
+        for dir_path in OPPO_IMAGE_DIRS:
+            full_dir = self.work_dir / dir_path
+            if full_dir.is_dir():
+                leftovers += [img_file.parent / img_file.stem for img_file in full_dir.glob("*.img")]
+                leftovers += full_dir.glob(".*.raw")
 
-        # Extract and process device tree blobs
-        await self._extract_device_trees(image_path, output_dir)
+        for path in leftovers:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                safe_remove_file(path)
 
-    async def _process_vendor_boot_img(self, image_path: Path, output_dir: Path):
-        """Process vendor_boot.img or similar images."""
+    def _add_boot_image_tasks(self, graph: TaskGraph, image_path: Path, output_root: Path) -> None:
+        """Add the steps for one boot-type image to the graph, writing under output_root."""
+        image_name = image_path.name
+        output_dir = output_root / image_path.stem
         output_dir.mkdir(exist_ok=True)
 
-        # Extract contents if using alternative dumper
-        if self.firmware_extractor_path.exists():
-            await self._unpack_boot_image(image_path, output_dir)
-
-        # Extract device tree blobs
-        await self._extract_device_trees(image_path, output_dir)
-
-    async def _process_recovery_img(self, image_path: Path, output_dir: Path):
-        """Process recovery.img by unpacking the image and extracting its ramdisk."""
-        output_dir.mkdir(exist_ok=True)
+        # Split kernel, ramdisk, etc. and extract the ramdisk tree
+        if image_name != "dtbo.img":
+            graph.add(f"{image_name}:unpack", partial(self._unpack_boot_image, image_path, output_dir))
+            graph.add(
+                f"{image_name}:ramdisk",
+                partial(self._extract_ramdisk, image_path, output_dir, output_dir / "ramdisk"),
+                after=[f"{image_name}:unpack"],
+            )
 
-        if self.firmware_extractor_path.exists():
-            await self._unpack_boot_image(image_path, output_dir)
+        # Extract and process device tree blobs
+        is_dtbo = image_name == "dtbo.img"
+        dtb_dir = output_dir if is_dtbo else output_dir / "dtb"
+        graph.add(f"{image_name}:dtb", partial(self._extract_dtbs, image_path, dtb_dir))
+        graph.add(
+            f"{image_name}:dts",
+            partial(self._decompile_dtbs, dtb_dir, output_dir / "dts"),
+            after=[f"{image_name}:dtb"],
+        )
 
-        await self._extract_device_trees(image_path, output_dir)
+        if image_name == "boot.img":
+            # Kernel configuration, kernel symbols and an analyzable ELF,
+            # from one decompression of the kernel
+            graph.add("boot.img:kernel", partial(self._analyze_kernel, image_path, output_root))
 
-    async def _process_dtbo_img(self, image_path: Path, output_dir: Path):
-        """Process dtbo.img."""
-        output_dir.mkdir(exist_ok=True)
+    async def _unpack_boot_image(self, image_path: Path, output_dir: Path):
+        """Split a boot image into its sections, falling back to unpackbootimg."""
+        ramdisk_dir = output_dir / "ramdisk"
+        ramdisk_dir.mkdir(exist_ok=True)
 
-        # Extract device tree overlays
-        await self._extract_device_trees(image_path, output_dir, is_dtbo=True)
+        image = await asyncio.to_thread(unpack_boot_image, image_path, output_dir)
+        if image is not None:
+            kind = "vendor_boot" if image.vendor else "boot"
+            console.print(f"[green]Unpacked {image_path.name} ({kind} header v{image.header_version})[/green]")
+            return
 
-    async def _unpack_boot_image(self, image_path: Path, output_dir: Path):
-        """Unpack boot image using unpackbootimg."""
         unpackbootimg = self.firmware_extractor_path / "tools" / "unpackbootimg"
         if not unpackbootimg.exists():
             return
 
-        ramdisk_dir = output_dir / "ramdisk"
-        ramdisk_dir.mkdir(exist_ok=True)
-
         await run_extraction_command(
             str(unpackbootimg), "-i", str(image_path), "-o", str(output_dir),
             description=f"Unpacking {image_path.name}"
         )
 
-        # Extract ramdisk if present
-        await self._extract_ramdisk(output_dir, ramdisk_dir)
+    async def _extract_ramdisk(self, image_path: Path, output_dir: Path, ramdisk_dir: Path):
+        """Extract the ramdisk(s) of a boot image into ramdisk_dir."""
+        try:
+            entries = await asyncio.to_thread(extract_ramdisks, image_path, ramdisk_dir)
+        except (UnsupportedRamdisk, ValueError) as e:
+            console.print(f"[yellow]Could not extract {image_path.name} ramdisk in-process: {e}[/yellow]")
+            entries = None
+        if entries is not None:
+            console.print(f"[green]Extracted {entries} ramdisk entries from {image_path.name}[/green]")
+            return
+
+        await self._extract_ramdisk_with_tools(output_dir, ramdisk_dir)
 
-    async def _extract_ramdisk(self, output_dir: Path, ramdisk_dir: Path):
-        """Extract ramdisk from boot image."""
+    async def _extract_ramdisk_with_tools(self, output_dir: Path, ramdisk_dir: Path):
+        """Extract an unpackbootimg ramdisk with unlz4 and 7zz."""
         ramdisk_files = list(output_dir.glob("*-ramdisk*"))
         if not ramdisk_files:
             return
@@ -324,113 +581,45 @@ class FirmwareExtractor:
                 )
                 safe_remove_file(temp_ramdisk)
 
-    async def _extract_ikconfig(self, image_path: Path):
-        """Extract kernel configuration."""
-        ikconfig_path = self.work_dir / "ikconfig"
-
-        try:
-            result = await run_analysis_command(
-                "extract-ikconfig", str(image_path),
-                output_file=ikconfig_path,
-                description="Extracting ikconfig"
-            )
-
-            if result.success and ikconfig_path.exists():
-                console.print("[green]ikconfig extracted successfully[/green]")
-            else:
-                console.print("[yellow]Failed to extract ikconfig[/yellow]")
-                safe_remove_file(ikconfig_path)
-        except FileNotFoundError:
-            console.print("[yellow]extract-ikconfig tool not found, skipping ikconfig extraction[/yellow]")
-        except Exception as e:
-            console.print(f"[yellow]Error extracting ikconfig: {e}[/yellow]")
-            safe_remove_file(ikconfig_path)
-
-    async def _extract_kallsyms(self, image_path: Path):
-        """Extract kernel symbols."""
-        kallsyms_path = self.work_dir / "kallsyms.txt"
-
-        try:
-            result = await run_analysis_command(
-                "uvx", "--from", "git+https://github.com/marin-m/vmlinux-to-elf@master",
-                "kallsyms-finder", str(image_path),
-                output_file=kallsyms_path,
-                description="Generating kallsyms.txt"
-            )
-
-            if result.success and kallsyms_path.exists():
-                console.print("[green]kallsyms.txt generated successfully[/green]")
-            else:
-                console.print("[yellow]Failed to generate kallsyms.txt[/yellow]")
-                safe_remove_file(kallsyms_path)
-        except FileNotFoundError:
-            console.print("[yellow]uvx or kallsyms-finder tool not found, skipping kallsyms extraction[/yellow]")
-        except Exception as e:
-            console.print(f"[yellow]Error extracting kallsyms: {e}[/yellow]")
-            safe_remove_file(kallsyms_path)
-
-    async def _extract_boot_elf(self, image_path: Path):
-        """Extract analyzable ELF file."""
-        elf_path = self.work_dir / "boot.elf"
-
-        try:
-            result = await run_analysis_command(
-                "uvx", "--from", "git+https://github.com/marin-m/vmlinux-to-elf@master",
-                "vmlinux-to-elf", str(image_path), str(elf_path),
-                description="Extracting boot.elf"
-            )
-
-            if result.success and elf_path.exists():
-                console.print("[green]boot.elf extracted successfully[/green]")
-            else:
-                console.print("[yellow]Failed to extract boot.elf[/yellow]")
-        except FileNotFoundError:
-            console.print("[yellow]uvx or vmlinux-to-elf tool not found, skipping ELF extraction[/yellow]")
-        except Exception as e:
-            console.print(f"[yellow]Error extracting boot ELF: {e}[/yellow]")
-
-    async def _extract_device_trees(self, image_path: Path, output_dir: Path, is_dtbo: bool = False):
-        """Extract and decompile device tree blobs."""
-        if is_dtbo:
-            dtb_dir = output_dir
-            dts_dir = output_dir / "dts"
-        else:
-            dtb_dir = output_dir / "dtb"
-            dts_dir = output_dir / "dts"
-
-        dtb_dir.mkdir(exist_ok=True)
-        dts_dir.mkdir(exist_ok=True)
+    async def _analyze_kernel(self, image_path: Path, output_dir: Path):
+        """Extract ikconfig, kallsyms.txt and boot.elf (see kernel_analysis)."""
+        timings = await analyze_kernel(image_path, output_dir)
+        for artifact, seconds in timings.items():
+            self.boot_image_timings[f"{image_path.name}:kernel:{artifact}"] = seconds
+        console.print(
+            f"[green]Kernel analysis: "
+            f"{', '.join(f'{artifact} {seconds:.1f}s' for artifact, seconds in timings.items())}[/green]"
+        )
 
+    async def _extract_dtbs(self, image_path: Path, dtb_dir: Path) -> None:
+        """Extract device tree blobs from an image (in-process, see fdt)."""
         console.print(f"[blue]{image_path.name}: Extracting device-tree blobs...[/blue]")
 
-        # Extract DTBs
         try:
-            result = await run_extraction_command(
-                "extract-dtb", str(image_path), "-o", str(dtb_dir),
-                description=f"{image_path.name}: Extracting device-tree blobs"
-            )
-
-            if not result.success:
-                console.print("[yellow]No device-tree blobs found[/yellow]")
-                return
-        except FileNotFoundError:
-            console.print("[yellow]extract-dtb tool not found, skipping device tree extraction[/yellow]")
-            return
+            dtb_files = await asyncio.to_thread(split_dtbs, image_path, dtb_dir)
         except Exception as e:
             console.print(f"[yellow]Error extracting device trees: {e}[/yellow]")
             return
 
-        # extract-dtb writes the kernel binary as 00_kernel alongside the dtbs
-        safe_remove_file(dtb_dir / "00_kernel")
+        if not dtb_files:
+            console.print("[yellow]No device-tree blobs found[/yellow]")
+            return
+        console.print(f"[green]{image_path.name}: found {len(dtb_files)} device-tree blob(s)[/green]")
 
+    async def _decompile_dtbs(self, dtb_dir: Path, dts_dir: Path) -> None:
+        """Decompile the device tree blobs in dtb_dir to DTS, several at a time."""
         # Decompile DTBs to DTS
-        dtb_files = list(dtb_dir.glob("*.dtb"))
-        if dtb_files:
-            console.print("[blue]Decompiling device-tree blobs...[/blue]")
+        dtb_files = sorted(dtb_dir.glob("*.dtb"))
+        if not dtb_files:
+            return
 
-            for dtb_file in dtb_files:
-                dts_file = dts_dir / f"{dtb_file.stem}.dts"
+        dts_dir.mkdir(exist_ok=True)
+        console.print(f"[blue]Decompiling {len(dtb_files)} device-tree blob(s)...[/blue]")
+        slots = asyncio.Semaphore(self._extraction_parallelism())
 
+        async def decompile(dtb_file: Path) -> None:
+            dts_file = dts_dir / f"{dtb_file.stem}.dts"
+            async with slots:
                 try:
                     result = await run_analysis_command(
                         "dtc", "-q", "-I", "dtb", "-O", "dts", str(dtb_file),
@@ -449,11 +638,11 @@ class FirmwareExtractor:
                     console.print(f"[yellow]Error decompiling {dtb_file.name}: {e}[/yellow]")
                     safe_remove_file(dts_file)
 
+        await asyncio.gather(*(decompile(dtb_file) for dtb_file in dtb_files))
+
     async def _process_oppo_images(self):
         """Process Oppo/Realme/OnePlus images in special directories."""
-        special_dirs = ["vendor/euclid", "system/system/euclid", "reserve/reserve"]
-
-        for dir_path in special_dirs:
+        for dir_path in OPPO_IMAGE_DIRS:
             full_dir = self.work_dir / dir_path
             if not full_dir.exists():
                 continue
@@ -467,15 +656,7 @@ class FirmwareExtractor:
                 console.print(f"[blue]Extracting {img_file.name}...[/blue]")
 
                 extract_dir = img_file.parent / img_file.stem
-                extract_dir.mkdir(exist_ok=True)
-
-                result = await run_extraction_command(
-                    "7zz", "-snld", "x", str(img_file), f"-o{extract_dir}",
-                    description=f"Extracting {img_file.name}"
-                )
-
-                if result.success:
-                    safe_remove_file(img_file)
+                if await self._extract_image(img_file, extract_dir):
                     console.print(f"[green]Extracted {img_file.name}[/green]")
                 else:
                     console.print(f"[yellow]Failed to extract {img_file.name}[/yellow]")
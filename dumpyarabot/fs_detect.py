@@ -0,0 +1,89 @@
+"""Filesystem detection of partition images by superblock magic.
+
+The alternative dumper used to find an image's filesystem by trial: run
+fsck.erofs, wait for it to fail, run ext2rd, then 7zz. Reading a few bytes
+of the superblock gives the answer without spawning anything, so the
+extractor can start with the tool that fits.
+"""
+
+import os
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+
+FS_EROFS = "erofs"
+FS_EXT4 = "ext4"
+FS_F2FS = "f2fs"
+FS_SPARSE = "sparse"
+FS_SQUASHFS = "squashfs"
+
+# Android sparse image header (system/core/libsparse/sparse_format.h)
+_SPARSE_MAGIC = 0xED26FF3A
+
+# Offsets and magics of the superblocks, all little-endian
+_SUPERBLOCK_OFFSET = 1024
+_EROFS_MAGIC = 0xE0F5E1E2
+_F2FS_MAGIC = 0xF2F52010
+_EXT4_MAGIC = 0xEF53
+_EXT4_MAGIC_OFFSET = _SUPERBLOCK_OFFSET + 0x38
+_SQUASHFS_MAGIC = b"hsqs"
+
+_PROBE_BYTES = 4096
+# Images whose result is remembered; a dump has a few dozen partitions
+_CACHE_SIZE = 256
+
+
+def detect_in_bytes(data: bytes) -> Optional[str]:
+    """
+    Name the filesystem whose superblock starts a block of data.
+
+    Args:
+        data: The first bytes of the image (at least 1084 for ext4)
+
+    Returns:
+        One of the FS_* names, or None if no known magic matches
+    """
+    def u32(offset: int) -> Optional[int]:
+        if len(data) < offset + 4:
+            return None
+        return struct.unpack_from("<I", data, offset)[0]
+
+    if u32(0) == _SPARSE_MAGIC:
+        return FS_SPARSE
+    if data[:4] == _SQUASHFS_MAGIC:
+        return FS_SQUASHFS
+    if u32(_SUPERBLOCK_OFFSET) == _EROFS_MAGIC:
+        return FS_EROFS
+    if u32(_SUPERBLOCK_OFFSET) == _F2FS_MAGIC:
+        return FS_F2FS
+    if len(data) >= _EXT4_MAGIC_OFFSET + 2 and struct.unpack_from("<H", data, _EXT4_MAGIC_OFFSET)[0] == _EXT4_MAGIC:
+        return FS_EXT4
+    return None
+
+
+def detect_filesystem(path: Union[str, Path]) -> Optional[str]:
+    """
+    Name the filesystem of an image from its superblock magic.
+
+    The most recent results are cached per image (path, inode, size and
+    mtime), so the extractor and later stages can ask again for free.
+
+    Args:
+        path: The image file
+
+    Returns:
+        One of the FS_* names, or None if unknown or unreadable
+    """
+    try:
+        st = os.stat(path)
+        return _probe(os.path.realpath(path), st.st_ino, st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _probe(path: str, inode: int, size: int, mtime_ns: int) -> Optional[str]:
+    """Read one image's superblock; the other arguments only key the cache."""
+    with open(path, "rb") as f:
+        return detect_in_bytes(f.read(_PROBE_BYTES))
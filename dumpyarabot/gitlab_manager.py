@@ -1,5 +1,6 @@
+import shutil
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 from urllib.parse import urlparse
 
 import httpx
@@ -36,8 +37,23 @@ class GitLabManager:
         device_props: Dict[str, Any],
         dumper_token: str,
         force: bool = False,
+        commit_built: bool = False,
+        on_commit_built: Optional[Callable[[], None]] = None,
     ) -> Tuple[str, str]:
-        """Create GitLab repository and push firmware files."""
+        """
+        Create GitLab repository and push firmware files.
+
+        Args:
+            device_props: Properties from PropertyExtractor
+            dumper_token: GitLab API token
+            force: Replace an existing branch
+            commit_built: The work dir already holds the committed repository
+                (a resumed job); only push it
+            on_commit_built: Called once the commit exists, before the push
+
+        Returns:
+            (repository URL, repository path)
+        """
         repo_subgroup = device_props["repo_subgroup"]
         repo_name = device_props["repo_name"]
         branch = device_props["branch"]
@@ -59,7 +75,12 @@ class GitLabManager:
             console.print(f"[yellow]Branch {branch} exists, force-pushing replacement[/yellow]")
 
         # Setup git repository
-        await self._setup_git_repository(branch, description)
+        if not commit_built:
+            # A half-built repository from an interrupted attempt is redone
+            shutil.rmtree(self.work_dir / ".git", ignore_errors=True)
+            await self._setup_git_repository(branch, description)
+            if on_commit_built is not None:
+                on_commit_built()
 
         # Push to GitLab
         repo_url = await self._push_to_gitlab(
@@ -74,6 +95,35 @@ class GitLabManager:
         console.print(f"[green]Successfully created and pushed to: {repo_url}[/green]")
         return repo_url, f"{self.org}/{repo_subgroup}/{repo_name}"
 
+    async def find_existing_branch(self, device_props: Dict[str, Any], dumper_token: str) -> Optional[str]:
+        """
+        Look up a dump's branch without creating the subgroup or project.
+
+        Args:
+            device_props: Properties from PropertyExtractor
+            dumper_token: GitLab API token
+
+        Returns:
+            The branch's tree URL if it already exists, otherwise None
+        """
+        repo_subgroup = device_props["repo_subgroup"]
+        repo_name = device_props["repo_name"]
+        branch = device_props["branch"]
+
+        async with gitlab_http_client() as client:
+            response = await client.get(
+                f"https://{self.gitlab_server}/api/v4/projects/{self.org}%2f{repo_subgroup}%2f{repo_name}",
+                headers={"Authorization": f"Bearer {dumper_token}"},
+                timeout=GITLAB_API_TIMEOUT
+            )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+
+        if await self._branch_exists(response.json()["id"], branch, dumper_token):
+            return f"https://{self.gitlab_server}/{self.org}/{repo_subgroup}/{repo_name}/tree/{branch}/"
+        return None
+
     async def _ensure_subgroup_exists(self, subgroup_name: str, dumper_token: str) -> int:
         """Ensure GitLab subgroup exists, create if necessary."""
         console.print(f"[blue]Checking subgroup: {subgroup_name}[/blue]")
@@ -503,6 +503,42 @@ async def clear_queue(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     )
 
 
+async def refresh_extractor(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler for the /refreshextractor command — workers update Firmware_extractor before their next alt-dumper job."""
+    chat = update.effective_chat
+    message = update.effective_message
+    user = update.effective_user
+
+    if not chat or not message or not user:
+        return
+
+    if chat.id not in settings.ALLOWED_CHATS:
+        return
+
+    has_permission, _ = await check_admin_permissions(update, context, require_admin=True)
+    if not has_permission:
+        await message_queue.send_error(
+            chat_id=chat.id,
+            text="You don't have permission to use this command",
+            context={"command": "refreshextractor", "user_id": user.id, "error": "permission_denied"}
+        )
+        return
+
+    try:
+        from dumpyarabot.extractor_checkout import request_refresh
+        await request_refresh()
+        response = " *Extractor refresh requested*\n\nEach worker host updates its Firmware\\_extractor checkout before its next alt-dumper job."
+    except Exception as e:
+        response = f" *Error requesting refresh:* {escape_markdown(str(e))}"
+
+    await message_queue.send_reply(
+        chat_id=chat.id,
+        text=response,
+        reply_to_message_id=message.message_id,
+        context={"command": "refreshextractor"}
+    )
+
+
 async def handle_restart_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle restart confirmation/cancellation callbacks."""
     query = update.callback_query
@@ -0,0 +1,232 @@
+"""Per-host aria2 connection tuning from measured download history.
+
+A fixed 16 connections per server is wrong for many hosts: some CDNs
+throttle or reset connections at that level, others would give more
+throughput with more segments. Each finished aria2 download records its
+throughput and its error code under the hostname of the primary URL. The
+next download from that host uses the connection count that gave the best
+throughput without throttle errors.
+
+The search is a simple hill climb over CONNECTION_LEVELS. A new host starts
+at the middle level. While the best measured level is also the highest one
+tried, the next download tries one level up. A level whose recent downloads
+failed with a throttle-type error is skipped until downloads at lower levels
+succeed and the failure decays.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.redis_storage import RedisStorage
+
+console = Console()
+
+# aria2 accepts at most 16 connections per server
+CONNECTION_LEVELS = (1, 2, 4, 8, 16)
+_DEFAULT_LEVEL = 8
+
+# aria2 exit codes that mean the server refused our connection count:
+# 2 timeout, 6 network problem (connection resets), 22 unexpected HTTP
+# response (often 429), 29 server temporarily overloaded (503)
+THROTTLE_ERROR_CODES = frozenset({"2", "6", "22", "29"})
+
+_EWMA_ALPHA = 0.3
+# A level is skipped while its failure EWMA is at or above this value; one
+# throttle error (0.3) is enough, and it decays below after two successes
+_FAILURE_THRESHOLD = 0.2
+# A higher level must beat the best one by this ratio to be worth its connections
+_MIN_GAIN = 1.1
+
+# Downloads smaller than this finish before aria2 opens all connections, so
+# their throughput says little about the host
+MIN_SAMPLE_BYTES = 32 * 1024 * 1024
+
+# Each segment should take about this long at the measured per-connection speed
+_SEGMENT_SECONDS = 8
+_MIN_SPLIT_MB = (1, 256)  # aria2 accepts 1M-1024M
+_DEFAULT_MIN_SPLIT_MB = 20  # aria2's own default
+_MAX_SPLIT = 64
+
+_STATS_TTL = 30 * 24 * 3600
+
+
+@dataclass
+class HostProfile:
+    """aria2 settings for one download."""
+
+    connections: int
+    split: int
+    min_split_size_mb: int
+
+    def aria2_options(self) -> Dict[str, str]:
+        return {
+            "split": str(self.split),
+            "max-connection-per-server": str(self.connections),
+            "min-split-size": f"{self.min_split_size_mb}M",
+        }
+
+
+@dataclass
+class HostStats:
+    """Throughput and failure history of a host, by connection level."""
+
+    speeds: Dict[int, float] = field(default_factory=dict)  # EWMA bytes/s of whole downloads
+    failures: Dict[int, float] = field(default_factory=dict)  # EWMA of throttle errors, 0-1
+    last_error_code: Optional[str] = None
+    samples: int = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HostStats":
+        return cls(
+            speeds={int(k): float(v) for k, v in data.get("speeds", {}).items()},
+            failures={int(k): float(v) for k, v in data.get("failures", {}).items()},
+            last_error_code=data.get("last_error_code"),
+            samples=int(data.get("samples", 0)),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "speeds": {str(k): v for k, v in self.speeds.items()},
+            "failures": {str(k): v for k, v in self.failures.items()},
+            "last_error_code": self.last_error_code,
+            "samples": self.samples,
+        }
+
+    def is_throttled(self, level: int) -> bool:
+        return self.failures.get(level, 0.0) >= _FAILURE_THRESHOLD
+
+
+def _ewma(old: Optional[float], value: float) -> float:
+    return value if old is None else _EWMA_ALPHA * value + (1 - _EWMA_ALPHA) * old
+
+
+def choose_connections(stats: Optional[HostStats]) -> int:
+    """Pick the connection count for the next download from a host."""
+    if stats is None:
+        return _DEFAULT_LEVEL
+
+    usable = [level for level in CONNECTION_LEVELS if not stats.is_throttled(level)]
+    if not usable:
+        return CONNECTION_LEVELS[0]
+
+    measured = {level: speed for level, speed in stats.speeds.items() if level in usable}
+    if not measured:
+        # Step down from the default until a level has not failed
+        below_default = [level for level in usable if level <= _DEFAULT_LEVEL]
+        return below_default[-1] if below_default else usable[0]
+
+    # More connections only win if they are clearly faster
+    best = min(measured)
+    for level in sorted(measured):
+        if measured[level] >= measured[best] * _MIN_GAIN:
+            best = level
+
+    higher = [level for level in CONNECTION_LEVELS if level > best]
+    if higher and best == max(measured) and higher[0] in usable:
+        # The most connections tried so far is also the fastest: try more
+        return higher[0]
+    return best
+
+
+def choose_profile(stats: Optional[HostStats], sources: int = 1) -> HostProfile:
+    """
+    Pick aria2 settings for a download from a host's history.
+
+    Args:
+        stats: History of the primary URL's host, or None for a new host
+        sources: Number of URIs (primary and mirrors) aria2 splits across
+
+    Returns:
+        HostProfile with the connection count, split and min-split-size
+    """
+    connections = choose_connections(stats)
+    split = min(connections * max(sources, 1), _MAX_SPLIT)
+
+    min_split_mb = _DEFAULT_MIN_SPLIT_MB
+    speed = stats.speeds.get(connections) if stats else None
+    if speed:
+        per_connection = speed / connections
+        low, high = _MIN_SPLIT_MB
+        min_split_mb = int(min(max(per_connection * _SEGMENT_SECONDS / (1024 * 1024), low), high))
+    return HostProfile(connections=connections, split=split, min_split_size_mb=min_split_mb)
+
+
+def update_stats(
+    stats: Optional[HostStats],
+    connections: int,
+    speed: Optional[float],
+    error_code: Optional[str],
+) -> HostStats:
+    """
+    Fold one finished download into a host's history.
+
+    Args:
+        stats: Current history, or None for a new host
+        connections: Connection count the download used
+        speed: Average throughput in bytes/s, or None if not representative
+        error_code: aria2 error code if the download failed
+
+    Returns:
+        The updated history
+    """
+    stats = stats or HostStats()
+    stats.samples += 1
+    if error_code is not None:
+        stats.last_error_code = error_code
+        if error_code in THROTTLE_ERROR_CODES:
+            stats.failures[connections] = _ewma(stats.failures.get(connections, 0.0), 1.0)
+        return stats
+
+    # A success here also decays failures at other levels, so a level that
+    # was throttled once gets retried later
+    for level in list(stats.failures):
+        stats.failures[level] = _ewma(stats.failures[level], 0.0)
+    if speed is not None:
+        stats.speeds[connections] = _ewma(stats.speeds.get(connections), speed)
+    return stats
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+async def profile_for_url(url: str, sources: int = 1) -> HostProfile:
+    """Load the primary host's history and pick settings for a download."""
+    host = host_of(url)
+    stats = None
+    try:
+        data = await RedisStorage.get_host_download_stats(host) if host else None
+        stats = HostStats.from_dict(data) if data else None
+    except Exception as e:
+        console.print(f"[yellow]Could not read download stats for {host}: {e}[/yellow]")
+    profile = choose_profile(stats, sources)
+    console.print(
+        f"[blue]aria2 settings for {host or url}: {profile.connections} connection(s)/server, "
+        f"split {profile.split}, min-split-size {profile.min_split_size_mb}M[/blue]"
+    )
+    return profile
+
+
+async def record_download(
+    url: str,
+    connections: int,
+    speed: Optional[float],
+    error_code: Optional[str] = None,
+) -> None:
+    """Store the outcome of a download under its primary host."""
+    host = host_of(url)
+    if not host:
+        return
+    if speed is not None and (settings.ARIA2_MAX_OVERALL_SPEED > 0 or settings.ARIA2_MAX_JOB_SPEED > 0):
+        # A capped download measures the cap, not the host
+        speed = None
+    try:
+        data = await RedisStorage.get_host_download_stats(host)
+        stats = update_stats(HostStats.from_dict(data) if data else None, connections, speed, error_code)
+        await RedisStorage.store_host_download_stats(host, stats.to_dict(), ttl=_STATS_TTL)
+    except Exception as e:
+        console.print(f"[yellow]Could not record download stats for {host}: {e}[/yellow]")
@@ -0,0 +1,131 @@
+"""Incremental integrity hashing of downloads while they are being written.
+
+A multi-GB archive shouldn't be read a second time just to checksum it.
+``StreamingHasher`` follows a file on disk and hashes bytes as soon as they
+are known to be final: the contiguous prefix of completed aria2 pieces, or
+the current size of a file a single-stream tool (wget, gdown, ...) appends
+to. By the time the download finishes only the tail is left to hash, and it
+is usually still in the page cache.
+"""
+
+import asyncio
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+_READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+# MIUI packages embed the first 10 hex digits of their md5 in the file name:
+#   miui_SWEETGlobal_V12.5.1.0.RKFMIXM_6c1d5f2a9e_11.0.zip (OTA)
+#   sweet_global_images_V12.5.1.0.RKFMIXM_20210630.0000.00_11.0_global_f72f0e5cfb.tgz (fastboot)
+_MIUI_MD5_RE = re.compile(r"_([0-9a-f]{10})(?:_\d+(?:\.\d+)*)?\.(?:zip|tgz)$")
+
+
+class ChecksumMismatchError(Exception):
+    """A download's digest doesn't match the checksum its vendor published."""
+
+
+def contiguous_prefix_bytes(bitfield: Optional[str], piece_length: int, total_length: int) -> int:
+    """Bytes at the start of an aria2 download that are fully written.
+
+    Args:
+        bitfield: aria2's hex piece bitfield (highest bit is piece 0)
+        piece_length: Size of one piece in bytes
+        total_length: Size of the whole file in bytes
+
+    Returns:
+        Length of the leading run of completed pieces, capped at the file size
+    """
+    if not bitfield or piece_length <= 0:
+        return 0
+    pieces = 0
+    for digit in bitfield:
+        value = int(digit, 16)
+        if value == 0xF:
+            pieces += 4
+            continue
+        # Count leading set bits of this nibble, then stop
+        for shift in (3, 2, 1, 0):
+            if not value & (1 << shift):
+                break
+            pieces += 1
+        break
+    return min(pieces * piece_length, total_length)
+
+
+def vendor_md5_prefix(file_name: str) -> Optional[str]:
+    """Return the md5 prefix a vendor embedded in the file name, if any."""
+    if not (file_name.startswith("miui_") or "_images_" in file_name):
+        return None
+    match = _MIUI_MD5_RE.search(file_name)
+    return match.group(1) if match else None
+
+
+def verify_vendor_checksum(file_name: str, digests: Dict[str, str]) -> Optional[bool]:
+    """Check digests against a vendor checksum in the file name.
+
+    Returns:
+        True if verified, None if there is nothing to check against
+
+    Raises:
+        ChecksumMismatchError: If the file doesn't match its published checksum
+    """
+    expected = vendor_md5_prefix(file_name)
+    if not expected or "md5" not in digests:
+        return None
+    if not digests["md5"].startswith(expected):
+        raise ChecksumMismatchError(
+            f"{file_name} is corrupt: md5 {digests['md5']} does not match vendor checksum {expected}"
+        )
+    return True
+
+
+class StreamingHasher:
+    """Hashes a file incrementally as its final bytes become known."""
+
+    def __init__(self, path: Path, algorithms: Iterable[str] = ("sha256", "md5")):
+        self.path = Path(path)
+        self.offset = 0
+        self._hashes = {name: hashlib.new(name) for name in algorithms}
+        self._task: Optional[asyncio.Future] = None
+
+    def _consume(self, limit: Optional[int]) -> None:
+        """Hash from the current offset up to limit bytes (None: to EOF)."""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            while limit is None or self.offset < limit:
+                size = _READ_CHUNK_SIZE if limit is None else min(_READ_CHUNK_SIZE, limit - self.offset)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                for digest in self._hashes.values():
+                    digest.update(chunk)
+                self.offset += len(chunk)
+
+    def advance(self, limit: int) -> None:
+        """Hash up to limit bytes in a background thread.
+
+        Returns immediately; if the previous step is still running this call
+        is skipped and the next one catches up.
+        """
+        if limit <= self.offset or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.ensure_future(asyncio.to_thread(self._consume, limit))
+
+    async def finish(self) -> Dict[str, str]:
+        """Hash the rest of the file and return hex digests by algorithm."""
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self._consume, None)
+        return {name: digest.hexdigest() for name, digest in self._hashes.items()}
+
+    async def abandon(self) -> None:
+        """Wait out any in-flight step after a failed download."""
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+            self._task = None
@@ -0,0 +1,234 @@
+"""Resumable job work dirs with a journal of completed stages.
+
+A job normally runs in a throwaway ``dump_<jobid>_<rand>`` tempdir, so a
+failure at the push after two hours of work meant the next attempt
+downloaded and extracted everything again. With JOB_RESUME_TTL set, a job
+instead works in ``<WORK_DIR_BASE>/resumable/<key>/work/``. The key is the
+dump's dedupe key (URL and options), or the job id for private dumps.
+Completed stages are recorded in ``journal.json`` next to it, with what
+later stages need from them. An ARQ retry, or a re-run of the same dump
+after a failure or a worker crash, finds the journal and continues after the
+last completed stage.
+
+The journal lives outside ``work/`` because ``work/`` becomes the pushed
+git tree. With several work roots (SCRATCH_ROOTS), a new job dir goes to the
+one with the most free space and a retry looks in all of them. An exclusive
+flock on ``<key>.lock``, always in the first root, keeps two workers out of
+the same directory; the loser runs in a tempdir as before. Successful and
+cancelled jobs remove their directory. Failed ones, and jobs interrupted by
+an ARQ timeout or a worker shutdown, keep it for JOB_RESUME_TTL, after which
+worker startup sweeps it.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.scratch_tiers import TIER_WORK, choose_root, tier_roots
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+console = Console()
+
+RESUMABLE_DIR_NAME = "resumable"
+
+# Stages in pipeline order
+STAGE_DOWNLOAD = "download"
+STAGE_EXTRACT = "extract"
+STAGE_BOOT_IMAGES = "boot_images"
+STAGE_PROPERTIES = "properties"
+STAGE_COMMIT = "commit"
+STAGE_PUSH = "push"
+STAGES = (STAGE_DOWNLOAD, STAGE_EXTRACT, STAGE_BOOT_IMAGES, STAGE_PROPERTIES, STAGE_COMMIT, STAGE_PUSH)
+
+
+class StageJournal:
+    """Completed stages of one job and their outputs.
+
+    Without a path the journal only lives in memory, so nothing resumes.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        # Set by the job when a failure is worth resuming from, and by
+        # job_workspace when the job is cancelled or times out
+        self.keep = False
+        if path is not None and path.exists():
+            try:
+                self.stages = json.loads(path.read_text()).get("stages", {})
+            except (OSError, ValueError):
+                self.stages = {}
+
+    @property
+    def resumable(self) -> bool:
+        return self.path is not None
+
+    def done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def result(self, stage: str) -> Dict[str, Any]:
+        """Outputs recorded with a completed stage."""
+        return self.stages.get(stage, {})
+
+    def last_completed(self) -> Optional[str]:
+        completed = [stage for stage in STAGES if stage in self.stages]
+        return completed[-1] if completed else None
+
+    def complete(self, stage: str, **outputs: Any) -> None:
+        """Record a stage as done, with JSON-serializable outputs for later stages."""
+        self.stages[stage] = {**outputs, "completed_at": time.time()}
+        self._save()
+
+    def reset(self, from_stage: str = STAGE_DOWNLOAD) -> None:
+        """Forget from_stage and every stage after it."""
+        index = STAGES.index(from_stage)
+        for stage in STAGES[index:]:
+            self.stages.pop(stage, None)
+        self._save()
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        temp = self.path.with_name(f".{self.path.name}.{os.getpid()}")
+        temp.write_text(json.dumps({"stages": self.stages, "updated_at": time.time()}, indent=2))
+        os.replace(temp, self.path)
+
+
+def _resumable_roots() -> List[Path]:
+    """The resumable dir of each work root, or [] when resuming is disabled."""
+    if fcntl is None or settings.JOB_RESUME_TTL <= 0 or not settings.WORK_DIR_BASE:
+        return []
+    return [root / RESUMABLE_DIR_NAME for root in tier_roots(TIER_WORK)]
+
+
+def _try_lock(lock_path: Path) -> Optional[int]:
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _unlock(fd: int) -> None:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def job_workspace(job_id: str, resume_key: Optional[str]) -> Iterator[tuple[Path, StageJournal]]:
+    """Yield the work dir and stage journal of a job.
+
+    Args:
+        job_id: The ARQ job id
+        resume_key: Stable key of the dump (see message_queue._dump_dedupe_key),
+            or None to key on the job id
+
+    Yields:
+        (work_dir, journal). The work dir is a plain tempdir with an
+        in-memory journal when resuming is disabled or the key is busy.
+    """
+    roots = _resumable_roots()
+    lock_fd = None
+    if roots:
+        roots[0].mkdir(parents=True, exist_ok=True)
+        key = resume_key or f"job-{job_id}"
+        lock_fd = _try_lock(roots[0] / f"{key}.lock")
+        if lock_fd is None:
+            console.print(f"[yellow]Resumable dir {key[:12]} is busy, using a fresh work dir[/yellow]")
+
+    if lock_fd is None:
+        with tempfile.TemporaryDirectory(prefix=f"dump_{job_id}_", dir=choose_root(TIER_WORK)) as temp_dir:
+            yield Path(temp_dir), StageJournal()
+        return
+
+    # A previous attempt's dir, else a new one on the emptiest work root
+    job_dir = next((root / key for root in roots if (root / key).is_dir()), None)
+    if job_dir is None:
+        job_dir = (choose_root(TIER_WORK) or roots[0].parent) / RESUMABLE_DIR_NAME / key
+    work_dir = job_dir / "work"
+    journal = StageJournal(job_dir / "journal.json")
+    try:
+        work_dir.mkdir(parents=True, exist_ok=True)
+        if journal.last_completed():
+            console.print(f"[blue]Resuming after stage '{journal.last_completed()}' in {work_dir}[/blue]")
+        yield work_dir, journal
+    except BaseException:
+        # The job handles its own errors, so anything reaching here is an
+        # interruption: an ARQ job_timeout or a worker shutdown cancelling it
+        journal.keep = True
+        raise
+    finally:
+        try:
+            if journal.keep and journal.last_completed():
+                console.print(f"[yellow]Keeping {job_dir} so a retry can resume[/yellow]")
+                os.utime(job_dir)
+            else:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        finally:
+            _unlock(lock_fd)
+
+
+def clear_work_dir(work_dir: Path, keep: Iterable[str] = ()) -> None:
+    """Remove everything in work_dir except the given top-level names."""
+    kept = set(keep)
+    for entry in work_dir.iterdir():
+        if entry.name in kept:
+            continue
+        if entry.is_dir() and not entry.is_symlink():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink(missing_ok=True)
+
+
+def sweep_resumable_jobs() -> int:
+    """Remove resumable job dirs untouched for longer than JOB_RESUME_TTL.
+
+    Dirs whose lock is held (a job running in them) are skipped.
+
+    Returns:
+        Number of dirs removed
+    """
+    roots = _resumable_roots()
+    if not roots or not roots[0].is_dir():
+        return 0
+
+    now = time.time()
+    removed = 0
+    job_dirs = [job_dir for root in roots if root.is_dir() for job_dir in root.iterdir()]
+    for job_dir in job_dirs:
+        if not job_dir.is_dir():
+            continue
+        try:
+            if now - job_dir.stat().st_mtime < settings.JOB_RESUME_TTL:
+                continue
+        except FileNotFoundError:
+            continue
+
+        fd = _try_lock(roots[0] / f"{job_dir.name}.lock")
+        if fd is None:
+            continue
+        try:
+            # The lock file stays, as in partial_downloads
+            shutil.rmtree(job_dir, ignore_errors=True)
+            removed += 1
+            console.print(f"[yellow]Swept expired resumable job dir: {job_dir.name}[/yellow]")
+        finally:
+            _unlock(fd)
+
+    return removed
@@ -0,0 +1,199 @@
+"""One-pass analysis of the boot.img kernel: ikconfig, kallsyms.txt and boot.elf.
+
+extract-ikconfig, kallsyms-finder and vmlinux-to-elf each used to locate
+and decompress the kernel in boot.img on their own. Here the kernel is
+split out of the boot image and decompressed once, in memory. ikconfig is
+read from that buffer in-process. kallsyms-finder and vmlinux-to-elf then
+run side by side on the already decompressed kernel.
+"""
+
+import asyncio
+import lzma
+import mmap
+import os
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+from rich.console import Console
+
+from dumpyarabot.bootimg import UnsupportedRamdisk, parse_boot_image, ramdisk_chunks
+from dumpyarabot.file_utils import safe_remove_file
+from dumpyarabot.process_utils import run_analysis_command
+from dumpyarabot.tool_manager import tool_command
+
+console = Console()
+
+_ARM64_IMAGE_MAGIC = b"ARM\x64"
+_ARM64_MAGIC_OFFSET = 0x38
+_LINUX_BANNER = b"Linux version "
+_IKCONFIG_MARKER = b"IKCFG_ST"
+
+# Compressed kernel payloads, by signature, as extract-vmlinux looks for them
+_EMBEDDED_SIGNATURES = (
+    b"\x1f\x8b\x08",          # gzip
+    b"\xfd7zXZ\x00",          # xz
+    b"\x02\x21\x4c\x18",      # LZ4 legacy
+    b"BZh",                   # bzip2
+)
+
+_SYMBOLS_TIMEOUT = 600.0
+
+
+def _decompress(data: memoryview) -> bytes:
+    """Decompress a stream at the start of data, keeping what decodes before any error."""
+    out = bytearray()
+    try:
+        for chunk in ramdisk_chunks(data):
+            out += chunk
+    except (UnsupportedRamdisk, zlib.error, lzma.LZMAError, OSError, EOFError, ValueError, IndexError):
+        pass
+    return bytes(out)
+
+
+def load_kernel(image_path: Union[str, Path]) -> bytes:
+    """
+    Read the kernel of a boot image (or a bare kernel file) and decompress it.
+
+    Args:
+        image_path: boot.img, or a kernel image
+
+    Returns:
+        The uncompressed kernel. A kernel that is not recognisably
+        compressed is returned as stored.
+    """
+    with open(image_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        image = parse_boot_image(mm)
+        if image is not None and image.sections.get("kernel", (0, 0))[1]:
+            offset, size = image.sections["kernel"]
+            stored = mm[offset:offset + size]
+        else:
+            stored = mm[:]
+
+    if stored[_ARM64_MAGIC_OFFSET:_ARM64_MAGIC_OFFSET + 4] == _ARM64_IMAGE_MAGIC or _LINUX_BANNER in stored:
+        # Uncompressed; the banner only appears in a compressed kernel once decompressed
+        return stored
+
+    view = memoryview(stored)
+    try:
+        # Compressed Image.gz/.lz4 first, then payloads inside a
+        # self-decompressing zImage, in file order
+        candidates = sorted({0} | {
+            pos for signature in _EMBEDDED_SIGNATURES
+            for pos in _find_all(stored, signature)
+        })
+        for pos in candidates:
+            kernel = _decompress(view[pos:])
+            if _LINUX_BANNER in kernel:
+                return kernel
+    finally:
+        view.release()
+    return stored
+
+
+def _find_all(data: bytes, needle: bytes) -> Iterator[int]:
+    pos = data.find(needle)
+    while pos >= 0:
+        yield pos
+        pos = data.find(needle, pos + 1)
+
+
+def extract_ikconfig(kernel: bytes) -> Optional[str]:
+    """
+    Read the kernel config embedded with CONFIG_IKCONFIG.
+
+    Args:
+        kernel: Uncompressed kernel
+
+    Returns:
+        The .config text, or None if the kernel does not carry it
+    """
+    pos = kernel.find(_IKCONFIG_MARKER)
+    if pos < 0:
+        return None
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        config = decompressor.decompress(memoryview(kernel)[pos + len(_IKCONFIG_MARKER):])
+    except zlib.error:
+        return None
+    return config.decode("utf-8", "replace") if config else None
+
+
+async def _run_symbol_tools(kernel_path: Path, kallsyms_path: Path, elf_path: Path) -> Dict[str, float]:
+    """Run kallsyms-finder and vmlinux-to-elf side by side on the decompressed kernel."""
+    timings: Dict[str, float] = {}
+
+    async def timed(name: str, output: Path, *args, **kwargs) -> None:
+        started = time.monotonic()
+        try:
+            result = await run_analysis_command(*args, **kwargs)
+        except FileNotFoundError:
+            console.print(f"[yellow]{args[0]} not found, skipping {output.name}[/yellow]")
+            return
+        if result.success and output.exists() and output.stat().st_size:
+            timings[name] = time.monotonic() - started
+        else:
+            safe_remove_file(output)
+
+    await asyncio.gather(
+        timed("kallsyms", kallsyms_path, *tool_command("kallsyms-finder"), str(kernel_path),
+              output_file=kallsyms_path, timeout=_SYMBOLS_TIMEOUT, description="Generating kallsyms.txt"),
+        timed("elf", elf_path, *tool_command("vmlinux-to-elf"), str(kernel_path), str(elf_path),
+              timeout=_SYMBOLS_TIMEOUT, description="Extracting boot.elf"),
+    )
+    return timings
+
+
+async def analyze_kernel(image_path: Union[str, Path], output_dir: Union[str, Path]) -> Dict[str, float]:
+    """
+    Write ikconfig, kallsyms.txt and boot.elf for a boot image's kernel.
+
+    Artifacts the kernel cannot provide are skipped, not errors.
+
+    Args:
+        image_path: boot.img
+        output_dir: Directory for the three artifacts
+
+    Returns:
+        Seconds spent on each step that succeeded: "decompress",
+        "ikconfig", "kallsyms" and "elf"
+    """
+    output_dir = Path(output_dir)
+    timings: Dict[str, float] = {}
+
+    started = time.monotonic()
+    kernel = await asyncio.to_thread(load_kernel, image_path)
+    timings["decompress"] = time.monotonic() - started
+    console.print(f"[blue]Kernel decompressed ({len(kernel) // 1024} KiB) in {timings['decompress']:.1f}s[/blue]")
+
+    started = time.monotonic()
+    config = await asyncio.to_thread(extract_ikconfig, kernel)
+    if config:
+        (output_dir / "ikconfig").write_text(config)
+        timings["ikconfig"] = time.monotonic() - started
+        console.print("[green]ikconfig extracted successfully[/green]")
+    else:
+        console.print("[yellow]Kernel has no embedded config, skipping ikconfig[/yellow]")
+
+    # The raw kernel goes to a hidden scratch file next to the outputs (so
+    # it stays on the job's disk) and is removed before anything is pushed
+    fd, name = tempfile.mkstemp(prefix=".kernel_", dir=output_dir)
+    kernel_path = Path(name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(kernel)
+        del kernel
+
+        kallsyms_path, elf_path = output_dir / "kallsyms.txt", output_dir / "boot.elf"
+        timings.update(await _run_symbol_tools(kernel_path, kallsyms_path, elf_path))
+    finally:
+        safe_remove_file(kernel_path)
+
+    for name, path in (("kallsyms", "kallsyms.txt"), ("elf", "boot.elf")):
+        if (output_dir / path).exists():
+            console.print(f"[green]{path} generated successfully[/green]")
+        else:
+            console.print(f"[yellow]Failed to generate {path}[/yellow]")
+    return timings
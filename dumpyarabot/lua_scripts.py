@@ -157,3 +157,89 @@ if not current_seq or next_seq > current_seq or (next_seq == current_seq and (no
 end
 return 0
 """
+
+# Reserve disk space for a job, but only if the space is free.
+#
+# Each worker on a host writes to the same disk. Each job keeps one field in
+# a hash. The field holds the bytes that the job will still write, and the
+# time when the field expires. An expired field belongs to a worker that
+# stopped, so the script deletes it.
+#
+# The free bytes come from the disk, so they already exclude the data that
+# the jobs wrote. The script subtracts the bytes that the other jobs will
+# still write. A job is admitted if its bytes fit in the rest. A job is also
+# admitted if no other job holds space: to wait would not make space.
+#
+# KEYS[1]: the reservation hash of the disk.
+# ARGV[1]: the job id.
+# ARGV[2]: the bytes that the job will still write.
+# ARGV[3]: the free bytes on the disk.
+# ARGV[4]: the bytes to always keep free.
+# ARGV[5]: the current time, as a UNIX time.
+# ARGV[6]: the time when the new field expires, as a UNIX time.
+#
+# Returns {1, available} if the script reserved the space, or
+# {0, available} if the job must wait.
+RESERVE_DISK_SPACE: str = """
+local requested = tonumber(ARGV[2])
+local available = tonumber(ARGV[3]) - tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local others = 0
+local entries = redis.call('HGETALL', KEYS[1])
+for i = 1, #entries, 2 do
+    local field = entries[i]
+    local value = entries[i + 1]
+    local sep = string.find(value, ':', 1, true)
+    local bytes = tonumber(string.sub(value, 1, sep - 1))
+    local expires = tonumber(string.sub(value, sep + 1))
+    if expires < now then
+        redis.call('HDEL', KEYS[1], field)
+    elseif field ~= ARGV[1] then
+        available = available - bytes
+        others = others + 1
+    end
+end
+if others == 0 or requested <= available then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. ':' .. ARGV[6])
+    return {1, available}
+end
+return {0, available}
+"""
+
+# Take the index entry of a firmware for a new dump job.
+#
+# The index has one key for each firmware (URL and dump options), with the id
+# of the job that dumps it. A second request for the same firmware finds the
+# key and follows that job instead of queueing a duplicate job. If the caller
+# knows that the job in the key has ended, it can take the key from that job.
+#
+# KEYS[1]: the index key of the firmware.
+# ARGV[1]: the id of the new job.
+# ARGV[2]: the time-to-live of the key, in seconds.
+# ARGV[3]: the id of a job that has ended, or an empty string.
+#
+# Returns an empty string if the new job now holds the key, or the id of the
+# job that holds the key.
+CLAIM_ACTIVE_DUMP: str = """
+local current = redis.call('GET', KEYS[1])
+if (not current) or current == ARGV[3] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+    return ''
+end
+return current
+"""
+
+# Delete the index entry of a firmware, but only if the job still holds it.
+# A new job can hold the key after the old job's key was taken as stale.
+#
+# KEYS[1]: the index key of the firmware.
+# ARGV[1]: the id of the job that ended.
+#
+# Returns 1 if the script deleted the key, or 0 if it did not.
+RELEASE_ACTIVE_DUMP: str = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
@@ -1,5 +1,7 @@
 import asyncio
 import base64
+import hashlib
+import json
 import re
 import uuid
 from datetime import datetime, timedelta, timezone
@@ -73,6 +75,10 @@ def sanitize_telegram_error(error: BaseException, max_snippet_chars: int = 200)
     return f"{type(error).__name__}: {compact}"
 
 
+# Lifetime of a firmware's entry in the dump index and of a job's subscriber list
+_ACTIVE_DUMP_TTL = 24 * 3600
+
+
 class MessageType(str, Enum):
     """Types of messages that can be queued."""
     COMMAND_REPLY = "command_reply"
@@ -166,6 +172,18 @@ class MessageQueue:
         """Create Redis key for the latest rendered Telegram status text."""
         return f"{settings.REDIS_KEY_PREFIX}job_status_text:{job_id}"
 
+    def _make_active_dump_key(self, dedupe_key: str) -> str:
+        """Create Redis key that maps a firmware to the job that dumps it."""
+        return f"{settings.REDIS_KEY_PREFIX}active_dump:{dedupe_key}"
+
+    def _make_active_dump_of_key(self, job_id: str) -> str:
+        """Create Redis key that maps a job back to its firmware index key."""
+        return f"{settings.REDIS_KEY_PREFIX}active_dump_of:{job_id}"
+
+    def _make_job_subscribers_key(self, job_id: str) -> str:
+        """Create Redis key for the extra status messages that follow a job."""
+        return f"{settings.REDIS_KEY_PREFIX}job_subscribers:{job_id}"
+
     def _make_edit_sequence_key(self, chat_id: int, edit_message_id: int) -> str:
         """Make the Redis key that holds the edit counter for one message.
 
@@ -1228,21 +1246,171 @@ class MessageQueue:
     # ========== METADATA ENHANCED METHODS ==========
 
     async def queue_dump_job_with_metadata(self, enhanced_job_data: Dict[str, Any]) -> str:
-        """Queue a dump job with metadata support."""
+        """
+        Queue a dump job with metadata support.
+
+        A request for firmware that a queued or running job already dumps
+        (same normalized URL and options) does not queue a second job. Its
+        status message follows the existing job instead.
+
+        Args:
+            enhanced_job_data: Serialized DumpJob with metadata
+
+        Returns:
+            The id of the job that dumps the firmware: the new job, or the
+            existing job the request was attached to
+        """
         from dumpyarabot.arq_config import arq_pool
 
         job_data = enhanced_job_data
+        job_id = enhanced_job_data["job_id"]
+
+        dedupe_key = _dump_dedupe_key(job_data)
+        if dedupe_key is not None:
+            existing_job_id = await self._claim_active_dump(dedupe_key, job_id)
+            if existing_job_id is not None:
+                await self._attach_to_job(existing_job_id, job_data)
+                return existing_job_id
 
         # Enqueue to ARQ with metadata.
         # Keep-result settings belong to the worker function/worker config, not enqueue kwargs.
-        await arq_pool.enqueue_job(
-            "process_firmware_dump",
-            job_data,
-            job_id=enhanced_job_data["job_id"],
+        try:
+            await arq_pool.enqueue_job(
+                "process_firmware_dump",
+                job_data,
+                job_id=job_id,
+            )
+        except Exception:
+            if dedupe_key is not None:
+                await self.release_active_dump(job_id)
+            raise
+
+        console.print(f"[green]Queued ARQ dump job {job_id} with metadata[/green]")
+        return job_id
+
+    async def _claim_active_dump(self, dedupe_key: str, job_id: str) -> Optional[str]:
+        """
+        Register a job as the one that dumps a firmware.
+
+        Args:
+            dedupe_key: Index key of the firmware (see _dump_dedupe_key)
+            job_id: The new job
+
+        Returns:
+            None if the new job should be queued, or the id of the queued or
+            running job that already dumps the firmware
+        """
+        from dumpyarabot.arq_config import arq_pool
+
+        redis_client = await self._get_redis()
+        index_key = self._make_active_dump_key(dedupe_key)
+        stale_job_id = ""
+        # Two rounds: the second one takes the key from a job that has ended
+        # without releasing it (worker crash, expired result)
+        for _ in range(2):
+            holder = await redis_client.eval(
+                lua_scripts.CLAIM_ACTIVE_DUMP, 1, index_key, job_id, _ACTIVE_DUMP_TTL, stale_job_id
+            )
+            if not holder:
+                await redis_client.set(self._make_active_dump_of_key(job_id), dedupe_key, ex=_ACTIVE_DUMP_TTL)
+                return None
+            holder = str(holder)
+            try:
+                if await arq_pool.is_job_active(holder):
+                    return holder
+            except Exception as e:
+                # Without ARQ we cannot tell, so do not hide the request
+                console.print(f"[yellow]Could not check job {holder}, queueing a new job: {e}[/yellow]")
+                return None
+            stale_job_id = holder
+        return None
+
+    async def release_active_dump(self, job_id: str) -> None:
+        """Let later requests for a job's firmware queue a new job.
+
+        Args:
+            job_id: The job that ended
+        """
+        try:
+            redis_client = await self._get_redis()
+            dedupe_key = await redis_client.get(self._make_active_dump_of_key(job_id))
+            if dedupe_key is None:
+                return
+            await redis_client.eval(
+                lua_scripts.RELEASE_ACTIVE_DUMP, 1, self._make_active_dump_key(str(dedupe_key)), job_id
+            )
+            await redis_client.delete(self._make_active_dump_of_key(job_id))
+        except Exception as e:
+            console.print(f"[yellow]Could not release dump index for job {job_id}: {e}[/yellow]")
+
+    async def _attach_to_job(self, job_id: str, job_data: Dict[str, Any]) -> None:
+        """Make a duplicate request's status message follow an existing job."""
+        subscriber = _status_target(job_data)
+        if subscriber is None:
+            return
+
+        redis_client = await self._get_redis()
+        key = self._make_job_subscribers_key(job_id)
+        await redis_client.rpush(key, json.dumps(subscriber))
+        await redis_client.expire(key, _ACTIVE_DUMP_TTL)
+        console.print(
+            f"[blue]Request {job_data['job_id']} is a duplicate of job {job_id}; following its progress[/blue]"
         )
 
-        console.print(f"[green]Queued ARQ dump job {enhanced_job_data['job_id']} with metadata[/green]")
-        return enhanced_job_data["job_id"]
+        text = await self.get_latest_status_text(job_id)
+        if text is None:
+            text = (
+                " *Firmware Dump Queued*\n\n"
+                f"This firmware is already queued as job `{job_id}`.\n"
+                "This message follows that job's progress.\n"
+            )
+        await self._send_to_subscriber(subscriber, text, {"job_id": job_id, "type": "subscriber"})
+
+    async def send_to_job_subscribers(
+        self, job_id: str, text: str, context: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Mirror a job's status text to the requests that were attached to it.
+
+        Args:
+            job_id: The job whose status changed
+            text: The formatted status text
+            context: Message context; job_id makes the consumer send the
+                latest text of the job
+        """
+        try:
+            redis_client = await self._get_redis()
+            entries = await redis_client.lrange(self._make_job_subscribers_key(job_id), 0, -1)
+        except Exception as e:
+            console.print(f"[yellow]Could not read subscribers of job {job_id}: {e}[/yellow]")
+            return
+        for entry in entries:
+            try:
+                await self._send_to_subscriber(json.loads(entry), text, context)
+            except Exception as e:
+                console.print(f"[yellow]Could not update subscriber of job {job_id}: {e}[/yellow]")
+
+    async def _send_to_subscriber(
+        self, subscriber: Dict[str, Any], text: str, context: Optional[Dict[str, Any]]
+    ) -> None:
+        context = {**(context or {}), "subscriber": True}
+        if subscriber.get("moderated"):
+            await self.send_cross_chat_edit(
+                chat_id=subscriber["chat_id"],
+                text=text,
+                edit_message_id=subscriber["message_id"],
+                reply_to_message_id=subscriber["reply_to_message_id"],
+                reply_to_chat_id=subscriber["reply_to_chat_id"],
+                context=context,
+            )
+        else:
+            await self.send_status_update(
+                chat_id=subscriber["chat_id"],
+                text=text,
+                edit_message_id=subscriber["message_id"],
+                parse_mode=settings.DEFAULT_PARSE_MODE,
+                context=context,
+            )
 
     async def get_job_status(self, job_id: str) -> Optional[DumpJob]:
         """Enhanced ARQ status retrieval with rich metadata."""
@@ -1358,5 +1526,49 @@ class MessageQueue:
         return True
 
 
+def _dump_dedupe_key(job_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Index key of the firmware a dump job produces.
+
+    Requests with the same normalized URL and the same output-changing
+    options produce the same dump. Private dumps are never shared.
+
+    Args:
+        job_data: Serialized DumpJob
+
+    Returns:
+        Hex digest, or None if the job must not be coalesced
+    """
+    from dumpyarabot.url_utils import normalize_download_url
+
+    dump_args = job_data.get("dump_args") or {}
+    if dump_args.get("use_privdump") or not dump_args.get("url"):
+        return None
+    url = normalize_download_url(str(dump_args["url"]))
+    options = f"alt={int(bool(dump_args.get('use_alt_dumper')))}|force={int(bool(dump_args.get('force')))}"
+    return hashlib.sha256(f"{url}|{options}".encode()).hexdigest()
+
+
+def _status_target(job_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Where the worker edits a job's status, in the form _send_to_subscriber takes."""
+    message_id = job_data.get("initial_message_id")
+    chat_id = job_data.get("initial_chat_id")
+    if not message_id or not chat_id:
+        return None
+
+    telegram_context = (job_data.get("metadata") or {}).get("telegram_context") or {}
+    reply_to_message_id = (job_data.get("dump_args") or {}).get("initial_message_id")
+    primary_allowed_chat = settings.ALLOWED_CHATS[0] if settings.ALLOWED_CHATS else None
+    if telegram_context.get("moderated_request") and reply_to_message_id and primary_allowed_chat is not None:
+        return {
+            "chat_id": primary_allowed_chat,
+            "message_id": message_id,
+            "moderated": True,
+            "reply_to_message_id": reply_to_message_id,
+            "reply_to_chat_id": telegram_context.get("chat_id", chat_id),
+        }
+    return {"chat_id": chat_id, "message_id": message_id, "moderated": False}
+
+
 # Global message queue instance
 message_queue = MessageQueue()
@@ -0,0 +1,160 @@
+"""Per-URL resumable download area that survives job retries and worker crashes.
+
+Job work dirs are throwaway (``dump_<jobid>_<rand>``), so a download that
+dies at 90% normally restarts from zero on the next attempt. Instead, aria2
+downloads into ``<WORK_DIR_BASE>/partial_downloads/<url_key>/`` and keeps its
+``.aria2`` control file there on failure. The next attempt for the same URL
+re-attaches to that directory and aria2 continues from where it stopped. On
+success the finished file is moved into the job dir.
+
+An exclusive flock on ``<url_key>.lock`` guards each area, so two workers
+fetching the same URL never write the same file; the loser downloads into
+its own job dir as before. Areas untouched for PARTIAL_DOWNLOAD_TTL are swept
+at worker startup.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.file_utils import fast_copy
+from dumpyarabot.url_utils import normalize_download_url
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+console = Console()
+
+PARTIAL_DIR_NAME = "partial_downloads"
+
+
+def _partial_root() -> Optional[Path]:
+    """Root of the resumable area, or None when it is disabled."""
+    if fcntl is None or settings.PARTIAL_DOWNLOAD_TTL <= 0 or not settings.WORK_DIR_BASE:
+        return None
+    base = Path(settings.WORK_DIR_BASE)
+    if not base.is_dir():
+        return None
+    return base / PARTIAL_DIR_NAME
+
+
+def partial_key(url: str) -> str:
+    """Stable directory name for a URL's resumable area."""
+    return hashlib.sha256(normalize_download_url(url).encode()).hexdigest()[:32]
+
+
+def _try_lock(lock_path: Path) -> Optional[int]:
+    """Take an exclusive, non-blocking flock. Returns the fd, or None if held elsewhere."""
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _unlock(fd: int) -> None:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def claim_partial_area(url: str) -> Iterator[Optional[Path]]:
+    """Lock and yield the resumable download dir for a URL.
+
+    Yields None when resuming is disabled, or when another worker is already
+    downloading the same URL; the caller then downloads into its job dir.
+    """
+    root = _partial_root()
+    if root is None:
+        yield None
+        return
+
+    key = partial_key(url)
+    try:
+        root.mkdir(exist_ok=True)
+        fd = _try_lock(root / f"{key}.lock")
+    except OSError as e:
+        console.print(f"[yellow]Resumable download area unavailable: {e}[/yellow]")
+        yield None
+        return
+
+    if fd is None:
+        console.print("[yellow]Same URL is downloading in another job, not resuming[/yellow]")
+        yield None
+        return
+
+    try:
+        area = root / key
+        resumed = area.is_dir() and any(area.iterdir())
+        area.mkdir(exist_ok=True)
+        # Bump mtime so the TTL sweep measures time since last use
+        os.utime(area)
+        if resumed:
+            console.print(f"[green]Resuming partial download from {area}[/green]")
+        yield area
+    finally:
+        _unlock(fd)
+
+
+def adopt_download(file_path: Path, dest_dir: Path) -> Path:
+    """Move a finished download out of its resumable area into the job dir."""
+    target = Path(dest_dir) / Path(file_path).name
+    shutil.move(str(file_path), target, copy_function=fast_copy)
+    control = Path(file_path).with_name(Path(file_path).name + ".aria2")
+    try:
+        control.unlink()
+    except FileNotFoundError:
+        pass
+    return target
+
+
+def sweep_partial_downloads() -> int:
+    """Remove resumable areas unused for longer than PARTIAL_DOWNLOAD_TTL.
+
+    Areas whose lock is held (a download in progress) are skipped.
+
+    Returns:
+        Number of areas removed
+    """
+    root = _partial_root()
+    if root is None or not root.is_dir():
+        return 0
+
+    now = time.time()
+    removed = 0
+    for area in root.iterdir():
+        if not area.is_dir():
+            continue
+        try:
+            if now - area.stat().st_mtime < settings.PARTIAL_DOWNLOAD_TTL:
+                continue
+        except FileNotFoundError:
+            continue
+
+        lock_path = root / f"{area.name}.lock"
+        fd = _try_lock(lock_path)
+        if fd is None:
+            continue
+        try:
+            # The lock file stays: unlinking it would let a new opener lock a
+            # fresh inode while we still hold the old one
+            shutil.rmtree(area, ignore_errors=True)
+            removed += 1
+            console.print(f"[yellow]Swept stale partial download: {area.name}[/yellow]")
+        finally:
+            _unlock(fd)
+
+    return removed
@@ -5,6 +5,7 @@ from typing import Dict, List, Optional, Any
 from rich.console import Console
 
 from dumpyarabot.process_utils import run_command, run_analysis_command
+from dumpyarabot.tool_manager import tool_command
 from dumpyarabot.file_utils import expand_glob_paths, create_file_manifest
 
 console = Console()
@@ -572,7 +573,7 @@ class PropertyExtractor:
 
         try:
             result = await run_command(
-                "uvx", "aospdtgen@1.1.1", ".", "--output", "./aosp-device-tree",
+                *tool_command("aospdtgen"), ".", "--output", "./aosp-device-tree",
                 cwd=self.work_dir,
                 timeout=180.0,
                 description="Generating device tree"
@@ -1,10 +1,12 @@
 import json
 import re
+import time
 from typing import Any, Dict, Optional
 
 import redis.asyncio as redis
 from telegram.ext import ContextTypes
 
+from dumpyarabot import lua_scripts
 from dumpyarabot.config import settings
 from dumpyarabot.schemas import AcceptOptionsState, MockupState, PendingReview
 
@@ -190,6 +192,164 @@ class RedisStorage:
             console = Console()
             console.print(f"[red]Error clearing restart message info: {e}[/red]")
 
+    @classmethod
+    async def get_mirror_health(cls, mirror_host: str) -> Optional[Dict[str, Any]]:
+        """Get the cached health/throughput probe result for a download mirror."""
+        redis_client = await cls.get_redis_client()
+        data = await redis_client.get(cls._make_key(f"mirror_health:{mirror_host}"))
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    @classmethod
+    async def store_mirror_health(cls, mirror_host: str, health: Dict[str, Any], ttl: int = 1800) -> None:
+        """Cache a mirror's health/throughput probe result (default 30 minutes)."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.set(cls._make_key(f"mirror_health:{mirror_host}"), json.dumps(health), ex=ttl)
+
+    @classmethod
+    async def get_host_download_stats(cls, host: str) -> Optional[Dict[str, Any]]:
+        """Get the measured aria2 throughput and error history of a download host."""
+        redis_client = await cls.get_redis_client()
+        data = await redis_client.get(cls._make_key(f"host_download_stats:{host}"))
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    @classmethod
+    async def store_host_download_stats(cls, host: str, stats: Dict[str, Any], ttl: int = 2592000) -> None:
+        """Store a download host's aria2 history (default 30 days)."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.set(cls._make_key(f"host_download_stats:{host}"), json.dumps(stats), ex=ttl)
+
+    @classmethod
+    async def get_active_downloads(cls, host: str) -> Dict[str, Dict[str, Any]]:
+        """Get all registered aria2 downloads on a host, keyed by registration token."""
+        redis_client = await cls.get_redis_client()
+        raw = await redis_client.hgetall(cls._make_key(f"aria2_downloads:{host}"))
+        downloads = {}
+        for token, data in raw.items():
+            try:
+                downloads[token] = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+        return downloads
+
+    @classmethod
+    async def store_active_download(cls, host: str, token: str, entry: Dict[str, Any]) -> None:
+        """Register (or refresh the heartbeat of) an active aria2 download."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.hset(cls._make_key(f"aria2_downloads:{host}"), token, json.dumps(entry))
+
+    @classmethod
+    async def remove_active_download(cls, host: str, token: str) -> None:
+        """Drop an aria2 download from the host's registry."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.hdel(cls._make_key(f"aria2_downloads:{host}"), token)
+
+    @classmethod
+    async def set_prefetch_active(cls, url_key: str, job_id: str, ttl: int = 60) -> None:
+        """Mark a URL as being prefetched; the prefetcher refreshes this while it runs."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.set(cls._make_key(f"prefetch_active:{url_key}"), job_id, ex=ttl)
+
+    @classmethod
+    async def is_prefetch_active(cls, url_key: str) -> bool:
+        """Whether a prefetch of the URL is still running."""
+        redis_client = await cls.get_redis_client()
+        return bool(await redis_client.exists(cls._make_key(f"prefetch_active:{url_key}")))
+
+    @classmethod
+    async def clear_prefetch_active(cls, url_key: str) -> None:
+        """Clear the running-prefetch marker and any pending handover request."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.delete(
+            cls._make_key(f"prefetch_active:{url_key}"),
+            cls._make_key(f"prefetch_handover:{url_key}"),
+        )
+
+    @classmethod
+    async def request_prefetch_handover(cls, url_key: str, ttl: int = 120) -> None:
+        """Ask the prefetcher to stop so a starting job can take over the download."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.set(cls._make_key(f"prefetch_handover:{url_key}"), "1", ex=ttl)
+
+    @classmethod
+    async def is_prefetch_handover_requested(cls, url_key: str) -> bool:
+        """Whether a job wants the download the prefetcher is running."""
+        redis_client = await cls.get_redis_client()
+        return bool(await redis_client.exists(cls._make_key(f"prefetch_handover:{url_key}")))
+
+    @classmethod
+    async def request_extractor_refresh(cls, requested_at: float) -> None:
+        """Record an admin request to refresh the Firmware_extractor checkouts."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.set(cls._make_key("firmware_extractor_refresh"), str(requested_at))
+
+    @classmethod
+    async def get_extractor_refresh_request(cls) -> float:
+        """Time of the last Firmware_extractor refresh request, or 0."""
+        redis_client = await cls.get_redis_client()
+        value = await redis_client.get(cls._make_key("firmware_extractor_refresh"))
+        return float(value) if value else 0.0
+
+    @classmethod
+    async def reserve_disk_space(
+        cls, disk: str, job_id: str, size: int, free_bytes: int, headroom: int, ttl: int
+    ) -> tuple[bool, int]:
+        """Atomically reserve space for a job on a disk shared by all workers.
+
+        Returns (admitted, bytes available to this job after other reservations).
+        """
+        redis_client = await cls.get_redis_client()
+        now = int(time.time())
+        admitted, available = await redis_client.eval(
+            lua_scripts.RESERVE_DISK_SPACE,
+            1,
+            cls._make_key(f"disk_reservations:{disk}"),
+            job_id,
+            size,
+            free_bytes,
+            headroom,
+            now,
+            now + ttl,
+        )
+        return bool(admitted), int(available)
+
+    @classmethod
+    async def update_disk_reservation(cls, disk: str, job_id: str, size: int, ttl: int) -> None:
+        """Shrink (or refresh) a job's reservation as its stages free space."""
+        redis_client = await cls.get_redis_client()
+        expires_at = int(time.time()) + ttl
+        await redis_client.hset(cls._make_key(f"disk_reservations:{disk}"), job_id, f"{size}:{expires_at}")
+
+    @classmethod
+    async def release_disk_reservation(cls, disk: str, job_id: str) -> None:
+        """Drop a job's disk reservation."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.hdel(cls._make_key(f"disk_reservations:{disk}"), job_id)
+
+    @classmethod
+    async def mark_disk_wait(cls, job_id: str, ttl: int) -> float:
+        """Time a job started waiting for disk space, recording now if it was not waiting."""
+        redis_client = await cls.get_redis_client()
+        key = cls._make_key(f"disk_wait:{job_id}")
+        await redis_client.set(key, str(time.time()), nx=True, ex=ttl)
+        value = await redis_client.get(key)
+        return float(value) if value else time.time()
+
+    @classmethod
+    async def clear_disk_wait(cls, job_id: str) -> None:
+        """Forget that a job was waiting for disk space."""
+        redis_client = await cls.get_redis_client()
+        await redis_client.delete(cls._make_key(f"disk_wait:{job_id}"))
+
 
 # Backward compatibility adapter that wraps RedisStorage with bot_data interface
 class ReviewStorage:
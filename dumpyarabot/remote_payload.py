@@ -0,0 +1,489 @@
+"""Fetch partitions straight out of a remote OTA payload with HTTP Range requests.
+
+A/B OTA zips store ``payload.bin`` uncompressed. Its header and protobuf
+manifest list, per partition, the byte ranges of the payload that hold that
+partition's data. This module reads the zip central directory and the
+manifest with small ranged GETs, then downloads only the ranges of the
+partitions we dump and writes them out as ``<partition>.img``. Unused
+partitions are never transferred.
+
+Only full-OTA operations (REPLACE, REPLACE_BZ, REPLACE_XZ, ZERO, DISCARD) are
+supported. Anything else (delta OTAs, zstd payloads, servers without Range
+support) raises RemotePayloadError so the caller can fall back to a full
+download.
+"""
+
+import asyncio
+import bz2
+import hashlib
+import lzma
+import os
+import struct
+import time
+from collections.abc import Callable, Coroutine, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from rich.console import Console
+
+from dumpyarabot.aria2_manager import DownloadProgress
+
+console = Console()
+
+ProgressCallback = Callable[[DownloadProgress], Coroutine[None, None, None]]
+
+PAYLOAD_MEMBER = "payload.bin"
+PAYLOAD_MAGIC = b"CrAU"
+
+# InstallOperation.Type values from update_engine's update_metadata.proto
+OP_REPLACE = 0
+OP_REPLACE_BZ = 1
+OP_ZERO = 6
+OP_DISCARD = 7
+OP_REPLACE_XZ = 8
+SUPPORTED_OPERATIONS = {OP_REPLACE, OP_REPLACE_BZ, OP_ZERO, OP_DISCARD, OP_REPLACE_XZ}
+
+# Adjacent operations are fetched together up to this many bytes per request.
+_MAX_FETCH_BYTES = 32 * 1024 * 1024
+_PARTITION_CONCURRENCY = 4
+_FETCH_RETRIES = 3
+
+_EOCD_SIG = 0x06054B50
+_ZIP64_EOCD_SIG = 0x06064B50
+_ZIP64_LOCATOR_SIG = 0x07064B50
+_CENTRAL_DIR_SIG = 0x02014B50
+_LOCAL_HEADER_SIG = 0x04034B50
+
+
+class RemotePayloadError(Exception):
+    """The remote file cannot be extracted partially; download it instead."""
+
+
+class RangeNotSupportedError(RemotePayloadError):
+    """The server answered a Range request with something other than 206."""
+
+
+@dataclass
+class PayloadOperation:
+    """One install operation: a data blob and the blocks it writes."""
+
+    type: int
+    data_offset: int = 0
+    data_length: int = 0
+    dst_extents: List[Tuple[int, int]] = field(default_factory=list)
+    data_sha256: Optional[bytes] = None
+
+
+@dataclass
+class PayloadPartition:
+    """A partition in the payload manifest."""
+
+    name: str
+    size: int
+    operations: List[PayloadOperation]
+
+    @property
+    def data_bytes(self) -> int:
+        return sum(op.data_length for op in self.operations)
+
+
+@dataclass
+class PayloadManifest:
+    """Decoded payload manifest plus the absolute offset of its data blobs."""
+
+    block_size: int
+    partitions: List[PayloadPartition]
+    data_start: int
+
+
+# --- Minimal protobuf wire-format decoding ---------------------------------
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise RemotePayloadError("Truncated varint in payload manifest")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def decode_protobuf(buf: bytes) -> Dict[int, list]:
+    """Decode one protobuf message into {field_number: [values]}.
+
+    Varints and fixed-width fields decode to int, length-delimited fields to
+    bytes (nested messages are decoded by the caller).
+    """
+    fields: Dict[int, list] = {}
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 1:
+            value = struct.unpack_from("<Q", buf, pos)[0]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            value = bytes(buf[pos:pos + length])
+            pos += length
+        elif wire_type == 5:
+            value = struct.unpack_from("<I", buf, pos)[0]
+            pos += 4
+        else:
+            raise RemotePayloadError(f"Unsupported protobuf wire type {wire_type}")
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def _first(fields: Dict[int, list], number: int, default=None):
+    values = fields.get(number)
+    return values[0] if values else default
+
+
+def parse_manifest(manifest: bytes, data_start: int) -> PayloadManifest:
+    """Decode a DeltaArchiveManifest into partitions and operations."""
+    fields = decode_protobuf(manifest)
+    block_size = _first(fields, 3, 4096)
+    partitions = []
+
+    for raw_partition in fields.get(13, []):
+        p = decode_protobuf(raw_partition)
+        name = _first(p, 1, b"").decode(errors="replace")
+        new_info = decode_protobuf(_first(p, 7, b""))
+        operations = []
+        for raw_op in p.get(8, []):
+            o = decode_protobuf(raw_op)
+            extents = []
+            for raw_extent in o.get(6, []):
+                e = decode_protobuf(raw_extent)
+                extents.append((_first(e, 1, 0), _first(e, 2, 0)))
+            operations.append(PayloadOperation(
+                type=_first(o, 1, 0),
+                data_offset=_first(o, 2, 0),
+                data_length=_first(o, 3, 0),
+                dst_extents=extents,
+                data_sha256=_first(o, 8),
+            ))
+        size = _first(new_info, 1) or sum(n for _, n in _all_extents(operations)) * block_size
+        partitions.append(PayloadPartition(name=name, size=size, operations=operations))
+
+    return PayloadManifest(block_size=block_size, partitions=partitions, data_start=data_start)
+
+
+def _all_extents(operations: Iterable[PayloadOperation]):
+    for op in operations:
+        yield from op.dst_extents
+
+
+# --- Ranged reads and zip parsing ------------------------------------------
+
+
+class RangeReader:
+    """Random access to a remote file over HTTP Range requests."""
+
+    def __init__(self, client: httpx.AsyncClient, url: str):
+        self.client = client
+        self.url = url
+        self.size = 0
+
+    async def _fetch(self, offset: int, length: int) -> Tuple[httpx.Response, bytes]:
+        """
+        GET one byte range, reading at most `length` bytes of the body.
+
+        The status is checked before the body is read: a server that ignores
+        Range answers 200 with the whole (multi-GB) file.
+
+        Raises:
+            RangeNotSupportedError: The response is not 206 Partial Content
+        """
+        headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+        async with self.client.stream("GET", self.url, headers=headers) as response:
+            if response.status_code != 206:
+                raise RangeNotSupportedError(f"Range request returned HTTP {response.status_code}")
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data += chunk[:length - len(data)]
+                if len(data) >= length:
+                    break
+        return response, bytes(data)
+
+    async def open(self) -> None:
+        """Check Range support and learn the file size."""
+        try:
+            response, _ = await self._fetch(0, 1)
+        except RangeNotSupportedError as e:
+            raise RangeNotSupportedError(f"Server does not support Range requests ({e})") from None
+        total = response.headers.get("content-range", "").rsplit("/", 1)[-1]
+        if not total.isdigit():
+            raise RemotePayloadError("Server did not report the file size")
+        self.size = int(total)
+        # Pin redirects (CDN tokens) so later requests skip the hop.
+        self.url = str(response.url)
+
+    async def read(self, offset: int, length: int) -> bytes:
+        """Read exactly `length` bytes at `offset`."""
+        if length <= 0:
+            return b""
+        last_error: Exception | None = None
+        for attempt in range(_FETCH_RETRIES):
+            try:
+                _, data = await self._fetch(offset, length)
+                if len(data) != length:
+                    raise RemotePayloadError(f"Short range read at {offset}: {len(data)}/{length} bytes")
+                return data
+            except RangeNotSupportedError:
+                # Retrying would only fetch the whole file again
+                raise
+            except (httpx.HTTPError, RemotePayloadError) as e:
+                last_error = e
+                await asyncio.sleep(2 ** attempt)
+        raise RemotePayloadError(f"Range read failed at offset {offset}: {last_error}")
+
+
+async def locate_zip_member(reader: RangeReader, name: str) -> Tuple[int, int]:
+    """Return (data_offset, size) of an uncompressed member in a remote zip."""
+    tail_len = min(reader.size, 65535 + 22 + 20)
+    tail_start = reader.size - tail_len
+    tail = await reader.read(tail_start, tail_len)
+
+    eocd = tail.rfind(struct.pack("<I", _EOCD_SIG))
+    if eocd < 0:
+        raise RemotePayloadError("Not a zip archive (no end of central directory)")
+    (_, _, _, _, total_entries, cd_size, cd_offset, _) = struct.unpack_from("<IHHHHIIH", tail, eocd)
+
+    if 0xFFFFFFFF in (cd_size, cd_offset) or total_entries == 0xFFFF:
+        locator = eocd - 20
+        if locator < 0 or struct.unpack_from("<I", tail, locator)[0] != _ZIP64_LOCATOR_SIG:
+            raise RemotePayloadError("Zip64 locator missing")
+        zip64_eocd_offset = struct.unpack_from("<Q", tail, locator + 8)[0]
+        record = await reader.read(zip64_eocd_offset, 56)
+        if struct.unpack_from("<I", record, 0)[0] != _ZIP64_EOCD_SIG:
+            raise RemotePayloadError("Zip64 end of central directory missing")
+        cd_size, cd_offset = struct.unpack_from("<QQ", record, 40)
+
+    central_dir = await reader.read(cd_offset, cd_size)
+    pos = 0
+    while pos + 46 <= len(central_dir):
+        if struct.unpack_from("<I", central_dir, pos)[0] != _CENTRAL_DIR_SIG:
+            break
+        method = struct.unpack_from("<H", central_dir, pos + 10)[0]
+        comp_size, uncomp_size = struct.unpack_from("<II", central_dir, pos + 20)
+        name_len, extra_len, comment_len = struct.unpack_from("<HHH", central_dir, pos + 28)
+        header_offset = struct.unpack_from("<I", central_dir, pos + 42)[0]
+        member_name = central_dir[pos + 46:pos + 46 + name_len].decode(errors="replace")
+        extra = central_dir[pos + 46 + name_len:pos + 46 + name_len + extra_len]
+        pos += 46 + name_len + extra_len + comment_len
+
+        if member_name != name:
+            continue
+        if method != 0:
+            raise RemotePayloadError(f"{name} is compressed in the zip (method {method})")
+
+        uncomp_size, comp_size, header_offset = _apply_zip64_extra(
+            extra, uncomp_size, comp_size, header_offset
+        )
+        local = await reader.read(header_offset, 30)
+        if struct.unpack_from("<I", local, 0)[0] != _LOCAL_HEADER_SIG:
+            raise RemotePayloadError(f"Bad local header for {name}")
+        local_name_len, local_extra_len = struct.unpack_from("<HH", local, 26)
+        return header_offset + 30 + local_name_len + local_extra_len, uncomp_size
+
+    raise RemotePayloadError(f"{name} not found in archive")
+
+
+def _apply_zip64_extra(extra: bytes, uncomp: int, comp: int, offset: int) -> Tuple[int, int, int]:
+    """Replace 0xFFFFFFFF placeholders with values from the zip64 extra field."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, pos)
+        body = extra[pos + 4:pos + 4 + size]
+        pos += 4 + size
+        if header_id != 0x0001:
+            continue
+        values = list(struct.unpack_from(f"<{len(body) // 8}Q", body))
+        if uncomp == 0xFFFFFFFF and values:
+            uncomp = values.pop(0)
+        if comp == 0xFFFFFFFF and values:
+            comp = values.pop(0)
+        if offset == 0xFFFFFFFF and values:
+            offset = values.pop(0)
+    return uncomp, comp, offset
+
+
+async def read_payload_manifest(reader: RangeReader, payload_offset: int) -> PayloadManifest:
+    """Read and decode the payload header and manifest."""
+    header = await reader.read(payload_offset, 24)
+    if header[:4] != PAYLOAD_MAGIC:
+        raise RemotePayloadError("payload.bin has a bad magic")
+    version, manifest_size = struct.unpack_from(">QQ", header, 4)
+    if version < 2:
+        raise RemotePayloadError(f"Unsupported payload version {version}")
+    metadata_signature_size = struct.unpack_from(">I", header, 20)[0]
+
+    manifest = await reader.read(payload_offset + 24, manifest_size)
+    data_start = payload_offset + 24 + manifest_size + metadata_signature_size
+    return parse_manifest(manifest, data_start)
+
+
+# --- Writing partitions ----------------------------------------------------
+
+
+def _apply_operation(fd: int, op: PayloadOperation, blob: memoryview, block_size: int) -> None:
+    """Decompress one operation's blob and write it to its destination blocks."""
+    if op.type in (OP_ZERO, OP_DISCARD):
+        return  # The image is preallocated sparse, so these blocks already read as zero.
+    if op.data_sha256 and hashlib.sha256(blob).digest() != op.data_sha256:
+        raise RemotePayloadError("Payload operation data hash mismatch")
+
+    if op.type == OP_REPLACE:
+        data = blob
+    elif op.type == OP_REPLACE_BZ:
+        data = memoryview(bz2.decompress(blob))
+    elif op.type == OP_REPLACE_XZ:
+        data = memoryview(lzma.decompress(blob))
+    else:
+        raise RemotePayloadError(f"Unsupported payload operation type {op.type}")
+
+    pos = 0
+    for start_block, num_blocks in op.dst_extents:
+        length = num_blocks * block_size
+        os.pwrite(fd, data[pos:pos + length], start_block * block_size)
+        pos += length
+
+
+def _batch_operations(operations: List[PayloadOperation]) -> List[List[PayloadOperation]]:
+    """Group operations whose data blobs are contiguous into single fetches."""
+    batches: List[List[PayloadOperation]] = []
+    current: List[PayloadOperation] = []
+    current_end = -1
+    current_bytes = 0
+
+    for op in operations:
+        if op.data_length == 0:
+            continue
+        contiguous = op.data_offset == current_end
+        if current and (not contiguous or current_bytes + op.data_length > _MAX_FETCH_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(op)
+        current_end = op.data_offset + op.data_length
+        current_bytes += op.data_length
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class RemotePayloadExtractor:
+    """Pulls selected partitions out of a remote OTA zip without downloading all of it."""
+
+    def __init__(self, url: str, work_dir: str):
+        self.url = url
+        self.work_dir = Path(work_dir)
+        self._total_bytes = 0
+        self._fetched_bytes = 0
+        self._started_at = 0.0
+
+    async def extract(
+        self,
+        wanted: Iterable[str],
+        on_progress: ProgressCallback | None = None,
+    ) -> List[Path]:
+        """Write `<partition>.img` for each wanted partition present in the payload.
+
+        Raises:
+            RemotePayloadError: If the file cannot be read partially
+        """
+        wanted_set = set(wanted)
+        timeout = httpx.Timeout(60.0, connect=15.0)
+        async with httpx.AsyncClient(follow_redirects=True, verify=False, timeout=timeout) as client:
+            reader = RangeReader(client, self.url)
+            await reader.open()
+            payload_offset, _ = await locate_zip_member(reader, PAYLOAD_MEMBER)
+            manifest = await read_payload_manifest(reader, payload_offset)
+
+            selected = [p for p in manifest.partitions if p.name in wanted_set]
+            if not selected:
+                raise RemotePayloadError("No wanted partitions in payload")
+            for partition in selected:
+                unsupported = {op.type for op in partition.operations} - SUPPORTED_OPERATIONS
+                if unsupported:
+                    raise RemotePayloadError(
+                        f"Partition {partition.name} uses unsupported operations {sorted(unsupported)}"
+                    )
+
+            skipped = sorted(p.name for p in manifest.partitions if p.name not in wanted_set)
+            self._total_bytes = sum(p.data_bytes for p in selected)
+            self._started_at = time.monotonic()
+            console.print(
+                f"[blue]Fetching {len(selected)} partition(s) from remote payload "
+                f"({self._total_bytes // (1024**2)}M); skipping {', '.join(skipped) or 'none'}[/blue]"
+            )
+
+            semaphore = asyncio.Semaphore(_PARTITION_CONCURRENCY)
+            progress_task = asyncio.create_task(self._report_progress(on_progress)) if on_progress else None
+            try:
+                async def _bounded(partition: PayloadPartition) -> Path:
+                    async with semaphore:
+                        return await self._write_partition(reader, manifest, partition)
+
+                images = await asyncio.gather(*(_bounded(p) for p in selected))
+            except BaseException:
+                for partition in selected:
+                    (self.work_dir / f"{partition.name}.img").unlink(missing_ok=True)
+                raise
+            finally:
+                if progress_task:
+                    progress_task.cancel()
+                    try:
+                        await progress_task
+                    except asyncio.CancelledError:
+                        pass
+
+        console.print(f"[green]Fetched {len(images)} partition image(s) from remote payload[/green]")
+        return list(images)
+
+    async def _write_partition(
+        self, reader: RangeReader, manifest: PayloadManifest, partition: PayloadPartition
+    ) -> Path:
+        image_path = self.work_dir / f"{partition.name}.img"
+        fd = os.open(image_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, partition.size)
+            for batch in _batch_operations(partition.operations):
+                start = batch[0].data_offset
+                end = batch[-1].data_offset + batch[-1].data_length
+                blob = memoryview(await reader.read(manifest.data_start + start, end - start))
+                for op in batch:
+                    op_blob = blob[op.data_offset - start:op.data_offset - start + op.data_length]
+                    await asyncio.to_thread(_apply_operation, fd, op, op_blob, manifest.block_size)
+                self._fetched_bytes += end - start
+        finally:
+            os.close(fd)
+        console.print(f"[green]Fetched {partition.name}.img ({partition.size // (1024**2)}M)[/green]")
+        return image_path
+
+    async def _report_progress(self, on_progress: ProgressCallback, interval: float = 3.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            elapsed = max(time.monotonic() - self._started_at, 0.001)
+            try:
+                await on_progress(DownloadProgress(
+                    total_bytes=self._total_bytes,
+                    completed_bytes=self._fetched_bytes,
+                    download_speed=int(self._fetched_bytes / elapsed),
+                    connections=_PARTITION_CONCURRENCY,
+                    status="active",
+                    file_name=PAYLOAD_MEMBER,
+                ))
+            except Exception as cb_err:
+                console.print(f"[yellow]Progress callback error (ignored): {cb_err}[/yellow]")
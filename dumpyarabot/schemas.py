@@ -78,6 +78,7 @@ class JobMetadata(BaseModel):
     telegram_context: Optional[Dict[str, Any]] = None  # chat_id, message_id, user_id, url
     progress_history: List[Dict[str, Any]] = Field(default_factory=list)  # List of progress updates
     device_info: Optional[Dict[str, Any]] = None  # Populated after property extraction
+    download_info: Optional[Dict[str, Any]] = None  # Archive size and digests, populated after download
     repository: Optional[Dict[str, Any]] = None  # Populated on successful completion
     error_context: Optional[Dict[str, Any]] = None  # Populated on failure
     start_time: Optional[str] = None  # ISO format
@@ -0,0 +1,95 @@
+"""Scratch roots per tier, so a job's I/O can be spread over several disks.
+
+By default a job does everything in one work dir under WORK_DIR_BASE. With
+SCRATCH_ROOTS, each kind of scratch I/O can get its own roots:
+
+    download   the firmware archive: one large sequential write, read once
+    work       the extracted tree and the git objects: random I/O and hashing
+    small      boot image, device tree and ramdisk work (e.g. a tmpfs)
+
+Each tier can list several roots. A job takes the root of a tier with the
+most free space that still fits what it needs there. A tier without roots
+uses the job's work dir, and the work tier defaults to WORK_DIR_BASE, so
+leaving SCRATCH_ROOTS unset keeps the single-directory layout.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+
+console = Console()
+
+TIER_DOWNLOAD = "download"
+TIER_WORK = "work"
+TIER_SMALL = "small"
+TIERS = (TIER_DOWNLOAD, TIER_WORK, TIER_SMALL)
+
+
+def tier_roots(tier: str) -> List[Path]:
+    """Configured roots of a tier that exist, in configuration order."""
+    configured = settings.SCRATCH_ROOTS.get(tier, [])
+    if not configured and tier == TIER_WORK and settings.WORK_DIR_BASE:
+        configured = [settings.WORK_DIR_BASE]
+    return [Path(root) for root in configured if Path(root).is_dir()]
+
+
+def all_roots() -> List[Path]:
+    """Every scratch root of every tier, without duplicates."""
+    roots: List[Path] = []
+    for tier in TIERS:
+        for root in tier_roots(tier):
+            if root not in roots:
+                roots.append(root)
+    return roots
+
+
+def choose_root(tier: str, need_bytes: int = 0) -> Optional[Path]:
+    """
+    Pick the root of a tier with the most free space.
+
+    Args:
+        tier: One of TIERS
+        need_bytes: Roots with less free space than this are skipped
+
+    Returns:
+        The chosen root, or None if the tier has no root with enough space
+    """
+    best: Optional[Path] = None
+    best_free = -1
+    for root in tier_roots(tier):
+        try:
+            free = shutil.disk_usage(root).free
+        except OSError as e:
+            console.print(f"[yellow]Skipping scratch root {root}: {e}[/yellow]")
+            continue
+        if free >= need_bytes and free > best_free:
+            best, best_free = root, free
+    return best
+
+
+def same_disk(first: Path, second: Path) -> bool:
+    """Whether two paths are on the same filesystem."""
+    return os.stat(first).st_dev == os.stat(second).st_dev
+
+
+def make_tier_dir(tier: str, prefix: str, need_bytes: int = 0) -> Optional[Path]:
+    """
+    Create a private directory on the best root of a tier.
+
+    The caller removes it. Its name starts with prefix, so a
+    ``dump_<job>_`` prefix lets the startup sweep find it after a crash.
+
+    Returns:
+        The new directory, or None if the tier has no root with room;
+        the caller then uses its work dir
+    """
+    root = choose_root(tier, need_bytes)
+    if root is None:
+        return None
+    return Path(tempfile.mkdtemp(prefix=prefix, dir=root))
@@ -0,0 +1,334 @@
+"""Streaming sdat2img for block-based OTAs (``*.new.dat[.br]`` + transfer list).
+
+Many OEM OTAs ship each partition as ``<name>.new.dat.br``: the partition's
+data blocks, brotli-compressed, plus ``<name>.transfer.list`` saying which
+block ranges of the image the data fills. extractor.sh handles them by
+unzipping the archive, running ``brotli -d`` to a full-size ``.new.dat`` and
+then ``sdat2img.py`` to a full-size ``.img``, so every partition passes
+through the disk three times.
+
+Here each partition is decompressed straight out of the zip and written
+into its block ranges of a sparse ``<name>.img``. Blocks the transfer list
+does not fill, and all-zero runs of data, stay holes. Partitions are
+independent, so the caller can convert several at once; each call opens its
+own handle on the archive.
+
+Brotli is decoded with the ``brotli`` module when it is installed, else
+streamed through the ``brotli`` CLI. Without either, ``.br`` partitions are
+left to extractor.sh.
+"""
+
+import shutil
+import subprocess
+import threading
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+try:
+    import brotli
+except ImportError:  # optional; the brotli CLI is the fallback
+    brotli = None  # type: ignore[assignment]
+
+BLOCK_SIZE = 4096
+_CHUNK = 1 << 20
+_ZEROS = memoryview(bytes(_CHUNK))
+
+_TRANSFER_LIST_SUFFIX = ".transfer.list"
+# Commands of a full (non-incremental) OTA's transfer list
+_FULL_OTA_COMMANDS = ("new", "erase", "zero")
+_IMAGE_SUFFIXES = (".img", ".mbn")
+
+
+class UnsupportedTransferList(ValueError):
+    """A transfer list this converter cannot apply, e.g. an incremental OTA's."""
+
+
+@dataclass(frozen=True)
+class TransferList:
+    """The parts of a transfer list that a full OTA uses."""
+
+    version: int
+    # Block ranges [start, end) that the new data fills, in stream order
+    new_ranges: Tuple[Tuple[int, int], ...]
+    # Size of the image in blocks
+    total_blocks: int
+
+
+@dataclass(frozen=True)
+class BlockPartition:
+    """A partition stored as new.dat(.br) and a transfer list in an OTA zip."""
+
+    name: str
+    transfer_list: str
+    data: str
+
+    @property
+    def compressed(self) -> bool:
+        return self.data.endswith(".br")
+
+
+def _parse_rangeset(text: str) -> List[Tuple[int, int]]:
+    values = [int(value) for value in text.split(",")]
+    if values[0] != len(values) - 1 or values[0] % 2:
+        raise UnsupportedTransferList(f"Malformed range set: {text[:40]}")
+    return [(values[i], values[i + 1]) for i in range(1, len(values), 2)]
+
+
+def parse_transfer_list(text: str) -> TransferList:
+    """
+    Parse a full OTA's transfer list.
+
+    Raises:
+        UnsupportedTransferList: The list uses commands of an incremental
+            OTA (move, bsdiff, stash, ...) or is malformed
+    """
+    lines = text.splitlines()
+    try:
+        version = int(lines[0])
+    except (IndexError, ValueError):
+        raise UnsupportedTransferList("Missing transfer list version") from None
+    # v1 has the block count on line 2; v2+ add two stash lines
+    commands = lines[2:] if version == 1 else lines[4:]
+
+    new_ranges: List[Tuple[int, int]] = []
+    total_blocks = 0
+    for line in commands:
+        if not line.strip():
+            continue
+        command, _, rangeset = line.partition(" ")
+        if command not in _FULL_OTA_COMMANDS:
+            raise UnsupportedTransferList(f"Unsupported transfer list command: {command}")
+        ranges = _parse_rangeset(rangeset)
+        total_blocks = max([total_blocks] + [end for _, end in ranges])
+        if command == "new":
+            new_ranges.extend(ranges)
+    return TransferList(version, tuple(new_ranges), total_blocks)
+
+
+def brotli_available() -> bool:
+    """Whether .br partitions can be decoded here."""
+    return brotli is not None or shutil.which("brotli") is not None
+
+
+def find_block_partitions(archive_path: Union[str, Path]) -> List[BlockPartition]:
+    """
+    List the block-based partitions of an OTA zip.
+
+    Returns:
+        The partitions, or [] when the archive is not a block-based OTA this
+        module can handle (not a zip, an A/B payload, split data files, or
+        ``.br`` data without a brotli decoder)
+    """
+    if not zipfile.is_zipfile(archive_path):
+        return []
+    with zipfile.ZipFile(archive_path) as archive:
+        names = set(archive.namelist())
+
+    if any(Path(name).name == "payload.bin" for name in names):
+        return []
+    partitions = []
+    for name in sorted(names):
+        if not name.endswith(_TRANSFER_LIST_SUFFIX):
+            continue
+        base = name[: -len(_TRANSFER_LIST_SUFFIX)]
+        if any(other.startswith(f"{base}.new.dat.") and other != f"{base}.new.dat.br" for other in names):
+            # Split data files (system.new.dat.1, ...)
+            return []
+        for data in (f"{base}.new.dat.br", f"{base}.new.dat"):
+            if data in names:
+                partitions.append(BlockPartition(Path(base).name, name, data))
+                break
+    if any(partition.compressed for partition in partitions) and not brotli_available():
+        return []
+    return partitions
+
+
+def _read_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _brotli_module_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    decompressor = brotli.Decompressor()
+    for chunk in _read_chunks(stream):
+        out = decompressor.process(chunk)
+        if out:
+            yield out
+    if not decompressor.is_finished():
+        raise ValueError("Truncated brotli stream")
+
+
+def _brotli_cli_chunks(archive_path: Path, member: str) -> Iterator[bytes]:
+    process = subprocess.Popen(["brotli", "-dc"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    errors: List[BaseException] = []
+
+    def feed() -> None:
+        # Runs beside the reader so neither pipe fills up; own archive handle
+        try:
+            with zipfile.ZipFile(archive_path) as archive, archive.open(member) as stream:
+                for chunk in _read_chunks(stream):
+                    process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    finished = False
+    try:
+        yield from _read_chunks(process.stdout)
+        finished = True
+    finally:
+        process.stdout.close()
+        if not finished:
+            # The caller stopped early or failed
+            process.kill()
+        returncode = process.wait()
+        feeder.join()
+    if errors:
+        raise errors[0]
+    if returncode != 0:
+        raise ValueError(f"brotli exited with status {returncode}")
+
+
+def _data_chunks(archive: zipfile.ZipFile, archive_path: Path, partition: BlockPartition) -> Iterator[bytes]:
+    if not partition.compressed:
+        with archive.open(partition.data) as stream:
+            yield from _read_chunks(stream)
+    elif brotli is not None:
+        with archive.open(partition.data) as stream:
+            yield from _brotli_module_chunks(stream)
+    else:
+        yield from _brotli_cli_chunks(archive_path, partition.data)
+
+
+def _write_sparse(output: BinaryIO, offset: int, piece: memoryview) -> int:
+    """Write piece at offset, skipping its all-zero blocks. Returns bytes written."""
+    if piece == _ZEROS[: len(piece)]:
+        return 0
+    written = 0
+    run_start = None
+    for position in range(0, len(piece) + BLOCK_SIZE, BLOCK_SIZE):
+        block = piece[position:position + BLOCK_SIZE]
+        if len(block) and block != _ZEROS[: len(block)]:
+            if run_start is None:
+                run_start = position
+            continue
+        if run_start is not None:
+            output.seek(offset + run_start)
+            output.write(piece[run_start:position])
+            written += min(position, len(piece)) - run_start
+            run_start = None
+    return written
+
+
+def write_blocks(chunks: Iterator[bytes], transfer: TransferList, output: BinaryIO) -> int:
+    """
+    Write a new.dat stream into its block ranges of a sparse image.
+
+    Args:
+        chunks: The decompressed new.dat data
+        transfer: Its parsed transfer list
+        output: The image, opened for writing
+
+    Returns:
+        Bytes of data written (all-zero runs are left as holes instead)
+
+    Raises:
+        ValueError: The data ends before the transfer list is filled
+    """
+    output.truncate(transfer.total_blocks * BLOCK_SIZE)
+    written = 0
+    ranges = iter(transfer.new_ranges)
+    offset = remaining = 0
+    for chunk in chunks:
+        view = memoryview(chunk)
+        while len(view):
+            if remaining == 0:
+                block_range = next(ranges, None)
+                if block_range is None:
+                    # More data than ranges; sdat2img ignores the rest too
+                    return written
+                offset, remaining = block_range[0] * BLOCK_SIZE, (block_range[1] - block_range[0]) * BLOCK_SIZE
+                continue
+            piece = view[: min(remaining, len(view), _CHUNK)]
+            written += _write_sparse(output, offset, piece)
+            offset += len(piece)
+            remaining -= len(piece)
+            view = view[len(piece):]
+    if remaining or any(end > start for start, end in ranges):
+        raise ValueError("new.dat ends before its transfer list is filled")
+    return written
+
+
+def convert_partition(archive_path: Union[str, Path], partition: BlockPartition, output_path: Union[str, Path]) -> int:
+    """
+    Convert one partition of an OTA zip into a sparse raw image.
+
+    Args:
+        archive_path: The OTA zip
+        partition: From find_block_partitions
+        output_path: The image to write; removed again if conversion fails
+
+    Returns:
+        Bytes of data written
+    """
+    archive_path, output_path = Path(archive_path), Path(output_path)
+    with zipfile.ZipFile(archive_path) as archive:
+        transfer = parse_transfer_list(archive.read(partition.transfer_list).decode())
+        chunks = _data_chunks(archive, archive_path, partition)
+        try:
+            with open(output_path, "wb") as output:
+                return write_blocks(chunks, transfer, output)
+        except BaseException:
+            output_path.unlink(missing_ok=True)
+            raise
+        finally:
+            # Stops the brotli CLI if the data outlasted the ranges
+            chunks.close()
+
+
+def extract_members(
+    archive_path: Union[str, Path], output_dir: Union[str, Path], partitions: List[BlockPartition]
+) -> List[Path]:
+    """
+    Copy the members of an OTA zip that are not converted partitions into output_dir.
+
+    Plain images (boot.img, radio images, ...) are placed by file name, as
+    extractor.sh does; every other member (META-INF, file_contexts, ...)
+    keeps its path in the zip. The partitions' data, transfer lists and
+    patch files, their images, and existing files are left alone.
+
+    Returns:
+        The files written
+    """
+    output_dir = Path(output_dir)
+    root = output_dir.resolve()
+    converted = {f"{partition.name}.img" for partition in partitions}
+    consumed = set()
+    for partition in partitions:
+        base = partition.transfer_list[: -len(_TRANSFER_LIST_SUFFIX)]
+        consumed.update((partition.transfer_list, partition.data, f"{base}.patch.dat"))
+
+    written = []
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            name = Path(info.filename).name
+            if info.is_dir() or info.filename in consumed or name in converted:
+                continue
+            target = output_dir / (name if name.endswith(_IMAGE_SUFFIXES) else info.filename)
+            if not target.resolve().is_relative_to(root) or target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with archive.open(info) as source, open(target, "wb") as output:
+                shutil.copyfileobj(source, output, _CHUNK)
+            written.append(target)
+    return written
@@ -0,0 +1,135 @@
+"""Resolve file-hosting share links into direct download URLs.
+
+Google Drive and MediaFire pages wrap the actual file behind an HTML page
+(Drive's virus-scan confirmation form, MediaFire's download button). Resolving
+them here lets the regular aria2 path fetch the file with multiple
+connections and live progress, instead of a single-stream helper tool.
+
+Resolvers return None when the page doesn't look like they expect, so the
+caller can fall back to the dedicated tool.
+"""
+
+import base64
+import html
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import httpx
+from rich.console import Console
+
+console = Console()
+
+_DRIVE_DOWNLOAD_URL = "https://drive.usercontent.google.com/download"
+_DRIVE_ID_PATTERNS = [
+    re.compile(r"/file/d/([\w-]{10,})"),
+    re.compile(r"/d/([\w-]{10,})"),
+]
+_DRIVE_FORM_RE = re.compile(r'<form[^>]*id="download-form"[^>]*action="([^"]+)"', re.IGNORECASE)
+_HIDDEN_INPUT_RE = re.compile(
+    r'<input[^>]*type="hidden"[^>]*name="([^"]+)"[^>]*value="([^"]*)"', re.IGNORECASE
+)
+
+_MEDIAFIRE_BUTTON_RE = re.compile(r'<a[^>]*id="downloadButton"[^>]*>', re.IGNORECASE)
+_HREF_RE = re.compile(r'href="(https?://[^"]+)"', re.IGNORECASE)
+_SCRAMBLED_RE = re.compile(r'data-scrambled-url="([^"]+)"', re.IGNORECASE)
+
+_BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+}
+_RESOLVE_TIMEOUT = 30.0
+
+
+def google_drive_file_id(url: str) -> Optional[str]:
+    """Extract the file ID from a Drive share link, or None for folders and unknown forms."""
+    parsed = urlparse(url)
+    if "/folders/" in parsed.path:
+        return None
+    for pattern in _DRIVE_ID_PATTERNS:
+        match = pattern.search(parsed.path)
+        if match:
+            return match.group(1)
+    ids = parse_qs(parsed.query).get("id")
+    return ids[0] if ids else None
+
+
+def _is_html(response: httpx.Response) -> bool:
+    return "text/html" in response.headers.get("content-type", "")
+
+
+async def resolve_google_drive(url: str) -> Optional[str]:
+    """Turn a Drive share link into a direct download URL.
+
+    Files too large for Drive's virus scan come back as an HTML form whose
+    hidden fields (confirm token, uuid) authorize the real download; small
+    files are served directly.
+    """
+    file_id = google_drive_file_id(url)
+    if not file_id:
+        return None
+
+    direct = f"{_DRIVE_DOWNLOAD_URL}?{urlencode({'id': file_id, 'export': 'download'})}"
+    try:
+        async with httpx.AsyncClient(
+            follow_redirects=True, headers=_BROWSER_HEADERS, timeout=_RESOLVE_TIMEOUT
+        ) as client:
+            async with client.stream("GET", direct) as response:
+                if response.status_code >= 400:
+                    console.print(f"[yellow]Google Drive returned HTTP {response.status_code} for {file_id}[/yellow]")
+                    return None
+                if not _is_html(response):
+                    return str(response.url)
+                page = (await response.aread()).decode(errors="replace")
+    except httpx.HTTPError as e:
+        console.print(f"[yellow]Google Drive link resolution failed: {e}[/yellow]")
+        return None
+
+    form = _DRIVE_FORM_RE.search(page)
+    if not form:
+        # Quota exceeded, private file, or a page layout we don't know
+        return None
+
+    action = html.unescape(form.group(1))
+    params = {name: html.unescape(value) for name, value in _HIDDEN_INPUT_RE.findall(page)}
+    if "id" not in params:
+        return None
+    return f"{action}?{urlencode(params)}"
+
+
+async def resolve_mediafire(url: str) -> Optional[str]:
+    """Turn a MediaFire file page into its direct download URL."""
+    try:
+        async with httpx.AsyncClient(
+            follow_redirects=True, headers=_BROWSER_HEADERS, timeout=_RESOLVE_TIMEOUT
+        ) as client:
+            async with client.stream("GET", url) as response:
+                if response.status_code >= 400:
+                    console.print(f"[yellow]MediaFire returned HTTP {response.status_code}[/yellow]")
+                    return None
+                if not _is_html(response):
+                    # Some links already redirect straight to the file
+                    return str(response.url)
+                page = (await response.aread()).decode(errors="replace")
+    except httpx.HTTPError as e:
+        console.print(f"[yellow]MediaFire link resolution failed: {e}[/yellow]")
+        return None
+
+    button = _MEDIAFIRE_BUTTON_RE.search(page)
+    if not button:
+        return None
+    tag = button.group(0)
+
+    href = _HREF_RE.search(tag)
+    if href:
+        return html.unescape(href.group(1))
+
+    # Newer pages obfuscate the link as base64 in data-scrambled-url
+    scrambled = _SCRAMBLED_RE.search(tag)
+    if scrambled:
+        try:
+            decoded = base64.b64decode(scrambled.group(1)).decode()
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if decoded.startswith(("http://", "https://")):
+            return decoded
+    return None
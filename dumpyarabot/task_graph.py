@@ -0,0 +1,116 @@
+"""Bounded-concurrency execution of a small dependency graph of async steps.
+
+Used for post-extraction work where most steps are independent
+subprocesses: each node starts as soon as the nodes it depends on have
+finished and a slot is free.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+from rich.console import Console
+
+console = Console()
+
+
+@dataclass
+class TaskNode:
+    """One step of a TaskGraph."""
+
+    name: str
+    func: Callable[[], Awaitable[None]]
+    after: Sequence[str] = ()
+
+
+@dataclass
+class TaskGraphResult:
+    """Outcome of TaskGraph.run."""
+
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per finished node
+    failed: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)  # a dependency failed
+    elapsed: float = 0.0
+
+
+class TaskGraph:
+    """Runs async steps in dependency order, several at a time."""
+
+    def __init__(self) -> None:
+        self._nodes: Dict[str, TaskNode] = {}
+
+    def add(self, name: str, func: Callable[[], Awaitable[None]], after: Sequence[str] = ()) -> None:
+        """
+        Add a step.
+
+        Args:
+            name: Unique name, used in logs, timings and by dependent steps
+            func: Coroutine function that does the step
+            after: Names of steps that must finish first; they must be added
+                before this one, which also keeps the graph acyclic
+        """
+        if name in self._nodes:
+            raise ValueError(f"Duplicate task {name}")
+        missing = [dep for dep in after if dep not in self._nodes]
+        if missing:
+            raise ValueError(f"Task {name} depends on unknown task(s): {', '.join(missing)}")
+        self._nodes[name] = TaskNode(name, func, tuple(after))
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    async def run(self, parallelism: int) -> TaskGraphResult:
+        """
+        Run all steps, at most parallelism at once.
+
+        A step that raises is logged and its dependents are skipped; the
+        other steps still run. Cancelling run() cancels the running steps.
+
+        Args:
+            parallelism: Maximum number of steps running at the same time
+
+        Returns:
+            TaskGraphResult with per-step timings
+        """
+        result = TaskGraphResult()
+        slots = asyncio.Semaphore(max(parallelism, 1))
+        done: Dict[str, asyncio.Event] = {name: asyncio.Event() for name in self._nodes}
+        succeeded: Dict[str, bool] = {}
+
+        async def run_node(node: TaskNode) -> None:
+            try:
+                for dep in node.after:
+                    await done[dep].wait()
+                if not all(succeeded[dep] for dep in node.after):
+                    succeeded[node.name] = False
+                    result.skipped.append(node.name)
+                    return
+
+                async with slots:
+                    started = time.monotonic()
+                    try:
+                        await node.func()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        console.print(f"[yellow]{node.name} failed: {e}[/yellow]")
+                        succeeded[node.name] = False
+                        result.failed.append(node.name)
+                        return
+                    result.timings[node.name] = time.monotonic() - started
+                    succeeded[node.name] = True
+            finally:
+                done[node.name].set()
+
+        started = time.monotonic()
+        tasks = [asyncio.create_task(run_node(node)) for node in self._nodes.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        result.elapsed = time.monotonic() - started
+        return result
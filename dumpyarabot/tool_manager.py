@@ -0,0 +1,318 @@
+"""Pinned, pre-installed environments for the Python tools jobs launch.
+
+Jobs used to start dumpyara, vmlinux-to-elf, gdown, mediafire-dl and
+aospdtgen through ``uvx``, so every job resolved the package again and, for
+branch refs like ``vmlinux-to-elf@master``, could rebuild the environment
+mid-dump. The worker now installs each tool once into a shared per-host
+cache (``TOOL_CACHE_DIR``) at startup. Each environment lives in a
+directory keyed by its exact requirement, so changing a pin installs
+alongside instead of mutating an environment another worker is using.
+Jobs then run the cached executables directly, with no resolution or
+network access.
+
+A git tool configured with a branch is frozen to the commit the branch
+points at when a worker on the host first resolves it. The commit is kept in
+``pins.json`` in the cache, and both the cached environment and the uvx
+fallback use it until the configured version changes or the cache is
+cleared.
+
+A capability map of the tools (cached environments plus the system tools
+the pipeline shells out to) is written to ``capabilities.json`` in the
+cache, with the exact package versions the environments resolved to.
+A tool whose install failed falls back to its pinned ``uvx`` command, run
+with ``--offline`` once a startup run has put the tool in uv's cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from rich.console import Console
+
+from dumpyarabot.config import settings
+from dumpyarabot.process_utils import run_command
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+console = Console()
+
+_COMPLETE_MARKER = ".complete"
+_INSTALL_TIMEOUT = 900.0
+_RESOLVE_TIMEOUT = 60.0
+_PINS_FILE = "pins.json"
+_COMMIT_SHA = re.compile(r"[0-9a-f]{40}")
+
+# System tools the pipeline calls directly, reported in the capability map
+SYSTEM_TOOLS = (
+    "aria2c", "megatools", "7zz", "dtc", "brotli",
+    "unpackbootimg", "unlz4", "git", "uv", "uvx",
+)
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """A Python tool and the executables it provides."""
+
+    name: str
+    source: str  # PyPI name, or git URL without the ref
+    default_version: str
+    executables: Tuple[str, ...]
+
+    @property
+    def is_git(self) -> bool:
+        return self.source.startswith("git+")
+
+    def requirement(self, version: str) -> str:
+        if self.is_git:
+            return f"{self.name} @ {self.source}@{version}"
+        return f"{self.source}=={version}"
+
+    def uvx_from(self, version: str) -> str:
+        if self.is_git:
+            return f"{self.source}@{version}"
+        return f"{self.source}=={version}"
+
+
+# Default pins. Git tools without release tags name a branch, which each host
+# freezes to a commit the first time it resolves it (see pins.json).
+TOOLS: Dict[str, ToolSpec] = {spec.name: spec for spec in (
+    ToolSpec("dumpyara", "git+https://github.com/deadman96385/dumpyara",
+             "b5195ce980fad0e881f642dada16ddda103f467a", ("dumpyara",)),
+    ToolSpec("vmlinux-to-elf", "git+https://github.com/marin-m/vmlinux-to-elf",
+             "master", ("vmlinux-to-elf", "kallsyms-finder")),
+    ToolSpec("gdown", "gdown", "5.2.0", ("gdown",)),
+    ToolSpec("mediafire-dl", "git+https://github.com/Juvenal-Yescas/mediafire-dl",
+             "master", ("mediafire-dl",)),
+    ToolSpec("aospdtgen", "aospdtgen", "1.1.1", ("aospdtgen",)),
+)}
+
+_EXECUTABLE_TOOL: Dict[str, str] = {exe: spec.name for spec in TOOLS.values() for exe in spec.executables}
+
+
+class ToolManager:
+    """Installs the pinned tool environments and resolves tool commands."""
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self._cache_dir = cache_dir
+        self.executables: Dict[str, Path] = {}
+        self.capabilities: Dict[str, Dict[str, object]] = {}
+        # "<tool>@<branch>" -> the commit it was frozen to on this host
+        self.pins: Dict[str, str] = {}
+        # Tools whose uvx fallback is in uv's cache and can run offline
+        self._uvx_warm: Set[str] = set()
+        self._prepared = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir or tool_cache_dir()
+
+    def configured_version(self, name: str) -> str:
+        """Version of a tool as configured (TOOL_VERSIONS, else the default pin)."""
+        return settings.TOOL_VERSIONS.get(name, TOOLS[name].default_version)
+
+    def version(self, name: str) -> str:
+        """Version of a tool to install and run: the configured one, with a branch frozen to its commit."""
+        configured = self.configured_version(name)
+        return self.pins.get(f"{name}@{configured}", configured)
+
+    def env_dir(self, name: str) -> Path:
+        """Cache directory of a tool's environment at its configured version."""
+        requirement = TOOLS[name].requirement(self.version(name))
+        digest = hashlib.sha256(requirement.encode()).hexdigest()[:12]
+        return self.cache_dir / f"{name}-{digest}"
+
+    async def prepare(self) -> float:
+        """
+        Install missing tool environments and build the capability map.
+
+        Only the first call in a process does any work; later calls return
+        at once. An install that fails is not retried until the worker
+        restarts; that tool runs through uvx meanwhile.
+
+        Returns:
+            Seconds spent resolving tools in this call
+        """
+        started = time.monotonic()
+        async with self._lock:
+            if self._prepared:
+                return time.monotonic() - started
+
+            uv = shutil.which("uv")
+            if uv is None or fcntl is None:
+                console.print("[yellow]uv not found, tools will run through uvx[/yellow]")
+            else:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                await self._freeze_branches()
+                for name in TOOLS:
+                    try:
+                        await self._ensure_environment(uv, name)
+                    except Exception as e:
+                        console.print(f"[yellow]Could not install {name}, falling back to uvx: {e}[/yellow]")
+                        await self._warm_uvx(name)
+
+            await self._write_capabilities()
+            self._prepared = True
+
+        elapsed = time.monotonic() - started
+        console.print(f"[green]Tool environments ready in {elapsed:.1f}s "
+                      f"({len(self.executables)} cached executables)[/green]")
+        return elapsed
+
+    async def _freeze_branches(self) -> None:
+        """Resolve the branches git tools are configured with to commits, once per host."""
+        pins_path = self.cache_dir / _PINS_FILE
+        lock_fd = os.open(pins_path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Workers starting together must agree on the commit
+            await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+            try:
+                self.pins = json.loads(pins_path.read_text())
+            except (OSError, ValueError):
+                self.pins = {}
+
+            changed = False
+            for name, spec in TOOLS.items():
+                branch = self.configured_version(name)
+                if not spec.is_git or _COMMIT_SHA.fullmatch(branch) or f"{name}@{branch}" in self.pins:
+                    continue
+                result = await run_command(
+                    "git", "ls-remote", spec.source[len("git+"):], branch,
+                    timeout=_RESOLVE_TIMEOUT, description=f"Resolving {name}@{branch}",
+                )
+                commit = result.stdout.split()[0] if result.success and result.stdout.strip() else None
+                if commit is None or not _COMMIT_SHA.fullmatch(commit):
+                    console.print(f"[yellow]Could not resolve {name}@{branch}, using the branch[/yellow]")
+                    continue
+                console.print(f"[blue]Pinned {name}@{branch} to {commit}[/blue]")
+                self.pins[f"{name}@{branch}"] = commit
+                changed = True
+
+            if changed:
+                temp = pins_path.with_name(f".{pins_path.name}.{os.getpid()}")
+                temp.write_text(json.dumps(self.pins, indent=2, sort_keys=True))
+                os.replace(temp, pins_path)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    async def _warm_uvx(self, name: str) -> None:
+        """Put a tool's pinned uvx fallback into uv's cache, so jobs can run it offline."""
+        if shutil.which("uvx") is None:
+            return
+        spec = TOOLS[name]
+        result = await run_command(
+            "uvx", "--from", spec.uvx_from(self.version(name)), spec.executables[0], "--help",
+            timeout=_INSTALL_TIMEOUT, quiet=True, description=f"Caching {name} for uvx",
+        )
+        if result.success:
+            self._uvx_warm.add(name)
+
+    async def _ensure_environment(self, uv: str, name: str) -> None:
+        spec = TOOLS[name]
+        env_dir = self.env_dir(name)
+        lock_fd = os.open(env_dir.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Another worker on the host may be installing the same pin
+            await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+            if not (env_dir / _COMPLETE_MARKER).exists():
+                console.print(f"[blue]Installing {name} {self.version(name)} into {env_dir}[/blue]")
+                shutil.rmtree(env_dir, ignore_errors=True)
+                await run_command(uv, "venv", "--quiet", str(env_dir), timeout=_INSTALL_TIMEOUT,
+                                  check=True, description=f"Creating {name} environment")
+                await run_command(
+                    uv, "pip", "install", "--quiet", "--python", str(env_dir / "bin" / "python"),
+                    spec.requirement(self.version(name)),
+                    timeout=_INSTALL_TIMEOUT, check=True, description=f"Installing {name}",
+                )
+                (env_dir / _COMPLETE_MARKER).write_text(spec.requirement(self.version(name)) + "\n")
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+        for executable in spec.executables:
+            path = env_dir / "bin" / executable
+            if path.exists():
+                self.executables[executable] = path
+
+    async def _resolved_packages(self, name: str) -> List[str]:
+        """The environment's installed distributions, as ``uv pip freeze`` prints them."""
+        uv = shutil.which("uv")
+        env_dir = self.env_dir(name)
+        if uv is None or not (env_dir / _COMPLETE_MARKER).exists():
+            return []
+        result = await run_command(uv, "pip", "freeze", "--python", str(env_dir / "bin" / "python"),
+                                   timeout=60.0, quiet=True)
+        return result.stdout.splitlines() if result.success else []
+
+    async def _write_capabilities(self) -> None:
+        capabilities: Dict[str, Dict[str, object]] = {}
+        for name, spec in TOOLS.items():
+            packages = await self._resolved_packages(name)
+            resolved = next((line for line in packages if line.lower().startswith(name.lower())), None)
+            for executable in spec.executables:
+                capabilities[executable] = {
+                    "available": executable in self.executables or shutil.which("uvx") is not None,
+                    "cached": executable in self.executables,
+                    "tool": name,
+                    "version": self.version(name),
+                    "resolved": resolved,
+                }
+        for executable in SYSTEM_TOOLS:
+            path = shutil.which(executable)
+            capabilities[executable] = {"available": path is not None, "path": path}
+        self.capabilities = capabilities
+
+        if self.cache_dir.is_dir():
+            target = self.cache_dir / "capabilities.json"
+            temp = target.with_name(f".{target.name}.{os.getpid()}")
+            temp.write_text(json.dumps(capabilities, indent=2, sort_keys=True))
+            os.replace(temp, target)
+
+    def command(self, executable: str) -> List[str]:
+        """
+        The argv prefix that runs one of the tools' executables.
+
+        Args:
+            executable: Executable name, e.g. "kallsyms-finder"
+
+        Returns:
+            The cached executable, or the pinned uvx command when the tool
+            has no cached environment (offline once its cache is warm)
+        """
+        path = self.executables.get(executable)
+        if path is None and (self.env_dir(_EXECUTABLE_TOOL[executable]) / _COMPLETE_MARKER).exists():
+            # Installed by another worker on this host since we prepared
+            candidate = self.env_dir(_EXECUTABLE_TOOL[executable]) / "bin" / executable
+            if candidate.exists():
+                path = self.executables[executable] = candidate
+        if path is not None:
+            return [str(path)]
+        name = _EXECUTABLE_TOOL[executable]
+        uvx = ["uvx", "--offline"] if name in self._uvx_warm else ["uvx"]
+        return [*uvx, "--from", TOOLS[name].uvx_from(self.version(name)), executable]
+
+
+def tool_cache_dir() -> Path:
+    """The shared tool cache (TOOL_CACHE_DIR, else ~/.cache/dumpyarabot/tools)."""
+    if settings.TOOL_CACHE_DIR:
+        return Path(settings.TOOL_CACHE_DIR)
+    return Path.home() / ".cache" / "dumpyarabot" / "tools"
+
+
+tool_manager = ToolManager()
+
+
+def tool_command(executable: str) -> List[str]:
+    """Shortcut for ``tool_manager.command``."""
+    return tool_manager.command(executable)
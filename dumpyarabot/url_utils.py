@@ -1,7 +1,8 @@
 """URL validation and normalization utilities."""
 
+from dataclasses import dataclass
 from typing import Optional, Tuple
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import httpx
 from pydantic import AnyHttpUrl, TypeAdapter, ValidationError
@@ -9,6 +10,25 @@ from pydantic import AnyHttpUrl, TypeAdapter, ValidationError
 
 HTTP_URL_ADAPTER = TypeAdapter(AnyHttpUrl)
 
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@dataclass
+class RemoteFileInfo:
+    """Validators and size of a remote file, as reported by the server."""
+
+    url: str
+    final_url: str
+    content_length: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    accept_ranges: bool = False
+
+    @property
+    def has_validators(self) -> bool:
+        """Whether the server sent enough to tell two versions of the file apart."""
+        return bool(self.etag or self.last_modified)
+
 
 async def validate_and_normalize_url(url_str: str) -> Tuple[bool, Optional[str], Optional[str]]:
     """
@@ -92,3 +112,90 @@ async def validate_firmware_url(url_str: str, check_accessibility: bool = True)
             return False, normalized_url, "URL is not accessible"
 
     return True, normalized_url, None
+
+
+def normalize_download_url(url: str) -> str:
+    """
+    Normalize a download URL so equivalent spellings compare equal.
+
+    The scheme and host are lowercased, default ports and fragments are
+    dropped, and query parameters are sorted. The path is kept as-is since
+    servers may treat it case-sensitively.
+
+    Args:
+        url: The URL to normalize
+
+    Returns:
+        The normalized URL string, or the input unchanged if it cannot be parsed
+    """
+    try:
+        parsed = urlparse(url.strip())
+        if not parsed.scheme or not parsed.netloc:
+            return url
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or "").lower()
+        port = parsed.port
+    except ValueError:
+        return url
+
+    netloc = host
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, parsed.path or "/", "", query, ""))
+
+
+async def probe_remote_file(url: str, timeout: float = 15.0) -> Optional[RemoteFileInfo]:
+    """
+    Fetch the size and cache validators of a remote file without downloading it.
+
+    A HEAD request is tried first. Some CDNs reject HEAD, so a one-byte ranged
+    GET is used as a fallback; its Content-Range carries the full size.
+
+    Args:
+        url: The URL to probe
+        timeout: Request timeout in seconds
+
+    Returns:
+        RemoteFileInfo if the server answered with a success status, None otherwise
+    """
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, verify=False) as client:
+            response = await client.head(url, timeout=timeout)
+            if response.status_code >= 400:
+                async with client.stream(
+                    "GET", url, headers={"Range": "bytes=0-0"}, timeout=timeout
+                ) as response:
+                    if response.status_code >= 400:
+                        return None
+                    return _remote_file_info_from_response(url, response)
+            return _remote_file_info_from_response(url, response)
+    except Exception:
+        return None
+
+
+def _remote_file_info_from_response(url: str, response: httpx.Response) -> RemoteFileInfo:
+    """Build a RemoteFileInfo from HEAD or ranged-GET response headers."""
+    headers = response.headers
+    content_length: Optional[int] = None
+
+    content_range = headers.get("content-range", "")
+    if response.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            content_length = int(total)
+    elif headers.get("content-length", "").isdigit():
+        content_length = int(headers["content-length"])
+
+    return RemoteFileInfo(
+        url=url,
+        final_url=str(response.url),
+        content_length=content_length,
+        etag=headers.get("etag"),
+        last_modified=headers.get("last-modified"),
+        accept_ranges=(
+            response.status_code == 206
+            or headers.get("accept-ranges", "").lower() == "bytes"
+        ),
+    )
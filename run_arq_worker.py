@@ -26,6 +26,7 @@ from dumpyarabot.arq_config import (
     WorkerSettings,
     after_job_end,
     on_job_start,
+    on_shutdown,
     on_startup,
     shutdown_arq,
 )
@@ -61,6 +62,7 @@ class ARQWorkerManager:
                 allow_abort_jobs=WorkerSettings.allow_abort_jobs,
                 queue_name=WorkerSettings.queue_name,
                 on_startup=on_startup,
+                on_shutdown=on_shutdown,
                 on_job_start=on_job_start,
                 after_job_end=after_job_end,
             )
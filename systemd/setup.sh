@@ -26,6 +26,7 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 UNITS=(
     dumpyarabot-redis.service
+    dumpyarabot-aria2.service
     dumpyarabot-bot.service
     dumpyarabot-worker@.service
     dumpyarabot.target
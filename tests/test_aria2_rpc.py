@@ -0,0 +1,160 @@
+"""Unit tests for the asyncio aria2 JSON-RPC WebSocket client."""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from dumpyarabot.aria2_manager import Aria2Manager
+from dumpyarabot.aria2_rpc import (
+    OP_CLOSE,
+    OP_TEXT,
+    Aria2RpcClient,
+    Aria2RpcError,
+    encode_frame,
+    read_frame,
+    websocket_accept,
+)
+
+
+class _FakeAria2Daemon:
+    """Minimal aria2 stand-in speaking JSON-RPC over a WebSocket."""
+
+    def __init__(self, tmp_path, finish_after: float = 0.05, fail: bool = False):
+        self.tmp_path = tmp_path
+        self.finish_after = finish_after
+        self.fail = fail
+        self.calls: list = []
+        self.status = "active"
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/jsonrpc"
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode()
+        key = next(
+            line.split(":", 1)[1].strip()
+            for line in head.split("\r\n")
+            if line.lower().startswith("sec-websocket-key")
+        )
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n"
+            ).encode()
+        )
+        await writer.drain()
+
+        async def send(message):
+            writer.write(encode_frame(OP_TEXT, json.dumps(message).encode(), mask=False))
+            await writer.drain()
+
+        async def finish(gid):
+            await asyncio.sleep(self.finish_after)
+            self.status = "error" if self.fail else "complete"
+            method = "aria2.onDownloadError" if self.fail else "aria2.onDownloadComplete"
+            await send({"jsonrpc": "2.0", "method": method, "params": [{"gid": gid}]})
+
+        try:
+            while True:
+                _, opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    break
+                request = json.loads(payload)
+                method, params = request["method"], request["params"]
+                self.calls.append((method, params))
+                result = "OK"
+                if method == "aria2.getVersion":
+                    result = {"version": "1.37.0"}
+                elif method == "aria2.addUri":
+                    result = "2089b05ecca3d829"
+                    asyncio.create_task(finish(result))
+                elif method == "aria2.tellStatus":
+                    result = {
+                        "status": self.status,
+                        "totalLength": "4",
+                        "completedLength": "4" if self.status == "complete" else "1",
+                        "downloadSpeed": "0",
+                        "connections": "1",
+                        "errorCode": "3" if self.fail else "0",
+                        "errorMessage": "Resource not found" if self.fail else "",
+                        "files": [{"path": str(self.tmp_path / "fw.zip")}],
+                    }
+                elif method == "aria2.unknown":
+                    await send({"jsonrpc": "2.0", "id": request["id"], "error": {"code": 1, "message": "No such method"}})
+                    continue
+                await send({"jsonrpc": "2.0", "id": request["id"], "result": result})
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+
+
+async def test_call_round_trip_and_rpc_error(tmp_path):
+    async with _FakeAria2Daemon(tmp_path) as daemon:
+        client = Aria2RpcClient(daemon.url, secret="s3cret")
+        await client.connect()
+        try:
+            assert await client.call("aria2.getVersion") == {"version": "1.37.0"}
+            with pytest.raises(Aria2RpcError, match="No such method"):
+                await client.call("aria2.unknown")
+        finally:
+            await client.close()
+
+    # The RPC secret is sent as the leading token parameter.
+    assert daemon.calls[0] == ("aria2.getVersion", ["token:s3cret"])
+
+
+async def test_download_ends_on_completion_notification(tmp_path):
+    (tmp_path / "fw.zip").write_bytes(b"data")
+
+    async with _FakeAria2Daemon(tmp_path) as daemon:
+        started = time.monotonic()
+        async with Aria2Manager(str(tmp_path), rpc_url=daemon.url, rpc_secret="") as aria2:
+            snapshots = [p async for p in aria2.download("https://example.com/fw.zip", poll_interval=30.0)]
+        elapsed = time.monotonic() - started
+
+    # Finished on the push notification, long before the 30s poll interval.
+    assert elapsed < 5
+    assert snapshots[-1].is_complete
+    assert aria2.get_downloaded_file_path() == str(tmp_path / "fw.zip")
+    methods = [method for method, _ in daemon.calls]
+    assert "aria2.shutdown" not in methods  # shared daemon is left running
+    add_params = next(params for method, params in daemon.calls if method == "aria2.addUri")
+    assert add_params[1]["dir"] == str(tmp_path)
+
+
+async def test_download_error_notification_raises(tmp_path):
+    async with _FakeAria2Daemon(tmp_path, fail=True) as daemon:
+        async with Aria2Manager(str(tmp_path), rpc_url=daemon.url, rpc_secret="") as aria2:
+            with pytest.raises(RuntimeError, match="Resource not found"):
+                async for _ in aria2.download("https://example.com/fw.zip", poll_interval=30.0):
+                    pass
+
+
+async def test_unwatched_notifications_are_bounded():
+    client = Aria2RpcClient("ws://127.0.0.1:6800/jsonrpc")
+
+    def notify(gid):
+        client._dispatch(json.dumps({"method": "aria2.onDownloadComplete", "params": [{"gid": gid}]}).encode())
+
+    # Other clients' downloads on a shared daemon
+    for index in range(10_000):
+        notify(f"other{index}")
+    # One that raced ahead of our addUri response
+    notify("ours")
+
+    assert len(client._early_events) <= 256
+    assert client.watch("ours").result() == "complete"
@@ -0,0 +1,32 @@
+"""Unit tests for splitting download bandwidth between concurrent jobs."""
+
+from dumpyarabot.bandwidth_scheduler import (
+    PRIORITY_FOREGROUND,
+    PRIORITY_PREFETCH,
+    compute_download_limits,
+)
+
+
+def test_global_cap_is_split_by_priority_weight():
+    limits = compute_download_limits(
+        {"fg": PRIORITY_FOREGROUND, "prefetch": PRIORITY_PREFETCH}, global_limit=500, job_limit=0
+    )
+
+    assert limits == {"fg": 400, "prefetch": 100}
+
+
+def test_job_cap_surplus_goes_to_other_downloads():
+    limits = compute_download_limits(
+        {"a": PRIORITY_FOREGROUND, "b": PRIORITY_FOREGROUND, "c": PRIORITY_PREFETCH},
+        global_limit=900,
+        job_limit=300,
+    )
+
+    # a and b hit the per-job cap; c picks up what they couldn't use.
+    assert limits == {"a": 300, "b": 300, "c": 300}
+
+
+def test_without_global_cap_only_job_cap_applies():
+    assert compute_download_limits({"a": 4, "b": 1}, global_limit=0, job_limit=0) == {"a": 0, "b": 0}
+    assert compute_download_limits({"a": 4}, global_limit=0, job_limit=250) == {"a": 250}
+    assert compute_download_limits({}, global_limit=100, job_limit=0) == {}
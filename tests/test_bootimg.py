@@ -0,0 +1,124 @@
+"""Unit tests for the in-process boot image parser and ramdisk extractor."""
+
+import bz2
+import gzip
+import lzma
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from dumpyarabot import bootimg
+from dumpyarabot.bootimg import extract_cpio, extract_ramdisks, lz4_block_decompress, parse_boot_image, unpack_boot_image
+
+
+def _cpio(entries):
+    """Build a newc archive from (name, mode, data) tuples."""
+    out = b""
+    for ino, (name, mode, data) in enumerate(entries + [("TRAILER!!!", 0, b"")], start=1):
+        encoded = name.encode() + b"\0"
+        fields = [ino, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(encoded), 0]
+        header = b"070701" + b"".join(b"%08x" % value for value in fields)
+        out += header + encoded
+        out += b"\0" * (-len(out) % 4) + data
+        out += b"\0" * (-len(out) % 4)
+    return out
+
+
+def _pad(data, page):
+    return data + b"\0" * (-len(data) % page)
+
+
+def _boot_v2(kernel, ramdisk, dtb, page=2048):
+    header = bootimg._BOOT_V0.pack(
+        b"ANDROID!", len(kernel), 0x10008000, len(ramdisk), 0x11000000, 0, 0x10f00000,
+        0x10000100, page, 2, 0, b"board", b"console=ttyMSM0", b"", b"",
+    )
+    header += bootimg._BOOT_V1_EXTRA.pack(0, 0, 1660) + bootimg._BOOT_V2_EXTRA.pack(len(dtb), 0x11f00000)
+    return b"".join(_pad(part, page) for part in (header, kernel, ramdisk, dtb))
+
+
+RAMDISK_TREE = [
+    ("init", 0o100755, b"#!init"),
+    ("system", 0o040755, b""),
+    ("system/etc/init.rc", 0o100644, b"on boot\n"),
+    ("bin", 0o120777, b"system/bin"),
+    ("../escape", 0o100644, b"x"),
+]
+
+
+def test_lz4_block_overlapping_match():
+    block = bytes([0x44]) + b"abcd" + b"\x04\x00" + bytes([0x10]) + b"x"
+
+    assert lz4_block_decompress(block) == b"abcdabcdabcdx"
+
+
+def test_boot_v2_sections_and_gzip_ramdisk(tmp_path):
+    image = tmp_path / "boot.img"
+    image.write_bytes(_boot_v2(b"KERNEL" * 100, gzip.compress(_cpio(RAMDISK_TREE)), b"\xd0\x0d\xfe\xed"))
+
+    layout = unpack_boot_image(image, tmp_path / "boot")
+    assert layout.header_version == 2 and layout.page_size == 2048
+    assert (tmp_path / "boot" / "boot.img-kernel").read_bytes() == b"KERNEL" * 100
+    assert (tmp_path / "boot" / "boot.img-dtb").read_bytes() == b"\xd0\x0d\xfe\xed"
+    assert (tmp_path / "boot" / "boot.img-cmdline").read_text() == "console=ttyMSM0\n"
+    assert (tmp_path / "boot" / "boot.img-base").read_text() == "10000000\n"
+
+    root = tmp_path / "boot" / "ramdisk"
+    assert extract_ramdisks(image, root) == 4
+    assert (root / "init").read_bytes() == b"#!init"
+    assert (root / "system" / "etc" / "init.rc").read_text() == "on boot\n"
+    assert (root / "bin").is_symlink()
+    assert not (tmp_path / "boot" / "escape").exists()
+
+
+def test_vendor_boot_v4_fragments_are_overlaid(tmp_path):
+    first = gzip.compress(_cpio([("first.rc", 0o100644, b"1")]))
+    second = _cpio([("second.rc", 0o100644, b"2")])
+    ramdisk = first + second
+    page = 4096
+    table = b"".join(
+        bootimg._VENDOR_RAMDISK_ENTRY.pack(len(data), offset, 1, name, b"\0" * 64)
+        for data, offset, name in ((first, 0, b"platform"), (second, len(first), b""))
+    )
+    header = bootimg._VENDOR_V3.pack(
+        b"VNDRBOOT", 4, page, 0x10008000, 0x11000000, len(ramdisk), b"", 0x10000100, b"",
+        2128, 0, 0,
+    ) + bootimg._VENDOR_V4_EXTRA.pack(len(table), 2, bootimg._VENDOR_RAMDISK_ENTRY.size, 0)
+    image = tmp_path / "vendor_boot.img"
+    image.write_bytes(b"".join(_pad(part, page) for part in (header, ramdisk, table)))
+
+    layout = parse_boot_image(image.read_bytes())
+    assert layout.vendor and [r.name for r in layout.ramdisks] == ["platform", "01"]
+
+    assert extract_ramdisks(image, tmp_path / "ramdisk") == 2
+    assert (tmp_path / "ramdisk" / "first.rc").read_text() == "1"
+    assert (tmp_path / "ramdisk" / "second.rc").read_text() == "2"
+
+
+@pytest.mark.skipif(shutil.which("lz4") is None, reason="lz4 tool not installed")
+def test_lz4_legacy_ramdisk_matches_reference_tool(tmp_path):
+    tree = [(f"etc/file{i}", 0o100644, b"ro.product=%d\n" % i * 50) for i in range(20)]
+    compressed = subprocess.run(["lz4", "-l", "-c"], input=_cpio(tree), capture_output=True, check=True).stdout
+
+    assert extract_cpio(bootimg.ramdisk_chunks(memoryview(compressed)), tmp_path) == 20
+    assert (tmp_path / "etc" / "file7").read_bytes() == b"ro.product=7\n" * 50
+
+
+@pytest.mark.parametrize("compress", [gzip.compress, lzma.compress, bz2.compress])
+def test_corrupt_ramdisk_is_left_to_fallback(tmp_path, compress):
+    compressed = bytearray(compress(_cpio(RAMDISK_TREE)))
+    # Breaks the stream's checksum
+    compressed[-6] ^= 0xFF
+
+    with pytest.raises(bootimg.UnsupportedRamdisk):
+        extract_cpio(bootimg.ramdisk_chunks(memoryview(bytes(compressed))), tmp_path)
+
+
+def test_non_boot_image_is_left_to_fallback(tmp_path):
+    image = tmp_path / "dtbo.img"
+    image.write_bytes(b"\0" * 8192)
+
+    assert unpack_boot_image(image, tmp_path / "out") is None
+    assert extract_ramdisks(image, tmp_path / "out") is None
@@ -0,0 +1,114 @@
+"""Unit tests for scratch-space estimates and Redis disk reservations."""
+
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from arq import Retry
+from arq.constants import retry_key_prefix
+
+from dumpyarabot import disk_admission
+from dumpyarabot.arq_jobs import _retry_later
+from dumpyarabot.config import settings
+from dumpyarabot.disk_admission import (
+    STAGE_DOWNLOADED,
+    STAGE_EXTRACTED,
+    DiskAdmissionDeferred,
+    DiskAdmissionError,
+    admit_job,
+    estimate_job_bytes,
+)
+from dumpyarabot.redis_storage import RedisStorage
+
+GB = 1024**3
+
+
+@pytest.fixture
+def storage(fake_redis):
+    with patch.object(RedisStorage, "_redis_client", fake_redis):
+        yield fake_redis
+
+
+def test_estimate_uses_format_expansion_factor():
+    zip_estimate = estimate_job_bytes("https://example.com/ota.zip?x=1", 4 * GB)
+    tar_estimate = estimate_job_bytes("https://example.com/images.tar", 4 * GB)
+
+    assert zip_estimate.extracted_bytes == 12 * GB
+    assert zip_estimate.git_bytes == 6 * GB
+    assert zip_estimate.total == 22 * GB
+    assert tar_estimate.extracted_bytes == 6 * GB
+
+
+def test_reservation_shrinks_as_stages_complete():
+    estimate = estimate_job_bytes("ota.zip", 4 * GB)
+
+    assert estimate.remaining_after(STAGE_DOWNLOADED) == 18 * GB
+    # The archive is deleted after extraction, which pays for part of .git
+    assert estimate.remaining_after(STAGE_EXTRACTED) == 2 * GB
+
+
+async def test_second_job_waits_until_first_releases(storage):
+    admitted, _ = await RedisStorage.reserve_disk_space("host:1", "job-a", 30 * GB, 50 * GB, 2 * GB, 60)
+    assert admitted
+
+    admitted, available = await RedisStorage.reserve_disk_space("host:1", "job-b", 30 * GB, 50 * GB, 2 * GB, 60)
+    assert not admitted
+    assert available == 18 * GB
+
+    await RedisStorage.release_disk_reservation("host:1", "job-a")
+    admitted, _ = await RedisStorage.reserve_disk_space("host:1", "job-b", 30 * GB, 50 * GB, 2 * GB, 60)
+    assert admitted
+
+
+async def test_lone_job_is_admitted_even_if_estimate_exceeds_free_space(storage):
+    # Waiting could not make room, so the job gets its chance
+    admitted, available = await RedisStorage.reserve_disk_space("host:1", "job-a", 80 * GB, 50 * GB, 2 * GB, 60)
+
+    assert admitted
+    assert available == 48 * GB
+
+
+async def test_expired_reservations_are_ignored(storage):
+    key = RedisStorage._make_key("disk_reservations:host:1")
+    await storage.hset(key, "crashed-job", f"{40 * GB}:1")
+
+    admitted, _ = await RedisStorage.reserve_disk_space("host:1", "job-a", 30 * GB, 50 * GB, 2 * GB, 60)
+
+    assert admitted
+    assert not await storage.hexists(key, "crashed-job")
+
+
+async def test_job_that_does_not_fit_is_deferred_then_fails(storage, tmp_path):
+    with patch.object(settings, "WORK_DIR_BASE", str(tmp_path)), \
+         patch.object(settings, "DISK_ADMISSION_MAX_WAIT", 3600), \
+         patch.object(disk_admission, "probe_archive_size", AsyncMock(return_value=10 * GB)):
+        disk = disk_admission.disk_id(tmp_path)
+        await RedisStorage.reserve_disk_space(disk, "other-job", 10**15, 10**15, 0, 60)
+
+        # No waiting inside the job: it is told to come back later
+        with pytest.raises(DiskAdmissionDeferred) as deferred:
+            await admit_job("job-a", "https://example.com/ota.zip")
+        assert deferred.value.retry_in > 0
+
+        # The wait is measured from the first deferral, across runs
+        wait_key = RedisStorage._make_key("disk_wait:job-a")
+        await storage.set(wait_key, str(time.time() - 3601))
+        with pytest.raises(DiskAdmissionError):
+            await admit_job("job-a", "https://example.com/ota.zip")
+
+
+async def test_admission_is_off_by_default(storage, tmp_path):
+    probe = AsyncMock(return_value=10 * GB)
+    with patch.object(settings, "WORK_DIR_BASE", str(tmp_path)), \
+         patch.object(disk_admission, "probe_archive_size", probe):
+        assert await admit_job("job-a", "https://example.com/ota.zip") is None
+    probe.assert_not_called()
+
+
+async def test_deferral_gives_the_try_back(fake_redis):
+    await fake_redis.set(f"{retry_key_prefix}job-a", 2)
+
+    retry = await _retry_later({"redis": fake_redis, "job_id": "job-a"}, 60.0)
+
+    assert isinstance(retry, Retry) and retry.defer_score == 60_000
+    assert int(await fake_redis.get(f"{retry_key_prefix}job-a")) == 1
@@ -0,0 +1,117 @@
+"""Unit tests for downloading firmware ahead of queued jobs."""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import arq.jobs
+import pytest
+from arq.constants import in_progress_key_prefix, job_key_prefix
+
+from dumpyarabot import arq_config, download_ahead
+from dumpyarabot.config import settings
+from dumpyarabot.download_ahead import DownloadAheadService, take_staged_download
+from dumpyarabot.firmware_downloader import FirmwareDownloader
+from dumpyarabot.partial_downloads import partial_key
+from dumpyarabot.redis_storage import RedisStorage
+from dumpyarabot.schemas import DumpJob
+
+URL = "https://example.com/firmware/ota.zip"
+
+
+def _job(job_id: str = "job-1", url: str = URL) -> DumpJob:
+    return DumpJob(
+        job_id=job_id,
+        dump_args={"url": url, "use_alt_dumper": False, "use_privdump": False},
+    )
+
+
+@pytest.fixture
+def prefetch_env(tmp_path, fake_redis):
+    with patch.object(settings, "WORK_DIR_BASE", str(tmp_path)), \
+         patch.object(settings, "DOWNLOAD_AHEAD_JOBS", 2), \
+         patch.object(settings, "DOWNLOAD_AHEAD_MAX_BYTES", 1024**3), \
+         patch.object(RedisStorage, "_redis_client", fake_redis):
+        yield tmp_path
+
+
+async def test_scan_stages_next_queued_job_for_pickup(prefetch_env, tmp_path):
+    async def fake_download(self, job, on_progress=None):
+        archive = self.work_dir / "ota.zip"
+        archive.write_bytes(b"firmware")
+        self.download_info = {"file_name": "ota.zip", "size": 8, "sha256": "abc", "source": "download"}
+        return str(archive), "ota.zip"
+
+    service = DownloadAheadService()
+    with patch.object(arq_config.arq_pool, "get_queued_jobs", AsyncMock(return_value=[_job().model_dump(mode="json")])), \
+         patch.object(download_ahead, "probe_remote_file", AsyncMock(return_value=None)), \
+         patch.object(FirmwareDownloader, "download_firmware", fake_download):
+        await service.scan_once()
+    await service.stop()
+
+    job_dir = tmp_path / "dump_job-1_x"
+    job_dir.mkdir()
+    staged = take_staged_download(URL, job_dir)
+
+    assert staged is not None
+    path, info = staged
+    assert path == job_dir / "ota.zip"
+    assert path.read_bytes() == b"firmware"
+    assert info["source"] == "prefetch"
+    assert info["sha256"] == "abc"
+    assert not (tmp_path / "prefetch" / partial_key(URL)).exists()
+
+
+async def test_starting_job_takes_over_running_prefetch(prefetch_env):
+    started = asyncio.Event()
+
+    async def slow_download(self, job, on_progress=None):
+        started.set()
+        await asyncio.sleep(60)
+
+    service = DownloadAheadService()
+    root = prefetch_env / "prefetch"
+    root.mkdir()
+    with patch.object(download_ahead, "_WATCH_INTERVAL", 0.05), \
+         patch.object(FirmwareDownloader, "download_firmware", slow_download):
+        prefetch = asyncio.create_task(service._prefetch(root, _job()))
+        await asyncio.wait_for(started.wait(), timeout=5)
+        assert await RedisStorage.is_prefetch_active(partial_key(URL))
+
+        await asyncio.wait_for(download_ahead.take_over_prefetch(URL), timeout=5)
+        await asyncio.wait_for(prefetch, timeout=5)
+
+    assert not await RedisStorage.is_prefetch_active(partial_key(URL))
+    assert not (prefetch_env / "prefetch" / partial_key(URL)).exists()
+
+
+async def test_only_one_service_per_host_downloads(prefetch_env):
+    first, second = DownloadAheadService(), DownloadAheadService()
+    root = prefetch_env / "prefetch"
+    try:
+        assert first._hold_service_lock(root)
+        assert not second._hold_service_lock(root)
+    finally:
+        await first.stop()
+        await second.stop()
+
+
+async def test_queued_jobs_skip_started_jobs(fake_redis):
+    queue_name = arq_config.WorkerSettings.queue_name
+    for index, job_id in enumerate(["running", "next", "later"]):
+        blob = arq.jobs.serialize_job(
+            function_name="process_firmware_dump",
+            args=({"job_id": job_id},),
+            kwargs={},
+            job_try=1,
+            enqueue_time_ms=int(time.time() * 1000),
+        )
+        await fake_redis.set(f"{job_key_prefix}{job_id}", blob)
+        await fake_redis.zadd(queue_name, {job_id: int(time.time() * 1000) - 1000 + index})
+    await fake_redis.set(f"{in_progress_key_prefix}running", b"1")
+
+    pool = arq_config.ARQPool()
+    with patch.object(pool, "get_pool", AsyncMock(return_value=fake_redis)):
+        payloads = await pool.get_queued_jobs(1)
+
+    assert payloads == [{"job_id": "next"}]
@@ -0,0 +1,106 @@
+"""Unit tests for the persistent download cache."""
+
+import errno
+import os
+from unittest.mock import patch
+
+from dumpyarabot.config import settings
+from dumpyarabot.download_cache import CACHE_DIR_NAME, DownloadCache, hash_file_sha256
+from dumpyarabot.url_utils import RemoteFileInfo
+
+
+def _info(url: str, etag: str | None = '"v1"', length: int = 4) -> RemoteFileInfo:
+    return RemoteFileInfo(url=url, final_url=url, content_length=length, etag=etag)
+
+
+def _write(path, data: bytes):
+    path.write_bytes(data)
+    return path
+
+
+def test_store_then_lookup_hits_for_same_url_version(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1024)
+    job_a = tmp_path / "job_a"
+    job_a.mkdir()
+    archive = _write(job_a / "fw.zip", b"data")
+    url = "HTTPS://Example.com:443/fw.zip?b=2&a=1"
+
+    cache.store(archive, url, _info(url), hash_file_sha256(archive))
+
+    # Same URL spelled differently, same validators -> hit.
+    entry = cache.lookup("https://example.com/fw.zip?a=1&b=2", _info(url))
+    assert entry is not None
+
+    job_b = tmp_path / "job_b"
+    job_b.mkdir()
+    served = cache.materialize(entry, job_b)
+    assert served == job_b / "fw.zip"
+    assert served.read_bytes() == b"data"
+
+
+def test_changed_validators_miss(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1024)
+    archive = _write(tmp_path / "fw.zip", b"data")
+    url = "https://example.com/fw.zip"
+    cache.store(archive, url, _info(url), hash_file_sha256(archive))
+
+    assert cache.lookup(url, _info(url, etag='"v2"')) is None
+
+
+def test_no_validators_is_never_served(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1024)
+    archive = _write(tmp_path / "fw.zip", b"data")
+    url = "https://example.com/fw.zip"
+    cache.store(archive, url, _info(url, etag=None), hash_file_sha256(archive))
+
+    assert cache.lookup(url, _info(url, etag=None)) is None
+
+
+def test_eviction_drops_least_recently_used_blob(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=10)
+    old = _write(tmp_path / "old.zip", b"0123456")
+    new = _write(tmp_path / "new.zip", b"abcdefg")
+    old_sha = hash_file_sha256(old)
+    new_sha = hash_file_sha256(new)
+
+    cache.store(old, "https://example.com/old.zip", _info("https://example.com/old.zip", length=7), old_sha)
+    # Make the first blob clearly older than the second.
+    os.utime(cache.blob_path(old_sha), (1, 1))
+    cache.store(new, "https://example.com/new.zip", _info("https://example.com/new.zip", length=7), new_sha)
+
+    assert not cache.blob_path(old_sha).exists()
+    assert cache.blob_path(new_sha).exists()
+    # The index entry pointing at the evicted blob is dropped on lookup.
+    assert cache.lookup("https://example.com/old.zip", _info("https://example.com/old.zip", length=7)) is None
+
+
+def test_store_from_another_filesystem_copies_the_archive(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1024)
+    other_root = tmp_path / "hdd"
+    other_root.mkdir()
+    archive = _write(other_root / "fw.zip", b"data")
+    url = "https://example.com/fw.zip"
+
+    # Hardlinks across filesystems fail with EXDEV.
+    with patch.object(os, "link", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+        entry = cache.store(archive, url, _info(url), hash_file_sha256(archive))
+
+    assert entry is not None
+    assert cache.blob_path(entry.sha256).read_bytes() == b"data"
+    assert cache.lookup(url, _info(url)) == entry
+
+
+def test_cache_lives_on_the_download_root(tmp_path):
+    work_root = tmp_path / "work"
+    download_root = tmp_path / "hdd"
+    work_root.mkdir()
+    download_root.mkdir()
+    download_dir = download_root / "dump_job_x"
+    download_dir.mkdir()
+
+    with patch.object(settings, "DOWNLOAD_CACHE_MAX_BYTES", 1024), \
+            patch.object(settings, "WORK_DIR_BASE", str(work_root)), \
+            patch.object(settings, "SCRATCH_ROOTS", {"download": [str(download_root)]}):
+        assert DownloadCache.from_settings(download_dir).root == download_root / CACHE_DIR_NAME
+        assert DownloadCache.from_settings(work_root / "dump_job_y").root == work_root / CACHE_DIR_NAME
+        assert DownloadCache.from_settings().root == work_root / CACHE_DIR_NAME
@@ -0,0 +1,93 @@
+"""Unit tests for the early duplicate-dump check."""
+
+import asyncio
+import zipfile
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from dumpyarabot.duplicate_check import DuplicateCheck, DuplicateDumpError, extract_listed_props
+from dumpyarabot.gitlab_manager import GitLabManager
+from dumpyarabot.property_extractor import PropertyExtractor
+
+PROPS = {"repo_subgroup": "brand", "repo_name": "device", "branch": "user-14-AB1-123-release-keys"}
+
+
+def _zip(path, names):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name in names:
+            archive.writestr(name, "ro.product.device=device\n")
+    return str(path)
+
+
+def test_listed_props_are_copied_from_unpacked_tree(tmp_path):
+    archive = _zip(tmp_path / "fw.zip", ["system/build.prop", "vendor/odm/etc/build.prop", "boot.img", "../x.prop"])
+    dest = tmp_path / "props"
+
+    assert extract_listed_props(archive, dest)
+    assert (dest / "system" / "build.prop").read_text() == "ro.product.device=device\n"
+    assert (dest / "vendor" / "odm" / "etc" / "build.prop").exists()
+    assert not (tmp_path / "x.prop").exists()
+
+
+def test_listing_with_partition_images_is_not_trusted(tmp_path):
+    archive = _zip(tmp_path / "fw.zip", ["system/build.prop", "odm.img"])
+
+    assert not extract_listed_props(archive, tmp_path / "props")
+
+
+@pytest.fixture
+def check(tmp_path):
+    manager = GitLabManager(str(tmp_path))
+    with patch.object(PropertyExtractor, "extract_properties", AsyncMock(return_value=dict(PROPS))):
+        yield DuplicateCheck(str(tmp_path), manager, "token"), manager
+
+
+async def test_duplicate_cancels_running_extraction(check):
+    duplicate_check, manager = check
+    props_ready = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def extraction():
+        props_ready.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch.object(manager, "find_existing_branch", AsyncMock(return_value="https://gitlab/tree/x/")):
+        duplicate_check.check_when_ready(props_ready)
+        with pytest.raises(DuplicateDumpError, match="already exists"):
+            await asyncio.wait_for(duplicate_check.run_alongside(extraction()), timeout=5)
+
+    assert cancelled.is_set()
+
+
+async def test_new_branch_lets_extraction_finish(check):
+    duplicate_check, manager = check
+    props_ready = asyncio.Event()
+
+    async def extraction():
+        props_ready.set()
+        await asyncio.sleep(0.05)
+        return "extracted"
+
+    lookup = AsyncMock(return_value=None)
+    with patch.object(manager, "find_existing_branch", lookup):
+        duplicate_check.check_when_ready(props_ready)
+        result = await asyncio.wait_for(duplicate_check.run_alongside(extraction()), timeout=5)
+
+    assert result == "extracted"
+    lookup.assert_awaited_once()
+
+
+async def test_failed_extraction_does_not_wait_for_props(check):
+    duplicate_check, _ = check
+
+    async def extraction():
+        raise RuntimeError("extractor.sh failed")
+
+    duplicate_check.check_when_ready(asyncio.Event())
+    with pytest.raises(RuntimeError, match="extractor.sh"):
+        await asyncio.wait_for(duplicate_check.run_alongside(extraction()), timeout=5)
@@ -0,0 +1,65 @@
+"""Unit tests for the shared Firmware_extractor checkout."""
+
+import json
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from dumpyarabot import extractor_checkout
+from dumpyarabot.config import settings
+from dumpyarabot.extractor_checkout import ensure_firmware_extractor, request_refresh
+from dumpyarabot.redis_storage import RedisStorage
+
+
+def _git(*args, cwd):
+    subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def _commit(repo, content):
+    (repo / "extractor.sh").write_text(content)
+    _git("add", "extractor.sh", cwd=repo)
+    _git("commit", "-q", "-m", content, cwd=repo)
+
+
+@pytest.fixture
+def upstream(tmp_path, fake_redis):
+    repo = tmp_path / "upstream"
+    repo.mkdir()
+    _git("init", "-q", cwd=repo)
+    _commit(repo, "echo v1")
+    with patch.object(extractor_checkout, "REPO_URL", str(repo)), \
+            patch.object(settings, "FIRMWARE_EXTRACTOR_DIR", str(tmp_path / "shared")), \
+            patch.object(RedisStorage, "_redis_client", fake_redis):
+        yield repo
+
+
+async def test_checkout_is_reused_until_an_admin_refresh(upstream, tmp_path):
+    first = await ensure_firmware_extractor()
+    assert (first / "extractor.sh").read_text() == "echo v1"
+
+    _commit(upstream, "echo v2")
+    with patch.object(extractor_checkout, "run_git_command") as git:
+        assert await ensure_firmware_extractor() == first
+    git.assert_not_called()
+
+    await request_refresh()
+    second = await ensure_firmware_extractor()
+
+    assert (second / "extractor.sh").read_text() == "echo v2"
+    assert (tmp_path / "shared" / "current").resolve() == second
+    # A job that resolved the old tree before the swap can still use it
+    assert (first / "extractor.sh").read_text() == "echo v1"
+
+
+async def test_failed_refresh_keeps_the_current_checkout(upstream, tmp_path):
+    first = await ensure_firmware_extractor()
+    state_file = tmp_path / "shared" / "state.json"
+    state = json.loads(state_file.read_text())
+    state_file.write_text(json.dumps({**state, "checked_at": 0}))
+
+    with patch.object(extractor_checkout, "REPO_URL", str(tmp_path / "missing")), \
+            patch.object(settings, "FIRMWARE_EXTRACTOR_REF", "no-such-branch"):
+        assert await ensure_firmware_extractor() == first
+
+    assert json.loads(state_file.read_text())["checked_at"] > 0
@@ -0,0 +1,59 @@
+"""Unit tests for the in-process device tree scanner."""
+
+import struct
+
+from dumpyarabot.fdt import find_fdt_blobs, split_dtbs
+
+
+def _fdt(model: str) -> bytes:
+    """Build a minimal version-17 device tree with a root "model" property."""
+    strings = b"model\0"
+    value = model.encode() + b"\0"
+    value += b"\0" * (-len(value) % 4)
+    structure = (
+        struct.pack(">I", 1) + b"\0\0\0\0"  # FDT_BEGIN_NODE, root name ""
+        + struct.pack(">III", 3, len(model) + 1, 0) + value  # FDT_PROP model
+        + struct.pack(">I", 2)  # FDT_END_NODE
+        + struct.pack(">I", 9)  # FDT_END
+    )
+    rsvmap = b"\0" * 16
+    off_rsvmap = 40
+    off_struct = off_rsvmap + len(rsvmap)
+    off_strings = off_struct + len(structure)
+    total = off_strings + len(strings)
+    header = struct.pack(
+        ">10I", 0xD00DFEED, total, off_struct, off_strings, off_rsvmap,
+        17, 16, 0, len(strings), len(structure),
+    )
+    return header + rsvmap + structure + strings
+
+
+def test_blobs_are_found_between_kernel_data_and_stray_magic(tmp_path):
+    image = tmp_path / "boot.img"
+    first, second = _fdt("Qualcomm Technologies, Inc. SM8450"), _fdt("Board v2")
+    # A stray magic with a nonsense header must not count
+    image.write_bytes(b"kernel" * 100 + b"\xd0\x0d\xfe\xed\xff\xff" + first + b"\0" * 64 + second)
+
+    blobs = find_fdt_blobs(image)
+
+    assert [blob.size for blob in blobs] == [len(first), len(second)]
+    assert [blob.model for blob in blobs] == ["Qualcomm Technologies, Inc. SM8450", "Board v2"]
+
+
+def test_split_writes_numbered_files_named_after_the_model(tmp_path):
+    image = tmp_path / "dtbo.img"
+    blob = _fdt("Board v2")
+    image.write_bytes(b"\xd7\xb7\xab\x1e" + b"\0" * 28 + blob + blob)
+
+    written = split_dtbs(image, tmp_path / "dtb")
+
+    assert [path.name for path in written] == ["01_dtbdump_Board_v2.dtb", "02_dtbdump_Board_v2.dtb"]
+    assert written[0].read_bytes() == blob
+
+
+def test_image_without_device_trees_writes_nothing(tmp_path):
+    image = tmp_path / "init_boot.img"
+    image.write_bytes(b"ANDROID!" + b"\0" * 4096)
+
+    assert split_dtbs(image, tmp_path / "dtb") == []
+    assert not (tmp_path / "dtb").exists()
@@ -0,0 +1,74 @@
+"""Unit tests for cheap file cloning and copying."""
+
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from dumpyarabot.file_utils import clone_file, copy_file_to_directory, fast_copy, move_file_to_root
+
+
+def test_clone_prefers_hardlink_on_same_filesystem(tmp_path):
+    source = tmp_path / "fw.zip"
+    source.write_bytes(b"archive")
+
+    with patch("dumpyarabot.file_utils._reflink_file", return_value=False):
+        method = clone_file(source, tmp_path / "linked.zip")
+
+    assert method == "hardlink"
+    assert (tmp_path / "linked.zip").stat().st_ino == source.stat().st_ino
+
+
+def test_clone_without_hardlink_is_an_independent_copy(tmp_path):
+    source = tmp_path / "fw.zip"
+    source.write_bytes(b"archive" * 1000)
+    target = tmp_path / "copy.zip"
+
+    with patch("dumpyarabot.file_utils._reflink_file", return_value=False):
+        method = clone_file(source, target, allow_hardlink=False)
+
+    assert method in ("copy_file_range", "copy")
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_ino != source.stat().st_ino
+
+
+def test_copy_file_range_failure_falls_back_to_copy(tmp_path):
+    source = tmp_path / "fw.zip"
+    source.write_bytes(b"archive")
+    target = tmp_path / "copy.zip"
+
+    with (
+        patch("dumpyarabot.file_utils._reflink_file", return_value=False),
+        patch("dumpyarabot.file_utils.os.copy_file_range", side_effect=OSError(18, "EXDEV")),
+    ):
+        assert clone_file(source, target, allow_hardlink=False) == "copy"
+    assert target.read_bytes() == b"archive"
+
+
+def test_copy_and_move_helpers(tmp_path):
+    source = tmp_path / "nested" / "boot.img"
+    source.parent.mkdir()
+    source.write_bytes(b"boot")
+    out_dir = tmp_path / "out"
+
+    copied = copy_file_to_directory(source, out_dir)
+    assert copied.read_bytes() == b"boot"
+    # Copying again overwrites rather than failing on the existing target.
+    assert copy_file_to_directory(source, out_dir) == copied
+
+    moved = move_file_to_root(source, tmp_path)
+    assert moved == tmp_path / "boot.img"
+    assert not source.exists()
+
+
+def test_copying_a_file_onto_itself_keeps_it(tmp_path):
+    source = tmp_path / "boot.img"
+    source.write_bytes(b"boot")
+    (tmp_path / "out").mkdir()
+    (tmp_path / "out" / "boot.img").hardlink_to(source)
+
+    assert copy_file_to_directory(source, tmp_path) == source
+    assert copy_file_to_directory(source, tmp_path / "out") == tmp_path / "out" / "boot.img"
+    with pytest.raises(shutil.SameFileError):
+        fast_copy(str(source), str(source))
+    assert source.read_bytes() == b"boot"
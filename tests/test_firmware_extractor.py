@@ -8,8 +8,12 @@ rewrite dropped that step, so every dump shipped its multi-GB source archive
 the original archive after a successful extraction, on every dumper path.
 """
 
+import asyncio
 from unittest.mock import AsyncMock, patch
 
+import pytest
+
+from dumpyarabot.config import settings
 from dumpyarabot.firmware_extractor import FirmwareExtractor
 from dumpyarabot.schemas import DumpArguments, DumpJob
 
@@ -60,3 +64,79 @@ async def test_extract_firmware_removes_archive_alt_dumper(tmp_path):
         await extractor.extract_firmware(_make_job(use_alt_dumper=True), str(archive))
 
     assert not archive.exists(), "original firmware archive should be deleted"
+
+
+async def test_partitions_extract_concurrently_within_the_limit(tmp_path):
+    """Prop partitions start first and no more than the limit run at once."""
+    for name in ("modem", "system", "vendor", "my_preload", "odm"):
+        (tmp_path / f"{name}.img").write_bytes(b"img")
+
+    extractor = FirmwareExtractor(str(tmp_path))
+    started, running, peak = [], 0, 0
+    props_ready_when = {}
+
+    async def fake_extract(partition):
+        nonlocal running, peak
+        started.append(partition)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        props_ready_when[partition] = extractor.props_ready.is_set()
+        return True
+
+    with patch.object(settings, "EXTRACT_PARALLELISM", 2), \
+         patch.object(extractor, "_extract_partition", side_effect=fake_extract):
+        await extractor._extract_partitions()
+
+    assert peak == 2
+    assert started[:3] == ["system", "vendor", "odm"]
+    assert not props_ready_when["system"]
+    assert extractor.props_ready.is_set()
+
+
+async def test_system_failure_stops_other_partitions(tmp_path):
+    for name in ("system", "modem"):
+        (tmp_path / f"{name}.img").write_bytes(b"img")
+
+    extractor = FirmwareExtractor(str(tmp_path))
+    cancelled = asyncio.Event()
+
+    async def fake_extract(partition):
+        if partition == "system":
+            await asyncio.sleep(0.01)
+            return False
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return True
+
+    with patch.object(settings, "EXTRACT_PARALLELISM", 4), \
+         patch.object(extractor, "_extract_partition", side_effect=fake_extract):
+        with pytest.raises(Exception, match="Critical partition extraction failed: system"):
+            await asyncio.wait_for(extractor._extract_partitions(), timeout=5)
+
+    assert cancelled.is_set()
+
+
+async def test_image_goes_straight_to_the_tool_for_its_filesystem(tmp_path):
+    """An ext4 image is not offered to fsck.erofs first."""
+    image = tmp_path / "vendor.img"
+    data = bytearray(4096)
+    data[1080:1082] = b"\x53\xef"
+    image.write_bytes(bytes(data))
+
+    extractor = FirmwareExtractor(str(tmp_path))
+    tools = []
+
+    async def fake_run(tool, img_file, output_dir):
+        tools.append(tool)
+        return True
+
+    with patch.object(extractor, "_run_extraction_tool", side_effect=fake_run):
+        assert await extractor._extract_image(image, tmp_path / "vendor")
+
+    assert tools == ["ext2rd"]
+    assert not image.exists()
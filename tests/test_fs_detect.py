@@ -0,0 +1,49 @@
+"""Unit tests for filesystem detection by superblock magic."""
+
+import struct
+
+from dumpyarabot import fs_detect
+from dumpyarabot.fs_detect import detect_filesystem, detect_in_bytes
+
+
+def _image(magic_offset: int, magic: bytes) -> bytes:
+    data = bytearray(4096)
+    data[magic_offset:magic_offset + len(magic)] = magic
+    return bytes(data)
+
+
+def test_known_superblocks_are_named():
+    assert detect_in_bytes(_image(1024, struct.pack("<I", 0xE0F5E1E2))) == "erofs"
+    assert detect_in_bytes(_image(1080, struct.pack("<H", 0xEF53))) == "ext4"
+    assert detect_in_bytes(_image(1024, struct.pack("<I", 0xF2F52010))) == "f2fs"
+    assert detect_in_bytes(_image(0, struct.pack("<I", 0xED26FF3A))) == "sparse"
+    assert detect_in_bytes(_image(0, b"hsqs")) == "squashfs"
+
+
+def test_unknown_or_short_data_is_none():
+    assert detect_in_bytes(bytes(4096)) is None
+    assert detect_in_bytes(b"\x00" * 100) is None
+
+
+def test_result_is_cached_per_image(tmp_path):
+    image = tmp_path / "vendor.img"
+    image.write_bytes(_image(1080, struct.pack("<H", 0xEF53)))
+
+    fs_detect._probe.cache_clear()
+    assert detect_filesystem(image) == "ext4"
+    assert detect_filesystem(image) == "ext4"
+    assert fs_detect._probe.cache_info().hits == 1
+
+    # A new image at the same path is probed again
+    image.write_bytes(_image(1024, struct.pack("<I", 0xE0F5E1E2)) + b"x")
+    assert detect_filesystem(image) == "erofs"
+
+
+def test_cache_is_bounded(tmp_path):
+    fs_detect._probe.cache_clear()
+    for index in range(fs_detect._CACHE_SIZE + 10):
+        image = tmp_path / f"part{index}.img"
+        image.write_bytes(b"\0" * 16)
+        detect_filesystem(image)
+
+    assert fs_detect._probe.cache_info().currsize == fs_detect._CACHE_SIZE
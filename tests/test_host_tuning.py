@@ -0,0 +1,66 @@
+"""Unit tests for per-host aria2 connection tuning."""
+
+from unittest.mock import patch
+
+from dumpyarabot.config import settings
+from dumpyarabot.host_tuning import (
+    HostStats,
+    choose_connections,
+    choose_profile,
+    profile_for_url,
+    record_download,
+    update_stats,
+)
+from dumpyarabot.redis_storage import RedisStorage
+
+MB = 1024 * 1024
+
+
+def test_new_host_starts_at_middle_level_and_climbs_while_faster():
+    assert choose_connections(None) == 8
+
+    stats = update_stats(None, 8, 40 * MB, None)
+    assert choose_connections(stats) == 16
+
+    # 16 was barely faster than 8, so 8 connections are enough
+    stats = update_stats(stats, 16, 42 * MB, None)
+    assert choose_connections(stats) == 8
+
+
+def test_throttle_error_steps_down_until_failure_decays():
+    stats = update_stats(None, 8, None, "6")  # connection reset
+    assert choose_connections(stats) == 4
+
+    stats = update_stats(stats, 4, 20 * MB, None)
+    assert choose_connections(stats) == 4
+    stats = update_stats(stats, 4, 20 * MB, None)
+    # Two successes later, 8 connections are worth another try
+    assert choose_connections(stats) == 8
+
+
+def test_non_throttle_errors_do_not_change_level():
+    stats = update_stats(None, 8, None, "3")  # resource not found
+    assert choose_connections(stats) == 8
+    assert stats.last_error_code == "3"
+
+
+def test_profile_scales_split_with_mirrors_and_min_split_with_speed():
+    stats = HostStats(speeds={16: 160 * MB})
+
+    profile = choose_profile(stats, sources=3)
+
+    assert profile.connections == 16
+    assert profile.split == 48
+    # 10 MB/s per connection, 8 s per segment
+    assert profile.min_split_size_mb == 80
+    assert profile.aria2_options()["min-split-size"] == "80M"
+
+
+async def test_history_round_trips_through_redis(fake_redis):
+    with patch.object(RedisStorage, "_redis_client", fake_redis), \
+         patch.object(settings, "ARIA2_MAX_OVERALL_SPEED", 0), \
+         patch.object(settings, "ARIA2_MAX_JOB_SPEED", 0):
+        await record_download("https://cdn.example.com/a.zip", 8, 40 * MB)
+        profile = await profile_for_url("https://CDN.example.com/b.zip")
+
+    assert profile.connections == 16
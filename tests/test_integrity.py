@@ -0,0 +1,69 @@
+"""Unit tests for incremental download hashing and vendor checksum checks."""
+
+import asyncio
+import hashlib
+
+import pytest
+
+from dumpyarabot.firmware_downloader import FirmwareDownloader
+from dumpyarabot.integrity import (
+    ChecksumMismatchError,
+    StreamingHasher,
+    contiguous_prefix_bytes,
+    verify_vendor_checksum,
+)
+
+
+def test_contiguous_prefix_counts_leading_complete_pieces():
+    # Pieces 0-6 done, 7 missing, 8+ done: only the first 7 count.
+    assert contiguous_prefix_bytes("fe" + "ff", piece_length=10, total_length=1000) == 70
+    # Last piece is short; the prefix never exceeds the file size.
+    assert contiguous_prefix_bytes("ff", piece_length=10, total_length=75) == 75
+    assert contiguous_prefix_bytes("7f", piece_length=10, total_length=80) == 0
+    assert contiguous_prefix_bytes(None, piece_length=10, total_length=80) == 0
+
+
+def test_vendor_checksum_from_miui_file_name():
+    data_md5 = hashlib.md5(b"rom").hexdigest()
+    good = f"miui_SWEETGlobal_V12.5.1.0.RKFMIXM_{data_md5[:10]}_11.0.zip"
+    bad = "miui_SWEETGlobal_V12.5.1.0.RKFMIXM_0123456789_11.0.zip"
+
+    assert verify_vendor_checksum(good, {"md5": data_md5}) is True
+    assert verify_vendor_checksum("firmware_0123456789.zip", {"md5": data_md5}) is None
+    with pytest.raises(ChecksumMismatchError):
+        verify_vendor_checksum(bad, {"md5": data_md5})
+
+
+async def test_streaming_hasher_matches_single_pass(tmp_path):
+    data = bytes(range(256)) * 4096
+    path = tmp_path / "fw.zip"
+    path.write_bytes(data)
+
+    hasher = StreamingHasher(path)
+    hasher.advance(len(data) // 3)
+    hasher.advance(len(data) // 2)  # skipped if the first step is still running
+    digests = await hasher.finish()
+
+    assert digests == {"sha256": hashlib.sha256(data).hexdigest(), "md5": hashlib.md5(data).hexdigest()}
+
+
+async def test_single_stream_download_is_hashed_while_growing(tmp_path, monkeypatch):
+    monkeypatch.setattr("dumpyarabot.firmware_downloader._HASH_FOLLOW_INTERVAL", 0.01)
+    downloader = FirmwareDownloader(str(tmp_path))
+    target = tmp_path / "fw.zip"
+    chunks = [b"a" * 1000, b"b" * 1000, b"c" * 10]
+
+    async def fake_tool():
+        with open(target, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                f.flush()
+                await asyncio.sleep(0.05)
+        return str(target)
+
+    result = await downloader._hash_while_downloading(fake_tool())
+
+    assert result == str(target)
+    digests = await downloader._collect_digests(str(target))
+    assert digests["sha256"] == hashlib.sha256(b"".join(chunks)).hexdigest()
+    assert downloader._streamed_digests[0] == str(target)
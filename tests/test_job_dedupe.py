@@ -0,0 +1,85 @@
+"""Unit tests for coalescing duplicate dump requests onto one job."""
+
+from unittest.mock import AsyncMock, patch
+
+import fakeredis.aioredis
+import pytest
+
+from dumpyarabot.arq_config import arq_pool
+from dumpyarabot.message_queue import MessageQueue
+
+
+def _job_data(job_id: str, url: str = "https://example.com/ota.zip", **options) -> dict:
+    return {
+        "job_id": job_id,
+        "dump_args": {
+            "url": url,
+            "use_alt_dumper": options.get("alt", False),
+            "force": False,
+            "use_privdump": options.get("privdump", False),
+            "initial_message_id": 10,
+            "initial_chat_id": -100,
+        },
+        "initial_message_id": int(job_id[-1]) + 100,
+        "initial_chat_id": -100,
+        "metadata": {"telegram_context": {"chat_id": -100, "message_id": 10}},
+    }
+
+
+@pytest.fixture
+async def queue():
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    queue = MessageQueue()
+    queue._redis = client
+    queue.publish = AsyncMock()
+    with patch.object(arq_pool, "enqueue_job", AsyncMock()) as enqueue, \
+         patch.object(arq_pool, "is_job_active", AsyncMock(return_value=True)):
+        queue.enqueue = enqueue
+        yield queue
+    await client.flushall()
+    await client.aclose()
+
+
+async def test_duplicate_request_follows_the_running_job(queue):
+    first = await queue.queue_dump_job_with_metadata(_job_data("job-1"))
+    # Same firmware, different spelling of the URL
+    second = await queue.queue_dump_job_with_metadata(_job_data("job-2", "https://EXAMPLE.com/ota.zip"))
+
+    assert first == second == "job-1"
+    queue.enqueue.assert_awaited_once()
+
+    # The second request's status message now shows the first job
+    attach = queue.publish.await_args.args[0]
+    assert attach.edit_message_id == 102
+    assert attach.context["job_id"] == "job-1"
+
+    queue.publish.reset_mock()
+    await queue.send_to_job_subscribers("job-1", "Step 5/25", {"job_id": "job-1"})
+    mirrored = queue.publish.await_args.args[0]
+    assert mirrored.edit_message_id == 102
+    assert mirrored.text == "Step 5/25"
+
+
+async def test_different_options_and_private_dumps_are_not_coalesced(queue):
+    await queue.queue_dump_job_with_metadata(_job_data("job-1"))
+
+    assert await queue.queue_dump_job_with_metadata(_job_data("job-2", alt=True)) == "job-2"
+    assert await queue.queue_dump_job_with_metadata(_job_data("job-3", privdump=True)) == "job-3"
+    assert await queue.queue_dump_job_with_metadata(_job_data("job-4", privdump=True)) == "job-4"
+
+
+async def test_ended_job_does_not_hold_its_firmware(queue):
+    await queue.queue_dump_job_with_metadata(_job_data("job-1"))
+
+    # The worker released it: a new request queues a new job
+    await queue.release_active_dump("job-1")
+    assert await queue.queue_dump_job_with_metadata(_job_data("job-2")) == "job-2"
+
+    # The worker died without releasing it: ARQ no longer knows the job
+    arq_pool.is_job_active.return_value = False
+    assert await queue.queue_dump_job_with_metadata(_job_data("job-3")) == "job-3"
+
+    # A late release by an old job does not free the new job's entry
+    arq_pool.is_job_active.return_value = True
+    await queue.release_active_dump("job-2")
+    assert await queue.queue_dump_job_with_metadata(_job_data("job-4")) == "job-3"
@@ -0,0 +1,117 @@
+"""Unit tests for resumable job work dirs."""
+
+import asyncio
+import os
+from unittest.mock import patch
+
+import pytest
+
+from dumpyarabot.arq_jobs import _prepare_resume
+from dumpyarabot.config import settings
+from dumpyarabot.job_journal import (
+    STAGE_BOOT_IMAGES,
+    STAGE_DOWNLOAD,
+    STAGE_EXTRACT,
+    job_workspace,
+    sweep_resumable_jobs,
+)
+
+
+@pytest.fixture
+def resumable(tmp_path):
+    with patch.object(settings, "WORK_DIR_BASE", str(tmp_path)), \
+            patch.object(settings, "JOB_RESUME_TTL", 3600):
+        yield tmp_path / "resumable"
+
+
+def test_failed_job_resumes_after_its_last_completed_stage(resumable):
+    with job_workspace("job1", "dumpkey") as (work_dir, journal):
+        (work_dir / "firmware.zip").write_bytes(b"zip")
+        journal.complete(STAGE_DOWNLOAD, payload_images=[], firmware_path=str(work_dir / "firmware.zip"),
+                         firmware_name="firmware.zip", download_info=None)
+        # Interrupted halfway through the extraction
+        (work_dir / "system").mkdir()
+        journal.keep = True
+
+    with job_workspace("job2", "dumpkey") as (work_dir, journal):
+        assert work_dir == resumable / "dumpkey" / "work"
+        assert journal.done(STAGE_DOWNLOAD) and not journal.done(STAGE_EXTRACT)
+        _prepare_resume(work_dir, journal)
+        assert [entry.name for entry in work_dir.iterdir()] == ["firmware.zip"]
+
+    # A clean exit removes the dir
+    assert not (resumable / "dumpkey").exists()
+
+
+def test_missing_download_is_redone(resumable):
+    with job_workspace("job1", "dumpkey") as (work_dir, journal):
+        journal.complete(STAGE_DOWNLOAD, payload_images=["boot.img"], firmware_path=None,
+                         firmware_name=None, download_info=None)
+        journal.keep = True
+
+    with job_workspace("job2", "dumpkey") as (work_dir, journal):
+        _prepare_resume(work_dir, journal)
+        assert journal.last_completed() is None
+
+
+def test_timed_out_job_keeps_its_dir(resumable):
+    # ARQ's job_timeout and worker shutdown cancel the job mid-stage
+    with pytest.raises(asyncio.CancelledError):
+        with job_workspace("job1", "dumpkey") as (work_dir, journal):
+            journal.complete(STAGE_DOWNLOAD, payload_images=[], firmware_path=str(work_dir / "firmware.zip"),
+                             firmware_name="firmware.zip", download_info=None)
+            raise asyncio.CancelledError
+
+    with job_workspace("job2", "dumpkey") as (work_dir, journal):
+        assert journal.last_completed() == STAGE_DOWNLOAD
+
+
+def test_interrupted_boot_image_stage_is_redone(resumable):
+    with job_workspace("job1", "dumpkey") as (work_dir, journal):
+        journal.complete(STAGE_DOWNLOAD, payload_images=[], firmware_path=str(work_dir / "firmware.zip"),
+                         firmware_name="firmware.zip", download_info=None)
+        (work_dir / "system").mkdir()
+        journal.complete(STAGE_EXTRACT)
+        # Interrupted during kernel analysis and an Oppo image's unsparse
+        (work_dir / "boot" / "ramdisk").mkdir(parents=True)
+        (work_dir / ".kernel_abc").write_bytes(b"kernel")
+        euclid = work_dir / "vendor" / "euclid"
+        euclid.mkdir(parents=True)
+        (euclid / "my_product.img").write_bytes(b"img")
+        (euclid / ".my_product.raw").write_bytes(b"raw")
+        (euclid / "my_product").mkdir()
+        journal.keep = True
+
+    with job_workspace("job2", "dumpkey") as (work_dir, journal):
+        _prepare_resume(work_dir, journal)
+        assert journal.done(STAGE_EXTRACT) and not journal.done(STAGE_BOOT_IMAGES)
+        assert sorted(entry.name for entry in work_dir.iterdir()) == ["system", "vendor"]
+        assert [entry.name for entry in (work_dir / "vendor" / "euclid").iterdir()] == ["my_product.img"]
+
+
+def test_busy_key_falls_back_to_a_temp_dir(resumable):
+    with job_workspace("job1", "dumpkey") as (first, _):
+        with job_workspace("job2", "dumpkey") as (second, journal):
+            assert second.name.startswith("dump_job2_")
+            assert not journal.resumable
+        assert first.is_dir()
+
+
+def test_sweep_removes_expired_dirs(resumable):
+    for key in ("old", "new"):
+        with job_workspace(key, key) as (_, journal):
+            journal.complete(STAGE_DOWNLOAD, payload_images=[], firmware_path="a",
+                             firmware_name="a", download_info=None)
+            journal.keep = True
+    os.utime(resumable / "old", (0, 0))
+
+    assert sweep_resumable_jobs() == 1
+    assert not (resumable / "old").exists()
+    assert (resumable / "new" / "journal.json").exists()
+
+
+def test_resuming_is_off_without_a_ttl(resumable):
+    with patch.object(settings, "JOB_RESUME_TTL", 0):
+        with job_workspace("job1", "dumpkey") as (work_dir, journal):
+            assert not journal.resumable
+            assert work_dir.name.startswith("dump_job1_")
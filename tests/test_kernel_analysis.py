@@ -0,0 +1,71 @@
+"""Unit tests for the single-pass kernel analysis."""
+
+import gzip
+import lzma
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from dumpyarabot import bootimg, kernel_analysis
+from dumpyarabot.kernel_analysis import analyze_kernel, extract_ikconfig, load_kernel
+
+CONFIG = "CONFIG_ARM64=y\nCONFIG_IKCONFIG=y\n"
+KERNEL = (
+    b"\0" * 64 + b"Linux version 5.10.177-android12-9 (build@host)\0"
+    + b"IKCFG_ST" + gzip.compress(CONFIG.encode()) + b"IKCFG_ED" + b"\0" * 4096
+)
+
+
+def _boot(kernel, page=2048):
+    header = bootimg._BOOT_V0.pack(
+        b"ANDROID!", len(kernel), 0x10008000, 0, 0x11000000, 0, 0x10f00000,
+        0x10000100, page, 0, 0, b"", b"", b"", b"",
+    )
+    return b"".join(part + b"\0" * (-len(part) % page) for part in (header, kernel))
+
+
+def test_gzip_kernel_is_decompressed_once_and_ikconfig_read(tmp_path):
+    image = tmp_path / "boot.img"
+    # Image.gz-dtb: a device tree appended after the compressed kernel
+    image.write_bytes(_boot(gzip.compress(KERNEL) + b"\xd0\x0d\xfe\xed" + b"\1" * 64))
+
+    kernel = load_kernel(image)
+
+    assert kernel == KERNEL
+    assert extract_ikconfig(kernel) == CONFIG
+
+
+def test_payload_inside_self_decompressing_image_is_found(tmp_path):
+    image = tmp_path / "zImage"
+    image.write_bytes(b"\x00\x00\xa0\xe1" * 32 + b"BZh-not-really" + lzma.compress(KERNEL) + b"\xff" * 100)
+
+    assert load_kernel(image) == KERNEL
+
+
+def test_uncompressed_kernel_is_not_scanned(tmp_path):
+    image = tmp_path / "boot.img"
+    # The embedded ikconfig is gzip data, but the kernel itself is stored as is
+    image.write_bytes(_boot(KERNEL))
+
+    with patch.object(kernel_analysis, "_decompress", side_effect=AssertionError("scanned")):
+        assert load_kernel(image) == KERNEL
+
+
+async def test_symbol_tools_run_on_the_decompressed_kernel(tmp_path):
+    image = tmp_path / "boot.img"
+    image.write_bytes(_boot(gzip.compress(KERNEL)))
+    seen = []
+
+    async def run_analysis_command(*args, output_file=None, **kwargs):
+        seen.append(Path(args[-2] if output_file is None else args[-1]).read_bytes())
+        Path(output_file or args[-1]).write_text("ffffffc008000000 T _text\n")
+        return SimpleNamespace(success=True, stdout="", stderr="")
+
+    with patch.object(kernel_analysis, "run_analysis_command", run_analysis_command):
+        timings = await analyze_kernel(image, tmp_path)
+
+    assert seen == [KERNEL, KERNEL]
+    assert set(timings) == {"decompress", "ikconfig", "kallsyms", "elf"}
+    assert (tmp_path / "ikconfig").read_text() == CONFIG
+    assert (tmp_path / "kallsyms.txt").exists() and (tmp_path / "boot.elf").exists()
+    assert not list(tmp_path.glob(".kernel_*"))
@@ -0,0 +1,113 @@
+"""Unit tests for concurrent Xiaomi mirror ranking."""
+
+import functools
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+from dumpyarabot.firmware_downloader import FirmwareDownloader
+
+URL = "https://bigota.d.miui.com/V14/miui_ota.zip"
+
+
+def _mirror_transport(bodies: dict[str, bytes | None], requests: list) -> httpx.MockTransport:
+    """Serve `bodies[host]` for each host; None means the host lacks the file."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.url.host))
+        body = bodies.get(request.url.host)
+        if body is None:
+            return httpx.Response(404)
+        return httpx.Response(206, content=body)
+
+    return httpx.MockTransport(handler)
+
+
+async def _rank(tmp_path, transport, cached: dict | None = None):
+    stored: dict = {}
+
+    async def store(host, health, ttl=0):
+        stored[host] = health
+
+    with (
+        patch(
+            "dumpyarabot.firmware_downloader.httpx.AsyncClient",
+            functools.partial(httpx.AsyncClient, transport=transport),
+        ),
+        patch(
+            "dumpyarabot.firmware_downloader.RedisStorage.get_mirror_health",
+            new=AsyncMock(side_effect=lambda host: (cached or {}).get(host)),
+        ),
+        patch("dumpyarabot.firmware_downloader.RedisStorage.store_mirror_health", new=store),
+    ):
+        urls = await FirmwareDownloader(str(tmp_path))._resolve_mirrors(URL)
+    return urls, stored
+
+
+async def test_live_mirrors_returned_and_missing_file_dropped(tmp_path):
+    requests: list = []
+    transport = _mirror_transport(
+        {
+            "cdnorg.d.miui.com": b"x" * 1024,
+            "bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com": None,
+            "bn.d.miui.com": b"x" * 1024,
+            "bigota.d.miui.com": b"x" * 1024,
+        },
+        requests,
+    )
+
+    urls, stored = await _rank(tmp_path, transport)
+
+    assert sorted(urls) == sorted([
+        "https://cdnorg.d.miui.com/V14/miui_ota.zip",
+        "https://bn.d.miui.com/V14/miui_ota.zip",
+        "https://bigota.d.miui.com/V14/miui_ota.zip",
+    ])
+    # A 404 is specific to this file, so the host's health is not cached.
+    assert "bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com" not in stored
+    assert stored["cdnorg.d.miui.com"]["alive"] is True
+
+
+async def test_cached_health_skips_dead_hosts_and_ranks_by_throughput(tmp_path):
+    requests: list = []
+    transport = _mirror_transport({"cdnorg.d.miui.com": b"", "bn.d.miui.com": b"", "bigota.d.miui.com": b""}, requests)
+    cached = {
+        "cdnorg.d.miui.com": {"alive": True, "throughput": 1.0},
+        "bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com": {"alive": False},
+        "bn.d.miui.com": {"alive": True, "throughput": 5.0},
+        "bigota.d.miui.com": {"alive": True, "throughput": 3.0},
+    }
+
+    urls, _ = await _rank(tmp_path, transport, cached)
+
+    assert [httpx.URL(u).host for u in urls] == ["bn.d.miui.com", "bigota.d.miui.com", "cdnorg.d.miui.com"]
+    # Known-healthy hosts only get a HEAD; the known-dead host is never contacted.
+    assert all(method == "HEAD" for method, _ in requests)
+    assert "bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com" not in {host for _, host in requests}
+
+
+async def test_all_mirrors_down_falls_back_to_original(tmp_path):
+    urls, _ = await _rank(tmp_path, _mirror_transport({}, []))
+
+    assert urls == [URL]
+
+
+async def test_partial_download_is_keyed_on_the_job_url(tmp_path):
+    downloader = FirmwareDownloader(str(tmp_path))
+    keys = []
+
+    @contextmanager
+    def claim_partial_area(key):
+        keys.append(key)
+        yield tmp_path
+
+    with patch("dumpyarabot.firmware_downloader.claim_partial_area", claim_partial_area), \
+            patch.object(downloader, "_download_aria2", AsyncMock(return_value=str(tmp_path / "miui_ota.zip"))):
+        # A retry that ranked another mirror first resumes the same download
+        for primary in ("cdnorg.d.miui.com", "bn.d.miui.com"):
+            await downloader._download_by_type(
+                f"https://{primary}/V14/miui_ota.zip", mirrors=[URL], resume_key=URL
+            )
+
+    assert keys == [URL, URL]
@@ -0,0 +1,77 @@
+"""Unit tests for the per-URL resumable download area."""
+
+import os
+from unittest.mock import patch
+
+from dumpyarabot.config import settings
+from dumpyarabot.partial_downloads import (
+    PARTIAL_DIR_NAME,
+    adopt_download,
+    claim_partial_area,
+    sweep_partial_downloads,
+)
+
+URL = "https://example.com/fw.zip"
+
+
+def _settings(tmp_path, ttl: int = 3600):
+    return (
+        patch.object(settings, "WORK_DIR_BASE", str(tmp_path)),
+        patch.object(settings, "PARTIAL_DOWNLOAD_TTL", ttl),
+    )
+
+
+def test_retry_reattaches_to_the_same_area(tmp_path):
+    base, ttl = _settings(tmp_path)
+    with base, ttl:
+        with claim_partial_area(URL) as first:
+            (first / "fw.zip").write_bytes(b"half")
+            (first / "fw.zip.aria2").write_bytes(b"ctl")
+        # Same URL spelled differently maps to the same area, partial intact.
+        with claim_partial_area("HTTPS://example.com:443/fw.zip") as second:
+            assert second == first
+            assert (second / "fw.zip.aria2").exists()
+
+
+def test_concurrent_claim_of_same_url_is_refused(tmp_path):
+    base, ttl = _settings(tmp_path)
+    with base, ttl:
+        with claim_partial_area(URL) as first, claim_partial_area(URL) as second:
+            assert first is not None
+            assert second is None
+
+
+def test_disabled_without_work_dir_base(tmp_path):
+    with patch.object(settings, "WORK_DIR_BASE", None):
+        with claim_partial_area(URL) as area:
+            assert area is None
+
+
+def test_adopt_moves_file_and_drops_control_file(tmp_path):
+    area = tmp_path / "area"
+    job_dir = tmp_path / "job"
+    area.mkdir()
+    job_dir.mkdir()
+    (area / "fw.zip").write_bytes(b"data")
+    (area / "fw.zip.aria2").write_bytes(b"ctl")
+
+    adopted = adopt_download(area / "fw.zip", job_dir)
+
+    assert adopted == job_dir / "fw.zip"
+    assert adopted.read_bytes() == b"data"
+    assert list(area.iterdir()) == []
+
+
+def test_sweep_removes_only_expired_unlocked_areas(tmp_path):
+    base, ttl = _settings(tmp_path, ttl=60)
+    with base, ttl:
+        with claim_partial_area(URL) as busy:
+            with claim_partial_area("https://example.com/old.zip") as old:
+                pass
+            for area in (busy, old):
+                os.utime(area, (1, 1))
+
+            assert sweep_partial_downloads() == 1
+            assert busy.exists()
+            assert not old.exists()
+    assert (tmp_path / PARTIAL_DIR_NAME).is_dir()
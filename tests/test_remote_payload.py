@@ -0,0 +1,165 @@
+"""Unit tests for ranged extraction of partitions from a remote OTA payload."""
+
+import functools
+import io
+import lzma
+import struct
+import zipfile
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from dumpyarabot.remote_payload import (
+    OP_REPLACE,
+    OP_REPLACE_XZ,
+    OP_ZERO,
+    RemotePayloadError,
+    RemotePayloadExtractor,
+)
+
+BLOCK = 4096
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field_varint(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _field_bytes(number: int, value: bytes) -> bytes:
+    return _varint((number << 3) | 2) + _varint(len(value)) + value
+
+
+def _operation(op_type: int, offset: int, data: bytes, start_block: int, num_blocks: int) -> bytes:
+    extent = _field_varint(1, start_block) + _field_varint(2, num_blocks)
+    body = _field_varint(1, op_type)
+    if data:
+        body += _field_varint(2, offset) + _field_varint(3, len(data))
+    return body + _field_bytes(6, extent)
+
+
+def _build_ota() -> tuple[bytes, dict[str, bytes]]:
+    """Build a stored-payload OTA zip with system (xz + zero), vendor (raw) and odm."""
+    system_block0 = b"S" * BLOCK
+    vendor_data = b"V" * (2 * BLOCK)
+    odm_data = b"O" * BLOCK
+    system_blob = lzma.compress(system_block0)
+
+    blobs = b""
+    ops = {}
+    ops["system"] = [
+        _operation(OP_REPLACE_XZ, len(blobs), system_blob, 0, 1),
+        _operation(OP_ZERO, 0, b"", 1, 1),
+    ]
+    blobs += system_blob
+    ops["vendor"] = [_operation(OP_REPLACE, len(blobs), vendor_data, 0, 2)]
+    blobs += vendor_data
+    ops["odm"] = [_operation(OP_REPLACE, len(blobs), odm_data, 0, 1)]
+    blobs += odm_data
+
+    sizes = {"system": 2 * BLOCK, "vendor": 2 * BLOCK, "odm": BLOCK}
+    manifest = _field_varint(3, BLOCK)
+    for name, partition_ops in ops.items():
+        partition = _field_bytes(1, name.encode())
+        partition += _field_bytes(7, _field_varint(1, sizes[name]))
+        for op in partition_ops:
+            partition += _field_bytes(8, op)
+        manifest += _field_bytes(13, partition)
+
+    payload = b"CrAU" + struct.pack(">QQI", 2, len(manifest), 0) + manifest + blobs
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr("META-INF/com/android/metadata", "post-build=test\n")
+        zf.writestr("payload.bin", payload)
+
+    expected = {
+        "system": system_block0 + b"\0" * BLOCK,
+        "vendor": vendor_data,
+    }
+    return buffer.getvalue(), expected
+
+
+def _range_transport(data: bytes, requests: list) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.headers.get("range"))
+        start, end = request.headers["range"].removeprefix("bytes=").split("-")
+        start, end = int(start), int(end)
+        return httpx.Response(
+            206,
+            content=data[start:end + 1],
+            headers={"Content-Range": f"bytes {start}-{end}/{len(data)}"},
+        )
+
+    return httpx.MockTransport(handler)
+
+
+def _patched_client(transport: httpx.MockTransport):
+    return patch(
+        "dumpyarabot.remote_payload.httpx.AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=transport),
+    )
+
+
+async def test_extract_writes_only_wanted_partitions(tmp_path):
+    ota, expected = _build_ota()
+    requests: list = []
+
+    with _patched_client(_range_transport(ota, requests)):
+        images = await RemotePayloadExtractor("https://example.com/ota.zip", str(tmp_path)).extract(
+            ["system", "vendor", "boot"]
+        )
+
+    assert sorted(p.name for p in images) == ["system.img", "vendor.img"]
+    assert (tmp_path / "system.img").read_bytes() == expected["system"]
+    assert (tmp_path / "vendor.img").read_bytes() == expected["vendor"]
+    assert not (tmp_path / "odm.img").exists()
+    # Every request was ranged; nothing pulled the whole archive.
+    assert all(r and r.startswith("bytes=") for r in requests)
+
+
+class _UnreadBody(httpx.AsyncByteStream):
+    """A whole-archive body that records whether anything read it."""
+
+    def __init__(self):
+        self.read = False
+
+    async def __aiter__(self):
+        self.read = True
+        yield b"\0" * BLOCK
+
+
+async def test_server_without_range_support_raises(tmp_path):
+    requests: list = []
+    body = _UnreadBody()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        # Range ignored: the whole archive, as a 200
+        return httpx.Response(200, stream=body)
+
+    with _patched_client(httpx.MockTransport(handler)), pytest.raises(RemotePayloadError):
+        await RemotePayloadExtractor("https://example.com/ota.zip", str(tmp_path)).extract(["system"])
+
+    assert not body.read
+    assert len(requests) == 1
+
+
+async def test_archive_without_payload_raises(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("system.new.dat.br", b"x")
+
+    with _patched_client(_range_transport(buffer.getvalue(), [])), pytest.raises(RemotePayloadError):
+        await RemotePayloadExtractor("https://example.com/ota.zip", str(tmp_path)).extract(["system"])
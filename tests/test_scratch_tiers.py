@@ -0,0 +1,70 @@
+"""Unit tests for tiered scratch placement."""
+
+from collections import namedtuple
+from unittest.mock import AsyncMock, patch
+
+from dumpyarabot import disk_admission, scratch_tiers
+from dumpyarabot.config import settings
+from dumpyarabot.disk_admission import admit_job
+from dumpyarabot.file_utils import merge_directory_into
+from dumpyarabot.redis_storage import RedisStorage
+from dumpyarabot.scratch_tiers import TIER_DOWNLOAD, TIER_SMALL, TIER_WORK, choose_root, make_tier_dir, tier_roots
+
+GB = 1024**3
+_Usage = namedtuple("_Usage", "total used free")
+
+
+def _roots(tmp_path, *names):
+    roots = [tmp_path / name for name in names]
+    for root in roots:
+        root.mkdir()
+    return roots
+
+
+def test_root_with_most_free_space_that_fits_is_chosen(tmp_path):
+    nvme0, nvme1, hdd = _roots(tmp_path, "nvme0", "nvme1", "hdd")
+    free = {nvme0: 40 * GB, nvme1: 90 * GB, hdd: 500 * GB}
+    scratch_roots = {"work": [str(nvme0), str(nvme1), str(tmp_path / "missing")], "download": [str(hdd)]}
+
+    with patch.object(settings, "SCRATCH_ROOTS", scratch_roots), \
+            patch.object(scratch_tiers.shutil, "disk_usage", lambda root: _Usage(0, 0, free[root])):
+        assert tier_roots(TIER_WORK) == [nvme0, nvme1]
+        assert choose_root(TIER_WORK) == nvme1
+        assert choose_root(TIER_DOWNLOAD, need_bytes=600 * GB) is None
+        # No small tier configured: the caller keeps using its work dir
+        assert make_tier_dir(TIER_SMALL, "dump_job_") is None
+
+
+def test_work_tier_defaults_to_work_dir_base(tmp_path):
+    with patch.object(settings, "SCRATCH_ROOTS", {}), patch.object(settings, "WORK_DIR_BASE", str(tmp_path)):
+        assert tier_roots(TIER_WORK) == [tmp_path]
+        assert tier_roots(TIER_DOWNLOAD) == []
+
+
+def test_staged_outputs_merge_into_the_work_dir(tmp_path):
+    staging, work = _roots(tmp_path, "staging", "work")
+    (staging / "boot" / "ramdisk").mkdir(parents=True)
+    (staging / "boot" / "ramdisk" / "init").write_text("new")
+    (staging / "ikconfig").write_text("CONFIG_ARM64=y")
+    (work / "boot").mkdir()
+    (work / "boot" / "kept.txt").write_text("kept")
+
+    merge_directory_into(staging, work)
+
+    assert (work / "boot" / "ramdisk" / "init").read_text() == "new"
+    assert (work / "boot" / "kept.txt").read_text() == "kept"
+    assert (work / "ikconfig").exists()
+    assert not any(staging.iterdir())
+
+
+async def test_archive_on_another_disk_is_not_reserved_on_the_work_disk(fake_redis, tmp_path):
+    work, download = _roots(tmp_path, "work", "download")
+    with patch.object(RedisStorage, "_redis_client", fake_redis), \
+            patch.object(settings, "DISK_ADMISSION_MAX_WAIT", 60), \
+            patch.object(disk_admission, "probe_archive_size", AsyncMock(return_value=4 * GB)), \
+            patch.object(disk_admission, "disk_id", lambda path: f"host:{path.name}"):
+        reservation = await admit_job("job-a", "https://example.com/ota.zip", root=work, archive_root=download)
+
+    assert reservation.disk == "host:work"
+    assert reservation.estimate.archive_bytes == 0
+    assert reservation.estimate.total == 18 * GB
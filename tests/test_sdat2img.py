@@ -0,0 +1,107 @@
+"""Unit tests for the streaming sdat2img converter."""
+
+import zipfile
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from dumpyarabot import sdat2img
+from dumpyarabot.firmware_extractor import FirmwareExtractor
+from dumpyarabot.schemas import DumpArguments, DumpJob
+from dumpyarabot.sdat2img import (
+    BLOCK_SIZE,
+    UnsupportedTransferList,
+    convert_partition,
+    find_block_partitions,
+    parse_transfer_list,
+)
+
+# Blocks 0-1 and 5 are new data, 2-4 are zeroed and 6-9 only erased
+TRANSFER_LIST = "4\n3\n0\n0\nerase 2,0,10\nnew 4,0,2,5,6\nzero 2,2,5\n"
+DATA = b"A" * BLOCK_SIZE + b"\0" * BLOCK_SIZE + b"C" * BLOCK_SIZE
+
+
+def _ota(path, entries):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return path
+
+
+def test_new_data_is_written_into_its_block_ranges(tmp_path):
+    archive = _ota(tmp_path / "ota.zip", {"system.transfer.list": TRANSFER_LIST, "system.new.dat": DATA})
+    [partition] = find_block_partitions(archive)
+    image = tmp_path / "system.img"
+
+    written = convert_partition(archive, partition, image)
+
+    content = image.read_bytes()
+    assert len(content) == 10 * BLOCK_SIZE
+    assert content[:BLOCK_SIZE] == b"A" * BLOCK_SIZE
+    assert content[5 * BLOCK_SIZE:6 * BLOCK_SIZE] == b"C" * BLOCK_SIZE
+    assert content.count(b"\0") == 8 * BLOCK_SIZE
+    # The zero block of the data is left as a hole
+    assert written == 2 * BLOCK_SIZE
+
+
+def test_truncated_data_fails_and_removes_the_image(tmp_path):
+    archive = _ota(tmp_path / "ota.zip", {"system.transfer.list": TRANSFER_LIST, "system.new.dat": DATA[:-1]})
+    [partition] = find_block_partitions(archive)
+
+    with pytest.raises(ValueError):
+        convert_partition(archive, partition, tmp_path / "system.img")
+    assert not (tmp_path / "system.img").exists()
+
+
+def test_incremental_transfer_list_is_rejected():
+    with pytest.raises(UnsupportedTransferList):
+        parse_transfer_list("4\n3\n0\n0\nmove 2,0,1 2,1,2\n")
+
+
+def test_archives_this_converter_cannot_handle_are_skipped(tmp_path):
+    ab_ota = _ota(tmp_path / "ab.zip", {"payload.bin": b"CrAU", "system.transfer.list": TRANSFER_LIST})
+    split = _ota(tmp_path / "split.zip", {
+        "system.transfer.list": TRANSFER_LIST, "system.new.dat.1": DATA, "system.new.dat.2": DATA,
+    })
+    brotli_ota = _ota(tmp_path / "br.zip", {"system.transfer.list": TRANSFER_LIST, "system.new.dat.br": b""})
+
+    assert find_block_partitions(ab_ota) == []
+    assert find_block_partitions(split) == []
+    with patch.object(sdat2img, "brotli", None), patch.object(sdat2img.shutil, "which", return_value=None):
+        assert find_block_partitions(brotli_ota) == []
+
+
+async def test_alt_dumper_converts_block_based_ota_without_extractor_sh(tmp_path):
+    archive = _ota(tmp_path / "ota.zip", {
+        "system.transfer.list": TRANSFER_LIST,
+        "system.new.dat": DATA,
+        "vendor.transfer.list": TRANSFER_LIST,
+        "vendor.new.dat": DATA,
+        "boot.img": b"ANDROID!",
+        "firmware-update/NON-HLOS.img": b"radio",
+        "file_contexts.bin": b"contexts",
+        "META-INF/com/google/android/updater-script": b"ui_print(\"hi\");",
+    })
+    extractor = FirmwareExtractor(str(tmp_path))
+    job = DumpJob(job_id="test-job", dump_args=DumpArguments(
+        url="https://example.com/ota.zip", use_alt_dumper=True, use_privdump=False,
+    ))
+
+    with patch.object(extractor, "_setup_firmware_extractor", AsyncMock()), \
+            patch.object(extractor, "_extract_partitions", AsyncMock()) as extract_partitions, \
+            patch.object(extractor, "_extract_with_alternative_dumper", AsyncMock()) as alternative:
+        await extractor.extract_firmware(job, str(archive))
+
+    alternative.assert_not_called()
+    extract_partitions.assert_awaited_once()
+    assert (tmp_path / "system.img").stat().st_size == 10 * BLOCK_SIZE
+    assert (tmp_path / "vendor.img").exists()
+    assert (tmp_path / "boot.img").read_bytes() == b"ANDROID!"
+    assert (tmp_path / "NON-HLOS.img").exists()
+    # Members that are not images are kept too, at their path in the zip
+    assert (tmp_path / "file_contexts.bin").read_bytes() == b"contexts"
+    assert (tmp_path / "META-INF/com/google/android/updater-script").exists()
+    # The converted partitions' sources are not copied
+    assert not (tmp_path / "system.new.dat").exists()
+    assert not (tmp_path / "system.transfer.list").exists()
+    assert not archive.exists()
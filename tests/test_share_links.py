@@ -0,0 +1,79 @@
+"""Unit tests for resolving Drive and MediaFire share links to direct URLs."""
+
+import base64
+import functools
+from unittest.mock import patch
+
+import httpx
+
+from dumpyarabot.share_links import google_drive_file_id, resolve_google_drive, resolve_mediafire
+
+FILE_ID = "1AbCdEfGhIjKlMnOpQrStUv"
+
+DRIVE_WARNING_PAGE = f"""
+<html><body>
+<form id="download-form" action="https://drive.usercontent.google.com/download" method="get">
+<input type="submit" value="Download anyway">
+<input type="hidden" name="id" value="{FILE_ID}">
+<input type="hidden" name="export" value="download">
+<input type="hidden" name="confirm" value="t">
+<input type="hidden" name="uuid" value="7d3c-uuid">
+</form></body></html>
+"""
+
+
+def _client(handler):
+    return patch(
+        "dumpyarabot.share_links.httpx.AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)),
+    )
+
+
+def test_drive_file_id_forms():
+    assert google_drive_file_id(f"https://drive.google.com/file/d/{FILE_ID}/view?usp=sharing") == FILE_ID
+    assert google_drive_file_id(f"https://drive.google.com/open?id={FILE_ID}") == FILE_ID
+    assert google_drive_file_id(f"https://drive.google.com/uc?id={FILE_ID}&export=download") == FILE_ID
+    assert google_drive_file_id("https://drive.google.com/drive/folders/1xyz1234567890") is None
+
+
+async def test_drive_confirmation_form_becomes_direct_url():
+    def handler(request):
+        return httpx.Response(200, text=DRIVE_WARNING_PAGE, headers={"content-type": "text/html; charset=utf-8"})
+
+    with _client(handler):
+        direct = await resolve_google_drive(f"https://drive.google.com/file/d/{FILE_ID}/view")
+
+    assert direct.startswith("https://drive.usercontent.google.com/download?")
+    query = httpx.URL(direct).params
+    assert query["id"] == FILE_ID
+    assert query["confirm"] == "t"
+    assert query["uuid"] == "7d3c-uuid"
+
+
+async def test_drive_small_file_is_already_direct():
+    def handler(request):
+        return httpx.Response(200, content=b"PK\x03\x04", headers={"content-type": "application/zip"})
+
+    with _client(handler):
+        direct = await resolve_google_drive(f"https://drive.google.com/file/d/{FILE_ID}/view")
+
+    assert direct == f"https://drive.usercontent.google.com/download?id={FILE_ID}&export=download"
+
+
+async def test_mediafire_button_href_and_scrambled_url():
+    plain = '<a class="input popsok" aria-label="Download file" href="https://download1234.mediafire.com/abc/fw.zip" id="downloadButton">'
+    link = "https://download5678.mediafire.com/def/fw.zip"
+    scrambled = (
+        '<a class="input popsok" href="javascript:void(0)" id="downloadButton" '
+        f'data-scrambled-url="{base64.b64encode(link.encode()).decode()}">'
+    )
+
+    for page, expected in ((plain, "https://download1234.mediafire.com/abc/fw.zip"), (scrambled, link)):
+        with _client(lambda request, page=page: httpx.Response(200, text=page, headers={"content-type": "text/html"})):
+            assert await resolve_mediafire("https://www.mediafire.com/file/abc/fw.zip/file") == expected
+
+
+async def test_unrecognised_page_returns_none():
+    with _client(lambda request: httpx.Response(200, text="<html>quota exceeded</html>", headers={"content-type": "text/html"})):
+        assert await resolve_google_drive(f"https://drive.google.com/file/d/{FILE_ID}/view") is None
+        assert await resolve_mediafire("https://www.mediafire.com/file/abc/fw.zip/file") is None
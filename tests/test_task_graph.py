@@ -0,0 +1,67 @@
+"""Unit tests for the bounded-concurrency task graph."""
+
+import asyncio
+
+import pytest
+
+from dumpyarabot.task_graph import TaskGraph
+
+
+async def test_steps_wait_for_dependencies_and_overlap_otherwise():
+    events = []
+    running = 0
+    peak = 0
+
+    def step(name):
+        async def run():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            events.append(f"start {name}")
+            await asyncio.sleep(0.02)
+            events.append(f"end {name}")
+            running -= 1
+        return run
+
+    graph = TaskGraph()
+    graph.add("unpack", step("unpack"))
+    graph.add("ramdisk", step("ramdisk"), after=["unpack"])
+    graph.add("dtb", step("dtb"))
+    graph.add("kallsyms", step("kallsyms"))
+
+    result = await graph.run(parallelism=2)
+
+    assert peak == 2
+    assert events.index("start ramdisk") > events.index("end unpack")
+    assert set(result.timings) == {"unpack", "ramdisk", "dtb", "kallsyms"}
+    assert result.elapsed < sum(result.timings.values())
+
+
+async def test_failed_step_skips_its_dependents_only():
+    ran = []
+
+    async def fail():
+        raise RuntimeError("unpackbootimg crashed")
+
+    async def record():
+        ran.append("dtb")
+
+    async def never():
+        ran.append("ramdisk")
+
+    graph = TaskGraph()
+    graph.add("unpack", fail)
+    graph.add("ramdisk", never, after=["unpack"])
+    graph.add("dtb", record)
+
+    result = await graph.run(parallelism=4)
+
+    assert ran == ["dtb"]
+    assert result.failed == ["unpack"]
+    assert result.skipped == ["ramdisk"]
+
+
+def test_dependencies_must_be_added_first():
+    graph = TaskGraph()
+    with pytest.raises(ValueError):
+        graph.add("dts", asyncio.sleep, after=["dtb"])
@@ -0,0 +1,105 @@
+"""Unit tests for the pinned tool environment cache."""
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from dumpyarabot import tool_manager as tool_manager_module
+from dumpyarabot.config import settings
+from dumpyarabot.tool_manager import TOOLS, ToolManager
+
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+@pytest.fixture
+def fake_uv():
+    """Stand in for uv: 'venv' makes the env, 'pip install' adds the tool's executables."""
+    calls = []
+
+    async def run_command(*args, **kwargs):
+        calls.append(args)
+        if args[:2] == ("git", "ls-remote"):
+            return SimpleNamespace(success=True, stdout=f"{COMMIT}\trefs/heads/{args[3]}\n")
+        if args[1] == "venv":
+            (Path(args[-1]) / "bin").mkdir(parents=True)
+        elif args[1:3] == ("pip", "install"):
+            env_bin = Path(args[5]).parent
+            spec = next(spec for spec in TOOLS.values() if args[6].startswith((f"{spec.name} @", f"{spec.source}==")))
+            for executable in spec.executables:
+                (env_bin / executable).write_text("#!/bin/sh\n")
+        elif args[1:3] == ("pip", "freeze"):
+            return SimpleNamespace(success=True, stdout="gdown==5.2.0\n")
+        return SimpleNamespace(success=True, stdout="")
+
+    which = lambda name: "/usr/bin/uv" if name == "uv" else None  # noqa: E731
+    with patch.object(tool_manager_module, "run_command", run_command), \
+            patch.object(tool_manager_module.shutil, "which", which):
+        yield calls
+
+
+async def test_tools_install_once_and_run_from_cache(tmp_path, fake_uv):
+    manager = ToolManager(tmp_path)
+    await manager.prepare()
+
+    assert manager.command("kallsyms-finder") == [str(manager.env_dir("vmlinux-to-elf") / "bin" / "kallsyms-finder")]
+    capabilities = json.loads((tmp_path / "capabilities.json").read_text())
+    assert capabilities["gdown"]["cached"] and capabilities["gdown"]["resolved"] == "gdown==5.2.0"
+    assert capabilities["dtc"] == {"available": False, "path": None}
+    installs = sum(1 for call in fake_uv if call[1:3] == ("pip", "install"))
+    assert installs == len(TOOLS)
+
+    # A second worker on the host reuses the environments
+    fake_uv.clear()
+    other = ToolManager(tmp_path)
+    await other.prepare()
+    assert not [call for call in fake_uv if call[1] == "venv"]
+    assert other.command("gdown") == manager.command("gdown")
+
+
+async def test_version_override_gets_its_own_environment(tmp_path, fake_uv):
+    manager = ToolManager(tmp_path)
+    default_dir = manager.env_dir("vmlinux-to-elf")
+
+    with patch.object(settings, "TOOL_VERSIONS", {"vmlinux-to-elf": "abc123"}):
+        assert manager.env_dir("vmlinux-to-elf") != default_dir
+        # Not installed yet: the pinned uvx command
+        assert manager.command("vmlinux-to-elf") == [
+            "uvx", "--from", "git+https://github.com/marin-m/vmlinux-to-elf@abc123", "vmlinux-to-elf",
+        ]
+        await manager.prepare()
+        assert manager.command("vmlinux-to-elf")[0].startswith(str(manager.env_dir("vmlinux-to-elf")))
+
+
+async def test_branches_are_frozen_to_a_commit(tmp_path, fake_uv):
+    manager = ToolManager(tmp_path)
+    with patch.object(settings, "TOOL_VERSIONS", {"mediafire-dl": "master"}):
+        await manager.prepare()
+        assert manager.version("mediafire-dl") == COMMIT
+        assert json.loads((tmp_path / "pins.json").read_text())["mediafire-dl@master"] == COMMIT
+
+        # Another worker reuses the commit even after the branch moves
+        fake_uv.clear()
+        other = ToolManager(tmp_path)
+        await other.prepare()
+        assert not [call for call in fake_uv if call[0] == "git"]
+        assert other.env_dir("mediafire-dl") == manager.env_dir("mediafire-dl")
+
+
+async def test_uvx_fallback_runs_offline_once_cached(tmp_path, fake_uv):
+    manager = ToolManager(tmp_path)
+    uv_install = tool_manager_module.run_command
+
+    async def failing_gdown_install(*args, **kwargs):
+        if args[1:3] == ("pip", "install") and args[6].startswith("gdown"):
+            raise RuntimeError("no space left")
+        return await uv_install(*args, **kwargs)
+
+    which = lambda name: f"/usr/bin/{name}" if name in ("uv", "uvx") else None  # noqa: E731
+    with patch.object(tool_manager_module, "run_command", failing_gdown_install), \
+            patch.object(tool_manager_module.shutil, "which", which):
+        await manager.prepare()
+
+    assert manager.command("gdown") == ["uvx", "--offline", "--from", "gdown==5.2.0", "gdown"]